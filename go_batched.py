@@ -0,0 +1,200 @@
+import functools
+import numpy as np
+from go_geometry import get_geometry
+N = 19
+NN = N ** 2
+# Same byte values as go_mutable, so a row of the boards array decodes
+# straight to the string returned by get_board().
+WHITE, BLACK, EMPTY = ord('O'), ord('X'), ord('.')
+PASS = -1
+
+def flatten(c):
+    return N * c[0] + c[1]
+
+# Convention: coords that have been flattened have a "f" prefix
+def unflatten(fc):
+    return divmod(fc, N)
+
+def is_on_board(c):
+    return c[0] % N == c[0] and c[1] % N == c[1]
+
+@functools.lru_cache(maxsize=None)
+def get_neighbor_tables(n):
+    '''
+    The neighbors of an n x n board as a (nn, 4) array. Points with fewer than
+    4 neighbors are padded with their own coordinate, which the returned
+    (nn, 4) bool array marks as not a neighbor. Since a point is always the
+    same color as itself, the padding never changes the outcome of a flood fill.
+    '''
+    neighbors = get_geometry(n).neighbors
+    table = np.array([ns + [fc] * (4 - len(ns)) for fc, ns in enumerate(neighbors)], dtype=np.intp)
+    valid = np.array([[True] * len(ns) + [False] * (4 - len(ns)) for ns in neighbors])
+    return table, valid
+
+# Neighbors are indexed by flat coordinates
+NEIGHBORS = get_geometry(N).neighbors
+NEIGHBOR_TABLE, NEIGHBOR_VALID = get_neighbor_tables(N)
+
+def adjacent(masks, n=N):
+    'Return the points orthogonally adjacent to any point of each (n*n,) bool mask'
+    grid = masks.reshape(-1, n, n)
+    reached = np.zeros_like(grid)
+    reached[:, 1:, :] |= grid[:, :-1, :]
+    reached[:, :-1, :] |= grid[:, 1:, :]
+    reached[:, :, 1:] |= grid[:, :, :-1]
+    reached[:, :, :-1] |= grid[:, :, 1:]
+    return reached.reshape(masks.shape)
+
+def find_dead_chains(boards, seeds, n=N):
+    '''
+    For each row of boards, grow the chain containing seeds[row] and report
+    whether it has no liberties.
+
+    Returns a (len(seeds),) bool array of which chains are dead, and a
+    (len(seeds), n*n) bool array holding each dead chain. Rows drop out of the
+    flood fill as soon as a liberty is found, so chains with liberties are
+    usually cheap.
+    '''
+    rows = np.arange(len(seeds))
+    dead = np.zeros(len(seeds), dtype=bool)
+    dead_chains = np.zeros(boards.shape, dtype=bool)
+    chain = np.zeros(boards.shape, dtype=bool)
+    chain[rows, seeds] = True
+    same = boards == boards[rows, seeds][:, None]
+    empty = boards == EMPTY
+    while len(rows):
+        reached = adjacent(chain, n)
+        has_liberty = (reached & empty).any(axis=1)
+        grown = chain | (reached & same)
+        still_growing = (grown != chain).any(axis=1)
+        finished_dead = ~has_liberty & ~still_growing
+        dead[rows[finished_dead]] = True
+        dead_chains[rows[finished_dead]] = grown[finished_dead]
+        keep = ~has_liberty & still_growing
+        if keep.all():
+            chain = grown
+        else:
+            rows, chain, same, empty = rows[keep], grown[keep], same[keep], empty[keep]
+    return dead, dead_chains
+
+def label_chains(boards, n=N):
+    '''
+    Label every point with the lowest flat coordinate of the chain of
+    same-colored points (stones or empty) it belongs to.
+    '''
+    neighbor_table, neighbor_valid = get_neighbor_tables(n)
+    rows = np.arange(len(boards))[:, None]
+    same = (boards[:, neighbor_table] == boards[:, :, None]) & neighbor_valid
+    labels = np.broadcast_to(np.arange(n * n), boards.shape).copy()
+    while True:
+        neighbor_labels = np.where(same, labels[:, neighbor_table], n * n)
+        new_labels = np.minimum(labels, neighbor_labels.min(axis=2))
+        # pointer jumping: follow each label to the label of that point
+        new_labels = new_labels[rows, new_labels]
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+class PositionBatch():
+    '''
+    B independent boards advanced one move per board per call.
+
+    boards: a (B, NN) int8 array of WHITE/BLACK/EMPTY
+    ko: a (B,) array of the point that may not be retaken on each board, or -1
+    geometry: the Geometry of the boards. Looked up from the width of boards
+        if not given.
+    '''
+    def __init__(self, boards, ko, geometry=None):
+        self.boards = boards
+        self.ko = ko
+        if geometry is None:
+            geometry = get_geometry(int(round(boards.shape[1] ** 0.5)))
+        self.geometry = geometry
+
+    @staticmethod
+    def initial_state(batch_size, size=N):
+        geometry = get_geometry(size)
+        return PositionBatch(np.full((batch_size, geometry.nn), EMPTY, dtype=np.int8),
+                             np.full(batch_size, -1, dtype=np.intp), geometry)
+
+    def __len__(self):
+        return len(self.boards)
+
+    def get_board(self, index):
+        return self.boards[index].tobytes().decode('ascii')
+
+    def play_moves(self, moves, colors):
+        '''
+        Play moves[b] for colors[b] on every board b. A move of PASS passes.
+        colors may be a single 'X'/'O' for the whole batch.
+
+        Boards whose move is illegal are left untouched. Returns a (B,) bool
+        array of which moves were played.
+        '''
+        moves = np.asarray(moves, dtype=np.intp)
+        if isinstance(colors, str):
+            colors = np.full(len(self), ord(colors), dtype=np.int8)
+        colors = np.asarray(colors, dtype=np.int8)
+        rows = np.arange(len(self))
+
+        passes = moves == PASS
+        moves = np.where(passes, 0, moves)
+        legal = ~passes & (self.boards[rows, moves] == EMPTY) & (moves != self.ko)
+        self.ko[passes] = -1
+
+        played = rows[legal]
+        boards = self.boards[played]
+        moves, colors = moves[played], colors[played]
+        opp_colors = np.where(colors == BLACK, WHITE, BLACK).astype(np.int8)
+        sub_rows = np.arange(len(played))
+
+        n = self.geometry.n
+        neighbor_table, neighbor_valid = get_neighbor_tables(n)
+        neighbors = neighbor_table[moves]
+        valid = neighbor_valid[moves]
+        neighbor_colors = boards[sub_rows[:, None], neighbors]
+        is_opp = valid & (neighbor_colors == opp_colors[:, None])
+        koish = (is_opp | ~valid).all(axis=1)
+
+        boards[sub_rows, moves] = colors
+
+        # Check every opponent neighbor of every move for capture at once
+        board_index, slot = np.nonzero(is_opp)
+        dead, dead_chains = find_dead_chains(boards[board_index], neighbors[board_index, slot], n)
+        captured = np.zeros(boards.shape, dtype=bool)
+        np.logical_or.at(captured, board_index[dead], dead_chains[dead])
+        boards[captured] = EMPTY
+        num_captured = captured.sum(axis=1)
+
+        # Check for suicide; only possible if nothing was captured
+        suicide = np.zeros(len(played), dtype=bool)
+        maybe_suicide = np.nonzero(num_captured == 0)[0]
+        suicide[maybe_suicide], _ = find_dead_chains(boards[maybe_suicide], moves[maybe_suicide], n)
+
+        new_ko = np.where(koish & (num_captured == 1), captured.argmax(axis=1), -1)
+
+        ok = ~suicide
+        self.boards[played[ok]] = boards[ok]
+        self.ko[played[ok]] = new_ko[ok]
+        legal[played[suicide]] = False
+        return legal | passes
+
+    def get_liberties(self):
+        'Return a (B, NN) uint8 array of the liberty count of the chain at each point'
+        boards = self.boards
+        batch_size = len(boards)
+        n, nn = self.geometry.n, self.geometry.nn
+        neighbor_table, neighbor_valid = get_neighbor_tables(n)
+        labels = label_chains(boards, n)
+        # For every empty point, the chains on each side of it. A chain that
+        # touches the same empty point from several sides only counts once.
+        neighbor_labels = labels[:, neighbor_table]
+        is_liberty = (boards == EMPTY)[:, :, None] & neighbor_valid & (boards[:, neighbor_table] != EMPTY)
+        for d in range(1, 4):
+            for e in range(d):
+                is_liberty[:, :, d] &= neighbor_labels[:, :, d] != neighbor_labels[:, :, e]
+        offsets = (np.arange(batch_size) * nn)[:, None, None]
+        counts = np.bincount((neighbor_labels + offsets)[is_liberty], minlength=batch_size * nn)
+        liberties = counts.reshape(batch_size, nn)[np.arange(batch_size)[:, None], labels]
+        liberties[boards == EMPTY] = 0
+        return liberties.astype(np.uint8)
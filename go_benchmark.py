@@ -1,19 +1,33 @@
 import argparse
+import collections
+import functools
 import itertools
+import json
+import multiprocessing
+import os
+import random
 import re
-import textwrap
+import statistics
 import time
 import go_naive
 import go_mutable
 import go_sets
+import go_bitboard
+import go_sgf
+
+IMPLEMENTATIONS = {
+    'naive': go_naive,
+    'mutable': go_mutable,
+    'sets': go_sets,
+    'bitboard': go_bitboard,
+}
 
 def load_board(string):
     return re.sub(r'[^XO\.]+', '', string)
 
-translate_sg = 'abcdefghijklmnopqrs'.index
-
 def get_moves(sgf_snippet):
-    return [go_naive.flatten((translate_sg(x), translate_sg(y))) for _, _, _, y, x, _ in textwrap.wrap(sgf_snippet, 6)]
+    setup, moves, result = next(go_sgf.parse_string('(' + sgf_snippet + ')'))
+    return [fc for fc, color in moves]
 
 game = ";B[qd];W[dc];B[pq];W[dq];B[do];W[co];B[cn];W[cp];B[ce];W[dn];B[fd];W[ed];B[ee];W[fc];B[gd];W[gc];B[hd];W[hc];B[id];W[jc];B[cm];W[en];B[dk];W[qo];B[cc];W[de];B[df];W[dd];B[cd];W[db];B[ef];W[nq];B[op];W[np];B[pn];W[qm];B[qp];W[pm];B[on];W[jp];B[qn];W[rn];B[ro];W[qi];B[hq];W[jq];B[go];W[fp];B[gp];W[fq];B[gl];W[ci];B[cj];W[ei];B[fj];W[cg];B[cf];W[gh];B[ii];W[ih];B[jh];W[gj];B[fk];W[dj];B[bj];W[hk];B[fi];W[fh];B[ig];W[gi];B[im];W[ij];B[ir];W[jr];B[or];W[ck];B[bk];W[km];B[jl];W[ji];B[hh];W[hl];B[gm];W[hm];B[hn];W[in];B[kl];W[lk];B[eh];W[ll];B[fg];W[so];B[rp];W[ki];B[qg];W[oc];B[pc];W[od];B[pf];W[rl];B[lc];W[pb];B[qb];W[nb];B[pa];W[gg];B[ob];W[ff];B[eg];W[hf];B[le];W[of];B[og];W[nf];B[ng];W[mf];B[jd];W[kc];B[ld];W[mg];B[cb];W[if];B[eb];W[da];B[ic];W[ib];B[jb];W[ha];B[kb];W[kf];B[mn];W[ek];B[dl];W[el];B[ej];W[pe];B[qe];W[fn];B[gn];W[no];B[nn];W[ln];B[mo];W[nr];B[lp];W[lr];B[gr];W[io];B[ds];W[cs];B[ca];W[fa];B[rh];W[mb];B[fe];W[nh];B[oh];W[oi];B[ni];W[mh];B[pi];W[oj];B[pj];W[ph];B[pg];W[pk];B[qj];W[rj];B[qh];W[ok];B[bo];W[bp];B[es];W[fl];B[gk];W[fr];B[fs];W[cr];B[ri];W[bn];B[bm];W[ao];B[lf];W[ke];B[kd];W[lg];B[gf];W[hg];B[nl];W[sp];B[sq];W[sn];B[rr];W[rk];B[nk];W[nj];B[fo];W[eo];B[di];W[oq];B[pr];W[oo];B[po];W[lq];B[mm];W[lm];B[js];W[ks];B[is];W[gq];B[hp];W[iq];B[kp];W[mp];B[lo];W[ko];B[pd];W[oe];B[me];W[nc];B[kq];W[kr];B[am];W[er];B[hr];W[os];B[ps];W[ns];B[an];W[bo];B[mk];W[mj];B[je];W[jf];B[ol];W[om];B[pp];W[si];B[sh];W[sj];B[he];W[pl];B[qk];W[ql];B[ja];W[ia];B[la];W[lb];B[oa];W[ma];B[ka];W[na];B[mc];W[nd];B[md];W[ne];B[ie];W[nm];B[ml];W[fm];B[dm];W[dr];B[gs];W[ip];B[ho];W[dp];B[em];W[hi];B[cl];W[ih];B[ch];W[jg];B[bi];W[kh];B[bg];W[jm];B[dg];W[il];B[kk];W[kj];B[rq];W[jk];B[qq];W[mi];B[qr];W[fb];B[ec];W[ea]"
 moves = get_moves(game)
@@ -63,7 +77,7 @@ final_liberties = [
 ]
 
 def measure_game_exec(initial_state, reps=1000, calc_libs=False):
-    tick = time.time()
+    tick = time.perf_counter()
     for i in range(reps):
         pos = initial_state()
         for move, color in zip(moves, itertools.cycle('XO')):
@@ -78,27 +92,902 @@ def measure_game_exec(initial_state, reps=1000, calc_libs=False):
 
         assert pos.get_board() == final
         assert pos.score() == result
-        assert pos.get_liberties() == final_liberties
-    time_taken = time.time() - tick
+        assert list(pos.get_liberties()) == final_liberties
+    time_taken = time.perf_counter() - tick
     return time_taken / reps
 
+def measure_superko_overhead(module, reps=100, phases=4):
+    '''
+    Play the benchmark game with and without positional superko, and report the
+    mean time per move within each phase of the game. Rehashing the whole board
+    every move is timed alongside for comparison.
+    '''
+    phase_length = -(-len(moves) // phases)
+    totals = {'plain': [0.0] * phases, 'superko': [0.0] * phases, 'rehash': [0.0] * phases}
+    for i in range(reps):
+        for label, superko in (('plain', False), ('superko', True)):
+            pos = module.Position.initial_state(superko=superko)
+            for move_num, (move, color) in enumerate(zip(moves, itertools.cycle('XO'))):
+                tick = time.perf_counter()
+                pos = pos.play_move(move, color)
+                totals[label][move_num // phase_length] += time.perf_counter() - tick
+            assert pos.zobrist == module.zobrist_hash(pos.board)
+            assert pos.history is None or len(pos.history) == len(moves) + 1
+        pos = module.Position.initial_state()
+        for move_num, (move, color) in enumerate(zip(moves, itertools.cycle('XO'))):
+            pos = pos.play_move(move, color)
+            tick = time.perf_counter()
+            module.zobrist_hash(pos.board)
+            totals['rehash'][move_num // phase_length] += time.perf_counter() - tick
+    moves_per_phase = [min(phase_length, len(moves) - p * phase_length) * reps for p in range(phases)]
+    return {label: [t / n for t, n in zip(times, moves_per_phase)] for label, times in totals.items()}
+
+def measure_undo(reps=100, width=8):
+    '''
+    Walk the benchmark game on go_mutable, trying the next `width` moves of the
+    game at every node before advancing. Trial moves are made either on a copy
+    of the board, or in place and then taken back with undo_move.
+    Returns the mean time per trial move for each approach.
+    '''
+    def copy_per_node(pos, move, color):
+        Position(pos.board[:], pos.ko, pos.zobrist).play_move(move, color)
+
+    def make_unmake(pos, move, color):
+        pos.play_move(move, color).undo_move()
+
+    Position = go_mutable.Position
+    results = {}
+    for label, trial in (('copy', copy_per_node), ('undo', make_unmake)):
+        num_trials = 0
+        elapsed = 0
+        for i in range(reps):
+            pos = Position.initial_state()
+            colors = itertools.cycle('XO')
+            for move_num, (move, color) in enumerate(zip(moves, colors)):
+                tick = time.perf_counter()
+                for candidate in moves[move_num:move_num + width]:
+                    try:
+                        trial(pos, candidate, color)
+                        num_trials += 1
+                    except go_mutable.IllegalMove:
+                        pass
+                elapsed += time.perf_counter() - tick
+                pos = pos.play_move(move, color)
+            assert pos.get_board() == final
+        results[label] = elapsed / num_trials
+    return results
+
+def probe_legal_moves(module, pos, color):
+    'Find legal moves by trying every point and catching IllegalMove'
+    legal = 0
+    for fc in range(module.NN):
+        try:
+            new_pos = pos.play_move(fc, color)
+        except module.IllegalMove:
+            continue
+        legal |= 1 << fc
+        if module is go_mutable:
+            new_pos.undo_move()
+    return legal
+
+def measure_legal_moves(module, reps=10):
+    '''
+    Generate the legal moves for the side to move at every position of the
+    benchmark game, either by probing every point with play_move, or through
+    the incrementally maintained Position.legal_moves. Returns the mean time
+    per position for each; the incremental time includes the extra work done
+    by play_move to keep the legal move masks up to date.
+    '''
+    results = {'probe': 0, 'incremental': 0, 'play_move': 0}
+    for i in range(reps):
+        pos = module.Position.initial_state()
+        probed = []
+        for move, color in zip(moves, itertools.cycle('XO')):
+            tick = time.perf_counter()
+            probed.append(probe_legal_moves(module, pos, color))
+            results['probe'] += time.perf_counter() - tick
+            pos = pos.play_move(move, color)
+
+        pos = module.Position.initial_state()
+        tick = time.perf_counter()
+        for move, color in zip(moves, itertools.cycle('XO')):
+            pos = pos.play_move(move, color)
+        results['play_move'] += time.perf_counter() - tick
+
+        pos = module.Position.initial_state()
+        incremental = []
+        tick = time.perf_counter()
+        for move, color in zip(moves, itertools.cycle('XO')):
+            incremental.append(pos.legal_moves(color))
+            pos = pos.play_move(move, color)
+        results['incremental'] += time.perf_counter() - tick - results['play_move'] / (i + 1)
+        assert incremental == probed
+    return {label: elapsed / (reps * len(moves)) for label, elapsed in results.items()}
+
+def measure_score(module, reps=10):
+    '''
+    Score the benchmark game after every move, either from scratch or through
+    the Territory that play_move keeps up to date once score() has been
+    called. Returns the mean time per move, including play_move, for each.
+    '''
+    results = {}
+    for label in ('full', 'incremental'):
+        elapsed = 0
+        for i in range(reps):
+            pos = module.Position.initial_state()
+            scores = []
+            tick = time.perf_counter()
+            for move, color in zip(moves, itertools.cycle('XO')):
+                pos = pos.play_move(move, color)
+                scores.append(pos.score())
+                if label == 'full':
+                    # forget the territory, so the next position starts over
+                    pos.territory_cache = None
+            elapsed += time.perf_counter() - tick
+            assert scores[-1] == result
+            if label == 'full':
+                full_scores = scores
+            else:
+                assert scores == full_scores
+        results[label] = elapsed / (reps * len(moves))
+    return results
+
+def reference_playout(module, position, rng, color='X', max_moves=None):
+    '''
+    A random playout written against the public Position API, for backends
+    without a playout() of their own. Follows the same policy as
+    go_mutable.playout: random legal moves that don't fill an own eye.
+    '''
+    geometry = position.geometry
+    if max_moves is None:
+        max_moves = 3 * geometry.nn
+    opp_color = {'X': 'O', 'O': 'X'}
+    passes = 0
+    for i in range(max_moves):
+        board = bytearray(position.get_board(), encoding='ascii')
+        legal = position.legal_moves(color)
+        candidates = [fc for fc in range(geometry.nn)
+                      if legal >> fc & 1 and not go_mutable.is_eye(board, fc, ord(color), geometry)]
+        if candidates:
+            position = position.play_move(rng.choice(candidates), color)
+            passes = 0
+        else:
+            position = position.pass_move()
+            passes += 1
+            if passes == 2:
+                break
+        color = opp_color[color]
+    return position.score()
+
+def run_playouts(module, first_rep, reps, seed=0):
+    '''
+    Run playouts first_rep .. first_rep + reps - 1 from the empty board and
+    return their scores. Each playout is seeded from seed and its own rep
+    number, so the scores don't depend on how reps are split between calls.
+    '''
+    if hasattr(module, 'playout'):
+        playout = module.playout
+    else:
+        playout = functools.partial(reference_playout, module)
+    return [playout(module.Position.initial_state(), random.Random(seed * 1000003 + rep))
+            for rep in range(first_rep, first_rep + reps)]
+
+def measure_playouts(module, reps=100, seed=0):
+    '''
+    Run random playouts from the empty board with a fixed seed, and return
+    the number of playouts per second and the mean score.
+    '''
+    tick = time.perf_counter()
+    scores = run_playouts(module, 0, reps, seed=seed)
+    elapsed = time.perf_counter() - tick
+    return reps / elapsed, sum(scores) / reps
+
+def measure_sizes(module, sizes=(9, 13, 19), reps=100, seed=0):
+    '''
+    Replay a random game on each board size through module's Position, and
+    return the mean time per move for each size. The games are generated once
+    with go_mutable.playout, so every backend replays the same moves.
+    '''
+    results = {}
+    for size in sizes:
+        game_moves = []
+        score = go_mutable.playout(go_mutable.Position.initial_state(size=size), random.Random(seed),
+                                   moves_played=game_moves)
+        tick = time.perf_counter()
+        for i in range(reps):
+            pos = module.Position.initial_state(size=size)
+            for move, color in zip(game_moves, itertools.cycle('XO')):
+                if move is None:
+                    pos = pos.pass_move()
+                else:
+                    pos = pos.play_move(move, color)
+        elapsed = time.perf_counter() - tick
+        assert pos.score() == score
+        results[size] = elapsed / (reps * len(game_moves))
+    return results
+
+def measure_memory(initial_state, checkpoints=(50, 150, 288)):
+    '''
+    Replay the benchmark game keeping every position, as a search tree would,
+    and return the mean number of bytes allocated per position, as traced by
+    tracemalloc, after each number of moves in checkpoints.
+    '''
+    import tracemalloc
+    results = {}
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        positions = [initial_state()]
+        for num_moves, (move, color) in enumerate(zip(moves, itertools.cycle('XO')), 1):
+            positions.append(positions[-1].play_move(move, color))
+            if num_moves in checkpoints:
+                results[num_moves] = (tracemalloc.get_traced_memory()[0] - baseline) / len(positions)
+    finally:
+        tracemalloc.stop()
+    return results
+
+def measure_mcts(module, playouts=1000, size=9, seed=0):
+    '''
+    Search the empty board with go_mcts for a number of playouts, and return
+    the number of nodes and playouts per second, and the tree's size. The
+    search is then repeated under tracemalloc to find the bytes held per node,
+    including the positions stored at visited nodes.
+    '''
+    import tracemalloc
+    import go_mcts
+    tree = go_mcts.SearchTree(module.Position.initial_state(size=size), 'X', seed=seed)
+    tick = time.perf_counter()
+    tree.search(playouts=playouts)
+    elapsed = time.perf_counter() - tick
+    results = {'nodes': len(tree), 'nodes_per_sec': len(tree) / elapsed, 'playouts_per_sec': playouts / elapsed}
+
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tree = go_mcts.SearchTree(module.Position.initial_state(size=size), 'X', seed=seed)
+        tree.search(playouts=playouts)
+        results['bytes_per_node'] = (tracemalloc.get_traced_memory()[0] - baseline) / len(tree)
+    finally:
+        tracemalloc.stop()
+    return results
+
+def permuted_games(num_games, swaps=10, seed=0):
+    '''
+    Yield num_games move orders of the benchmark game, each with a number of
+    random moves swapped with the next move of the same color. Swaps that
+    don't commute, or make a move illegal, are caught by the replay.
+    '''
+    rng = random.Random(seed)
+    for i in range(num_games):
+        game_moves = list(moves)
+        for j in range(swaps):
+            k = rng.randrange(len(game_moves) - 2)
+            game_moves[k], game_moves[k + 2] = game_moves[k + 2], game_moves[k]
+        yield game_moves
+
+def measure_transpositions(module, num_games=20, capacity=1 << 14, seed=0):
+    '''
+    Replay permuted move orders of the benchmark game, evaluating every
+    position (a seeded random playout plus the legal moves for the side to
+    move) either from scratch or through a go_transposition table. Returns the
+    time taken each way, and the table's hit rate and eviction count.
+    Permutations that don't reach the original final board are skipped.
+    '''
+    import go_mcts
+    import go_transposition
+
+    def evaluate(position, color):
+        key = go_transposition.position_key(position, color)
+        return go_mcts.rollout(position, color, random.Random(key)), position.legal_moves(color)
+
+    games = []
+    for game_moves in permuted_games(num_games, seed=seed):
+        pos = module.Position.initial_state()
+        try:
+            for move, color in zip(game_moves, itertools.cycle('XO')):
+                pos = pos.play_move(move, color)
+        except module.IllegalMove:
+            continue
+        if pos.get_board() == final:
+            games.append(game_moves)
+
+    results = {'games': len(games)}
+    table = go_transposition.TranspositionTable(capacity)
+    for label, lookup in (('scratch', evaluate), ('table', functools.partial(table.lookup, compute=evaluate))):
+        evaluations = []
+        tick = time.perf_counter()
+        for game_moves in games:
+            pos = module.Position.initial_state()
+            for move, color in zip(game_moves, itertools.cycle('XO')):
+                pos = pos.play_move(move, color)
+                evaluations.append(lookup(pos, 'O' if color == 'X' else 'X'))
+        results[label] = time.perf_counter() - tick
+        results[label + '_evaluations'] = evaluations
+    assert results.pop('scratch_evaluations') == results.pop('table_evaluations')
+    results['hit_rate'] = table.hit_rate()
+    results['evictions'] = table.evictions
+    return results
+
+def measure_game_layer(module, reps=100):
+    '''
+    Replay the benchmark game with bare play_move calls, and through a
+    go_game.Game, which also tracks the side to move, prisoners and the move
+    record. Returns the mean time per game for each.
+    '''
+    import go_game
+    results = {}
+    tick = time.perf_counter()
+    for i in range(reps):
+        pos = module.Position.initial_state()
+        for move, color in zip(moves, itertools.cycle('XO')):
+            pos = pos.play_move(move, color)
+    results['play_move'] = (time.perf_counter() - tick) / reps
+
+    tick = time.perf_counter()
+    for i in range(reps):
+        game = go_game.Game.new(module)
+        for move in moves:
+            game.play(move)
+    results['game'] = (time.perf_counter() - tick) / reps
+    assert game.position.get_board() == final
+    assert list(game.moves) == moves
+    return results
+
+def measure_instrumented(initial_state, module, reps=1, calc_libs=False):
+    '''
+    Replay the benchmark game with the phases of play_move in module
+    instrumented, and return the go_instrument.Instrumentation.
+    '''
+    import go_instrument
+    with go_instrument.Instrumentation(module) as instrumentation:
+        measure_game_exec(initial_state, reps=reps, calc_libs=calc_libs)
+    return instrumentation
+
+def measure_symmetry(module, reps=10):
+    '''
+    Replay the benchmark game taking the canonical hash of every position,
+    hashing the board under each symmetry from scratch, and with the hashes
+    kept up to date by play_move. Returns the canonicalizations/sec of each,
+    counting only the time on top of replaying the game.
+    '''
+    import go_symmetry
+    def replay(canonicalize):
+        tick = time.perf_counter()
+        for i in range(reps):
+            pos = module.Position.initial_state()
+            canonicalize(pos)
+            for move, color in zip(moves, itertools.cycle('XO')):
+                pos = pos.play_move(move, color)
+                canonicalize(pos)
+        return time.perf_counter() - tick
+    def scratch(pos):
+        return min(go_symmetry.hashes_from_board(pos.get_board(), pos.geometry.n))
+    baseline = replay(lambda pos: None)
+    canonicalizations = reps * (len(moves) + 1)
+    return {
+        'scratch': canonicalizations / (replay(scratch) - baseline),
+        'incremental': canonicalizations / (replay(go_symmetry.canonical_hash) - baseline),
+    }
+
+def measure_dataset(module, reps=10, seed=0):
+    '''
+    Write every position of reps replays of the benchmark game to a
+    go_dataset file, then read them back in order, in a random order, and as
+    NumPy arrays of points. Returns the positions/sec of each.
+    '''
+    import tempfile
+    import go_dataset
+    positions = []
+    pos = module.Position.initial_state()
+    for move, color in zip(moves, itertools.cycle('XO')):
+        pos = pos.play_move(move, color)
+        positions.append((pos.to_bytes('O' if color == 'X' else 'X'), color))
+    handle, path = tempfile.mkstemp(suffix='.bin')
+    os.close(handle)
+    results = {}
+    try:
+        tick = time.perf_counter()
+        with go_dataset.DatasetWriter(path) as writer:
+            for i in range(reps):
+                # Serialize each position again, so that writing includes to_bytes
+                pos = module.Position.initial_state()
+                for move, color in zip(moves, itertools.cycle('XO')):
+                    pos = pos.play_move(move, color)
+                    writer.write(pos, 'O' if color == 'X' else 'X')
+        count = writer.count
+        # Less the time to replay the games
+        replay = measure_game_exec(module.Position.initial_state, reps=reps) * reps
+        results['write'] = count / max(time.perf_counter() - tick - replay, 1e-9)
+
+        with go_dataset.PositionDataset(path, module) as dataset:
+            tick = time.perf_counter()
+            for position, to_play in dataset:
+                pass
+            results['sequential'] = count / (time.perf_counter() - tick)
+            assert position.to_bytes(to_play) == positions[-1][0]
+
+            order = list(range(count))
+            random.Random(seed).shuffle(order)
+            tick = time.perf_counter()
+            for i in order:
+                dataset[i]
+            results['random'] = count / (time.perf_counter() - tick)
+
+            dataset.records(0, 0) # import NumPy before timing
+            tick = time.perf_counter()
+            for start in range(0, count, 1024):
+                go_dataset.unpack_points(dataset.records(start, start + 1024))
+            results['numpy'] = count / (time.perf_counter() - tick)
+    finally:
+        os.remove(path)
+    return results
+
+def reference_liberty_tracker(board):
+    '''
+    Build a go_sets.LibertyTracker the way from_board used to: finding each
+    group with board.index and find_reached, then blanking it out of a copy of
+    the board. For checking the single-pass from_board against.
+    '''
+    geometry = go_sets.geometry_for_board(board)
+    curr_group_id = 0
+    lib_tracker = go_sets.LibertyTracker([None] * geometry.nn, {}, geometry=geometry)
+    for color in (go_sets.WHITE, go_sets.BLACK):
+        while color in board:
+            curr_group_id += 1
+            coord = board.index(color)
+            chain, reached = go_sets.find_reached(board, coord, geometry.neighbors)
+            liberties = set(fr for fr in reached if board[fr] == go_sets.EMPTY)
+            lib_tracker.groups[curr_group_id] = go_sets.Group(curr_group_id, chain, liberties, color)
+            for fs in chain:
+                lib_tracker.group_index[fs] = curr_group_id
+            board = go_sets.bulk_place_stones('?', board, chain)
+    lib_tracker.max_group_id = curr_group_id
+    for group in lib_tracker.groups.values():
+        for fs in group.stones:
+            lib_tracker.liberty_cache[fs] = len(group.liberties)
+    return lib_tracker
+
+def measure_from_board(reps=10):
+    '''
+    Build a go_sets.LibertyTracker from the board of every position of the
+    benchmark game with reference_liberty_tracker, LibertyTracker.from_board
+    and LibertyTracker.from_boards. Returns the mean time per board of each.
+    '''
+    boards = []
+    pos = go_naive.Position.initial_state()
+    for move, color in zip(moves, itertools.cycle('XO')):
+        pos = pos.play_move(move, color)
+        boards.append(pos.board)
+    results = {}
+    for label, build in (('reference', lambda: [reference_liberty_tracker(board) for board in boards]),
+                         ('from_board', lambda: [go_sets.LibertyTracker.from_board(board) for board in boards]),
+                         ('from_boards', lambda: go_sets.LibertyTracker.from_boards(boards))):
+        tick = time.perf_counter()
+        for i in range(reps):
+            trackers = build()
+        results[label] = (time.perf_counter() - tick) / (reps * len(boards))
+        assert list(trackers[-1].liberty_cache) == final_liberties
+    return results
+
+def reference_ladder(position, fc, max_depth=None):
+    '''
+    Read a ladder the way it is done without go_sets.read_ladder, by playing
+    every move on a new go_sets.Position. Follows the same rules, with ko
+    taken from the position.
+    '''
+    if max_depth is None:
+        max_depth = 2 * position.geometry.nn
+    color = position.board[fc]
+    if position.get_liberties()[fc] == 1:
+        return reference_ladder_escapes(position, fc, color, max_depth)
+    return not reference_ladder_captures(position, fc, go_sets.swap_colors(color), max_depth)
+
+def reference_ladder_escapes(position, fc, color, depth):
+    if depth == 0:
+        return True
+    tracker = position.liberty_tracker
+    group = tracker.groups[tracker.group_index[fc]]
+    candidates = list(group.liberties)
+    for fs in group.stones:
+        for fn in position.geometry.neighbors[fs]:
+            group_id = tracker.group_index[fn]
+            if group_id is not None and group_id != group.id and len(tracker.groups[group_id].liberties) == 1:
+                candidates.extend(tracker.groups[group_id].liberties)
+    for move in candidates:
+        try:
+            new_position = position.play_move(move, color)
+        except go_sets.IllegalMove:
+            continue
+        num_libs = new_position.get_liberties()[fc]
+        if num_libs > 2:
+            return True
+        if num_libs == 2 and not reference_ladder_captures(new_position, fc, go_sets.swap_colors(color), depth - 1):
+            return True
+    return False
+
+def reference_ladder_captures(position, fc, color, depth):
+    if depth == 0:
+        return False
+    tracker = position.liberty_tracker
+    for move in list(tracker.groups[tracker.group_index[fc]].liberties):
+        try:
+            new_position = position.play_move(move, color)
+        except go_sets.IllegalMove:
+            continue
+        if (new_position.get_liberties()[fc] == 1 and
+                not reference_ladder_escapes(new_position, fc, go_sets.swap_colors(color), depth - 1)):
+            return True
+    return False
+
+def ladder_positions():
+    '''
+    Known ladders on an otherwise empty 19x19 board: a black stone in atari,
+    hemmed in by white stones so that its extension starts a ladder running
+    diagonally, from several starting points in each of the four directions. Each comes with and without a black ladder breaker in
+    the ladder's path. Returns a list of (label, position, fc).
+    '''
+    positions = []
+    for dx, dy in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+        for start in (3, 6, 9):
+            x = start if dx == 1 else go_sets.N - 1 - start
+            y = start if dy == 1 else go_sets.N - 1 - start
+            prey = go_sets.flatten((x, y))
+            # The ladder runs in the direction (dx, dy), away from the walls
+            walls = [(x - dx, y), (x, y - dy), (x + dx, y), (x - dx, y + dy)]
+            breaker = (x + 8 * dx, y + 8 * dy)
+            for label, black_stones in (('ladder', []), ('broken ladder', [breaker])):
+                board = bytearray(go_sets.EMPTY_BOARD, encoding='ascii')
+                board[prey] = ord('X')
+                for c in walls:
+                    board[go_sets.flatten(c)] = ord('O')
+                for c in black_stones:
+                    if go_sets.is_on_board(c):
+                        board[go_sets.flatten(c)] = ord('X')
+                board = board.decode('ascii')
+                position = go_sets.Position(board, None, go_sets.LibertyTracker.from_board(board))
+                positions.append(('%s from %s' % (label, (x, y)), position, prey))
+    return positions
+
+def measure_ladders(reps=10):
+    '''
+    Read each of the known ladder positions with go_sets.read_ladder and with
+    reference_ladder, checking that they agree. Returns the number of
+    positions, how many of them escape, and the mean time per query for each.
+    '''
+    positions = ladder_positions()
+    results = {'positions': len(positions), 'read_ladder': 0, 'reference': 0}
+    escapes = []
+    for label, position, fc in positions:
+        tick = time.perf_counter()
+        for i in range(reps):
+            escaped = go_sets.read_ladder(position.liberty_tracker, fc, position.ko)
+        results['read_ladder'] += time.perf_counter() - tick
+        tick = time.perf_counter()
+        for i in range(reps):
+            assert reference_ladder(position, fc) == escaped, label
+        results['reference'] += time.perf_counter() - tick
+        escapes.append(escaped)
+    results['escapes'] = sum(escapes)
+    for label in ('read_ladder', 'reference'):
+        results[label] /= reps * len(positions)
+    return results
+
+def init_worker(implementation):
+    '''
+    Pool initializer: build the backend's module-level tables and run a game
+    once, so that this isn't counted against the first task.
+    '''
+    module = IMPLEMENTATIONS[implementation]
+    measure_game_exec(module.Position.initial_state, reps=1)
+
+def run_task(task):
+    '''
+    Run one chunk of repetitions in a worker process. Returns the worker's pid,
+    the time taken, and the chunk's results (playout scores, or None for game
+    replays, which check their results with asserts).
+    '''
+    implementation, playouts, first_rep, reps, seed, calc_libs = task
+    module = IMPLEMENTATIONS[implementation]
+    tick = time.perf_counter()
+    if playouts:
+        results = run_playouts(module, first_rep, reps, seed=seed)
+    else:
+        measure_game_exec(module.Position.initial_state, reps=reps, calc_libs=calc_libs)
+        results = None
+    return os.getpid(), time.perf_counter() - tick, results
+
+def measure_parallel(implementation, reps, workers, playouts=False, seed=0, calc_libs=False, chunks_per_worker=4):
+    '''
+    Spread reps game replays (or playouts) over a pool of worker processes.
+    Returns the overall throughput in reps/sec, the mean and standard
+    deviation of each worker's own throughput, and the playout scores in rep
+    order, which are the same for any number of workers.
+    '''
+    num_chunks = min(reps, workers * chunks_per_worker)
+    bounds = [reps * i // num_chunks for i in range(num_chunks + 1)]
+    tasks = [(implementation, playouts, start, stop - start, seed, calc_libs)
+             for start, stop in zip(bounds, bounds[1:])]
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(implementation,)) as pool:
+        tick = time.perf_counter()
+        task_results = pool.map(run_task, tasks, chunksize=1)
+        elapsed = time.perf_counter() - tick
+
+    busy = collections.defaultdict(lambda: [0, 0.0])
+    for (pid, task_elapsed, results), task in zip(task_results, tasks):
+        busy[pid][0] += task[3]
+        busy[pid][1] += task_elapsed
+    worker_rates = [done / worker_elapsed for done, worker_elapsed in busy.values()]
+    scores = None
+    if playouts:
+        scores = [score for pid, task_elapsed, results in task_results for score in results]
+    return {
+        'throughput': reps / elapsed,
+        'worker_mean': statistics.mean(worker_rates),
+        'worker_stdev': statistics.stdev(worker_rates) if len(worker_rates) > 1 else 0.0,
+        'workers_used': len(worker_rates),
+        'scores': scores,
+    }
+
+def measure_replay(module, paths, max_games=0):
+    '''
+    Replay every game of an SGF corpus through module's Position, and return
+    counts of games, moves, skipped and illegal games, along with the total
+    time taken and the part of it spent in play_move rather than parsing.
+    '''
+    stats = {'games': 0, 'moves': 0, 'skipped': [], 'illegal': [], 'elapsed': 0, 'replay_elapsed': 0}
+    tick = time.perf_counter()
+    for setup, moves, result in go_sgf.iter_games(paths, skipped=stats['skipped']):
+        replay_tick = time.perf_counter()
+        try:
+            go_sgf.replay(module.Position.initial_state, setup, moves)
+        except module.IllegalMove as e:
+            stats['illegal'].append((stats['games'], str(e).strip().splitlines()[-1]))
+        stats['replay_elapsed'] += time.perf_counter() - replay_tick
+        stats['games'] += 1
+        stats['moves'] += len(moves)
+        if stats['games'] == max_games:
+            break
+    stats['elapsed'] = time.perf_counter() - tick
+    return stats
+
+def measure_batched(batch_sizes=(1, 64, 1024, 8192), reps=1):
+    '''
+    Replay the benchmark game on every board of a go_batched.PositionBatch at
+    once, and return the number of board-moves played per second for each
+    batch size.
+    '''
+    import numpy as np
+    import go_batched
+    results = {}
+    for batch_size in batch_sizes:
+        elapsed = 0
+        for i in range(reps):
+            tick = time.perf_counter()
+            batch = go_batched.PositionBatch.initial_state(batch_size)
+            for move, color in zip(moves, itertools.cycle('XO')):
+                batch.play_moves(np.full(batch_size, move), color)
+            elapsed += time.perf_counter() - tick
+            assert batch.get_board(batch_size - 1) == final
+        assert (batch.get_liberties()[-1] == final_liberties).all()
+        results[batch_size] = batch_size * len(moves) * reps / elapsed
+    return results
+
+def measure_features(module, batch_sizes=(1, 16, 128, 1024), reps=10):
+    '''
+    Extract go_features planes for batches of positions taken from the
+    benchmark game, and return the number of positions per second for each
+    batch size. A warm-up pass fills the liberty and legal move caches of the
+    backends that keep them, so for those only the extraction is timed.
+    '''
+    import go_features
+    positions, colors = [], []
+    pos = module.Position.initial_state()
+    for move, color in zip(moves, itertools.cycle('XO')):
+        pos = pos.play_move(move, color)
+        if module is go_mutable:
+            # Every go_mutable position on a line of play shares one board
+            positions.append(go_mutable.Position(pos.board[:], pos.ko, pos.zobrist, geometry=pos.geometry))
+        else:
+            positions.append(pos)
+        colors.append('O' if color == 'X' else 'X')
+    go_features.extract_features(positions, colors)
+    results = {}
+    for batch_size in batch_sizes:
+        batch = list(itertools.islice(itertools.cycle(zip(positions, colors)), batch_size))
+        batch_positions, batch_colors = [p for p, c in batch], [c for p, c in batch]
+        out = go_features.allocate(batch_size)
+        tick = time.perf_counter()
+        for i in range(reps):
+            go_features.extract_features(batch_positions, batch_colors, out=out)
+        results[batch_size] = batch_size * reps / (time.perf_counter() - tick)
+    return results
+
 if __name__ == '__main__':
-    implementations = ["naive", "mutable", "sets"]
     parser = argparse.ArgumentParser(description='Play and benchmark a game of go.')
-    parser.add_argument('implementation', choices=implementations,
+    parser.add_argument('implementation', choices=list(IMPLEMENTATIONS) + ['batched'],
                         help='implementation to benchmark')
     parser.add_argument('runs', default=100, type=int,
-                   help='number of repetitions of the game to play')
+                   help='number of repetitions of the game to play (with --sgf, the maximum '
+                        'number of games to replay, or 0 for all)')
     parser.add_argument('--calc_libs', action='store_true')
+    parser.add_argument('--superko', action='store_true',
+                        help='report per-move cost of positional superko by game phase')
+    parser.add_argument('--persistent', action='store_true',
+                        help='also run go_sets with a copy-on-write LibertyTracker')
+    parser.add_argument('--compact', action='store_true',
+                        help='also run go_sets with a bitmask-based CompactLibertyTracker')
+    parser.add_argument('--union_find', action='store_true',
+                        help='also run go_mutable with union-find group tracking')
+    parser.add_argument('--sgf', nargs='+', metavar='PATH',
+                        help='replay the games in these .sgf files or directories')
+    parser.add_argument('--workers', default=1, type=int,
+                        help='spread the runs (or playouts) over this many processes')
+    parser.add_argument('--seed', default=0, type=int,
+                        help='seed for random playouts')
+    parser.add_argument('--playouts', action='store_true',
+                        help='run random playouts with a fixed seed instead of replaying a game')
+    parser.add_argument('--legal_moves', action='store_true',
+                        help='compare incremental legal move generation against probing every point')
+    parser.add_argument('--score', action='store_true',
+                        help='compare scoring after every move from scratch against incremental territory')
+    parser.add_argument('--undo', action='store_true',
+                        help='compare copy-per-node against make/unmake search (mutable only)')
+    parser.add_argument('--sizes', nargs='+', type=int, metavar='N',
+                        help='replay a random game on each of these board sizes, e.g. 9 13 19')
+    parser.add_argument('--features', action='store_true',
+                        help='extract neural net feature planes from batches of positions')
+    parser.add_argument('--memory', action='store_true',
+                        help='report the memory held per position while replaying a game')
+    parser.add_argument('--mcts', action='store_true',
+                        help='run a tree search of runs playouts on a 9x9 board (or each of --sizes)')
+    parser.add_argument('--game', action='store_true',
+                        help='compare bare play_move calls against the go_game.Game layer')
+    parser.add_argument('--ladders', action='store_true',
+                        help='read known ladder positions with go_sets.read_ladder (any implementation)')
+    parser.add_argument('--instrument', nargs='?', const='table', choices=('table', 'json'),
+                        help='replay the game with per-phase counters in play_move, printed as a table or JSON')
+    parser.add_argument('--symmetry', action='store_true',
+                        help='canonicalize every position of the game under the 8 board symmetries')
+    parser.add_argument('--dataset', action='store_true',
+                        help='write runs replays of the game to a position dataset file and read them back')
+    parser.add_argument('--from_board', action='store_true',
+                        help='build go_sets LibertyTrackers from every board of the game (any implementation)')
+    parser.add_argument('--transpositions', action='store_true',
+                        help='replay runs permuted move orders of the game, caching evaluations by position')
+    parser.add_argument('--tt_capacity', default=1 << 14, type=int,
+                        help='number of transposition table slots, for --transpositions')
 
     args = parser.parse_args()
+    module = IMPLEMENTATIONS.get(args.implementation)
 
-    if args.implementation == 'naive':
-      elapsed = measure_game_exec(go_naive.Position.initial_state, reps=args.runs, calc_libs=args.calc_libs)
-      print("go_naive takes %.4f secs to play a game that's 288 moves long" % elapsed)
-    elif args.implementation == 'mutable':
-      elapsed = measure_game_exec(go_mutable.Position.initial_state, reps=args.runs, calc_libs=args.calc_libs)
-      print("go_mutable takes %.4f secs to play a game that's 288 moves long" % elapsed)
+    if args.implementation == 'batched':
+        for batch_size, rate in measure_batched(reps=args.runs).items():
+            print("go_batched plays %.0f boards/sec at a batch size of %d" % (rate, batch_size))
+    elif args.workers > 1:
+        stats = measure_parallel(args.implementation, args.runs, args.workers, playouts=args.playouts,
+                                 seed=args.seed, calc_libs=args.calc_libs)
+        unit = 'playouts' if args.playouts else 'games'
+        print("%s runs %.1f %s/sec over %d workers (per worker: %.1f +- %.1f %s/sec)" % (
+            module.__name__, stats['throughput'], unit, stats['workers_used'],
+            stats['worker_mean'], stats['worker_stdev'], unit))
+        if args.playouts:
+            print("mean score %.2f" % (sum(stats['scores']) / args.runs))
+    elif args.playouts:
+        rate, mean_score = measure_playouts(module, reps=args.runs, seed=args.seed)
+        print("%s runs %.1f playouts/sec (mean score %.2f)" % (module.__name__, rate, mean_score))
+    elif args.legal_moves:
+        per_position = measure_legal_moves(module, reps=args.runs)
+        print("%s legal moves: %.1f us per position probing play_move, %.1f us incrementally" % (
+            module.__name__, per_position['probe'] * 1e6, per_position['incremental'] * 1e6))
+    elif args.sgf:
+        stats = measure_replay(module, args.sgf, max_games=args.runs)
+        print("%s replayed %d games (%d moves) in %.2f secs: %.1f games/sec, %.0f moves/sec" % (
+            module.__name__, stats['games'], stats['moves'], stats['elapsed'],
+            stats['games'] / stats['elapsed'], stats['moves'] / stats['elapsed']))
+        print("excluding parsing: %.1f games/sec, %.0f moves/sec" % (
+            stats['games'] / stats['replay_elapsed'], stats['moves'] / stats['replay_elapsed']))
+        print("%d games skipped, %d games with illegal moves" % (len(stats['skipped']), len(stats['illegal'])))
+        for game_num, message in stats['illegal'][:10]:
+            print("  game %d: %s" % (game_num, message))
+    elif args.instrument:
+        variants = [(module.__name__, module.Position.initial_state)]
+        if args.persistent and module is go_sets:
+            variants.append(('go_sets with a persistent LibertyTracker',
+                             functools.partial(go_sets.Position.initial_state, persistent=True)))
+        if args.compact and module is go_sets:
+            variants.append(('go_sets with a compact LibertyTracker',
+                             functools.partial(go_sets.Position.initial_state, compact=True)))
+        if args.union_find and module is go_mutable:
+            variants.append(('go_mutable with union-find group tracking',
+                             functools.partial(go_mutable.Position.initial_state, union_find=True)))
+        reports = {}
+        for label, initial_state in variants:
+            instrumentation = measure_instrumented(initial_state, module, reps=args.runs, calc_libs=args.calc_libs)
+            reports[label] = instrumentation.report()
+            if args.instrument == 'table':
+                print(instrumentation.table(label))
+        if args.instrument == 'json':
+            print(json.dumps(reports, indent=2))
+    elif args.symmetry:
+        rates = measure_symmetry(module, reps=args.runs)
+        print("%s canonicalizes %.0f positions/sec from scratch, %.0f positions/sec incrementally" % (
+            module.__name__, rates['scratch'], rates['incremental']))
+    elif args.dataset:
+        rates = measure_dataset(module, reps=args.runs, seed=args.seed)
+        print("%s datasets: writes %.0f positions/sec, reads %.0f positions/sec in order, %.0f positions/sec "
+              "at random, %.0f positions/sec as NumPy points" % (
+            module.__name__, rates['write'], rates['sequential'], rates['random'], rates['numpy']))
+    elif args.from_board:
+        per_board = measure_from_board(reps=args.runs)
+        print("go_sets builds a LibertyTracker in %.1f us per board with from_board, %.1f us with from_boards, "
+              "%.1f us the old way" % (
+            per_board['from_board'] * 1e6, per_board['from_boards'] * 1e6, per_board['reference'] * 1e6))
+    elif args.game:
+        per_game = measure_game_layer(module, reps=args.runs)
+        print("%s plays the game in %.4f secs with play_move, %.4f secs through a Game" % (
+            module.__name__, per_game['play_move'], per_game['game']))
+    elif args.ladders:
+        stats = measure_ladders(reps=args.runs)
+        print("go_sets reads %d ladders (%d escape) in %.1f us per query with read_ladder, "
+              "%.1f us playing each move on a new Position" % (
+            stats['positions'], stats['escapes'], stats['read_ladder'] * 1e6, stats['reference'] * 1e6))
+    elif args.transpositions:
+        stats = measure_transpositions(module, num_games=args.runs, capacity=args.tt_capacity, seed=args.seed)
+        print("%s replays %d permuted games in %.2f secs evaluating from scratch, %.2f secs with a "
+              "transposition table (%.1f%% hits, %d evictions)" % (
+            module.__name__, stats['games'], stats['scratch'], stats['table'], stats['hit_rate'] * 100,
+            stats['evictions']))
+    elif args.mcts:
+        for size in args.sizes or [9]:
+            stats = measure_mcts(module, playouts=args.runs, size=size, seed=args.seed)
+            print("%s searches %.0f nodes/sec (%.1f playouts/sec) on %dx%d, holding %.0f bytes per node over %d nodes" % (
+                module.__name__, stats['nodes_per_sec'], stats['playouts_per_sec'], size, size,
+                stats['bytes_per_node'], stats['nodes']))
+    elif args.sizes:
+        for size, per_move in measure_sizes(module, sizes=args.sizes, reps=args.runs, seed=args.seed).items():
+            print("%s takes %.1f us per move on %dx%d" % (module.__name__, per_move * 1e6, size, size))
+    elif args.features:
+        for batch_size, rate in measure_features(module, reps=args.runs).items():
+            print("%s extracts features from %.0f positions/sec at a batch size of %d" % (
+                module.__name__, rate, batch_size))
+    elif args.memory:
+        variants = [(module.__name__, module.Position.initial_state)]
+        if args.persistent and module is go_sets:
+            variants.append(('go_sets with a persistent LibertyTracker',
+                             functools.partial(go_sets.Position.initial_state, persistent=True)))
+        if args.compact and module is go_sets:
+            variants.append(('go_sets with a compact LibertyTracker',
+                             functools.partial(go_sets.Position.initial_state, compact=True)))
+        for label, initial_state in variants:
+            per_position = measure_memory(initial_state)
+            print("%s holds %s bytes per position after %s moves" % (
+                label, '/'.join('%.0f' % size for size in per_position.values()),
+                '/'.join(str(num_moves) for num_moves in per_position)))
+    elif args.score:
+        per_move = measure_score(module, reps=args.runs)
+        print("%s scoring every move: %.1f us per move from scratch, %.1f us incrementally" % (
+            module.__name__, per_move['full'] * 1e6, per_move['incremental'] * 1e6))
+    elif args.undo:
+        per_trial = measure_undo(reps=args.runs)
+        print("go_mutable trial moves: %.1f us with a board copy, %.1f us with make/unmake" % (
+            per_trial['copy'] * 1e6, per_trial['undo'] * 1e6))
+    elif args.superko:
+        per_move = measure_superko_overhead(module, reps=args.runs)
+        print("%s microseconds per move, by game phase:" % module.__name__)
+        for label in ('plain', 'superko', 'rehash'):
+            print("%8s: %s" % (label, ' '.join('%8.1f' % (t * 1e6) for t in per_move[label])))
     else:
-      elapsed = measure_game_exec(go_sets.Position.initial_state, reps=args.runs, calc_libs=args.calc_libs)
-      print("go_sets takes %.4f secs to play a game that's 288 moves long" % elapsed)
+        elapsed = measure_game_exec(module.Position.initial_state, reps=args.runs, calc_libs=args.calc_libs)
+        print("%s takes %.4f secs to play a game that's 288 moves long" % (module.__name__, elapsed))
+        if args.persistent and module is go_sets:
+            initial_state = functools.partial(go_sets.Position.initial_state, persistent=True)
+            elapsed = measure_game_exec(initial_state, reps=args.runs, calc_libs=args.calc_libs)
+            print("go_sets with a persistent LibertyTracker takes %.4f secs to play a game that's 288 moves long" % elapsed)
+        if args.compact and module is go_sets:
+            initial_state = functools.partial(go_sets.Position.initial_state, compact=True)
+            elapsed = measure_game_exec(initial_state, reps=args.runs, calc_libs=args.calc_libs)
+            print("go_sets with a compact LibertyTracker takes %.4f secs to play a game that's 288 moves long" % elapsed)
+        if args.union_find and module is go_mutable:
+            initial_state = functools.partial(go_mutable.Position.initial_state, union_find=True)
+            elapsed = measure_game_exec(initial_state, reps=args.runs, calc_libs=args.calc_libs)
+            print("go_mutable with union-find groups takes %.4f secs to play a game that's 288 moves long" % elapsed)
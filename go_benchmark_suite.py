@@ -0,0 +1,207 @@
+'''
+A suite of benchmark scenarios, each run against every backend with warmup
+and repeats, reporting the median and 95th percentile time per repeat.
+Results can be saved as JSON, and compared against a saved baseline:
+
+    python go_benchmark_suite.py --json baseline.json
+    python go_benchmark_suite.py --baseline baseline.json --threshold 0.1
+
+The second run exits with status 1 if any scenario got slower than the
+baseline by more than the threshold on any backend.
+'''
+import argparse
+import itertools
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+import go_benchmark
+from go_benchmark import IMPLEMENTATIONS, moves
+
+# Scenario name to setup function. A setup function takes a backend module,
+# does any preparation that shouldn't be timed, and returns a function that
+# runs one repeat of the scenario.
+SCENARIOS = {}
+
+def scenario(name):
+    'Decorator registering a setup function as a scenario'
+    def register(setup):
+        SCENARIOS[name] = setup
+        return setup
+    return register
+
+@scenario('game')
+def setup_game(module):
+    'Replay the benchmark game'
+    def run():
+        pos = module.Position.initial_state()
+        for move, color in zip(moves, itertools.cycle('XO')):
+            pos = pos.play_move(move, color)
+    return run
+
+@scenario('liberties')
+def setup_liberties(module):
+    'Replay the benchmark game, getting the liberties after every move'
+    def run():
+        pos = module.Position.initial_state()
+        for move, color in zip(moves, itertools.cycle('XO')):
+            pos = pos.play_move(move, color)
+            pos.get_liberties()
+    return run
+
+@scenario('score')
+def setup_score(module):
+    'Replay the benchmark game, scoring after every move'
+    def run():
+        pos = module.Position.initial_state()
+        for move, color in zip(moves, itertools.cycle('XO')):
+            pos = pos.play_move(move, color)
+            pos.score()
+    return run
+
+@scenario('playouts')
+def setup_playouts(module):
+    'Run two seeded random playouts from the empty board'
+    def run():
+        go_benchmark.run_playouts(module, 0, 2)
+    return run
+
+def capture_board(n=19):
+    '''
+    A board of alternating columns: empty, black, white, black. Each white
+    column is left one liberty at its top, so that black captures the whole
+    column by playing there. Returns the board and the capturing points.
+    '''
+    columns = {0: '.', 1: 'X', 2: 'O', 3: 'X'}
+    board = [columns[col % 4] for row in range(n) for col in range(n)]
+    captures = [col for col in range(n) if col % 4 == 2]
+    for fc in captures:
+        board[fc] = '.'
+    return ''.join(board), captures
+
+@scenario('captures')
+def setup_captures(module):
+    'Capture each of the white columns of capture_board from the same position'
+    board, captures = capture_board()
+    pos = module.Position.initial_state()
+    for fc, color in enumerate(board):
+        if color != '.':
+            pos = pos.play_move(fc, color)
+    in_place = hasattr(pos, 'undo_move')
+    def run():
+        for i in range(10):
+            for fc in captures:
+                captured_position = pos.play_move(fc, 'X')
+                if in_place:
+                    captured_position.undo_move()
+    return run
+
+def summarize(times):
+    'Median, 95th percentile (nearest rank), mean, standard deviation and minimum of a list of times'
+    ordered = sorted(times)
+    return {
+        'median': statistics.median(ordered),
+        'p95': ordered[math.ceil(0.95 * len(ordered)) - 1],
+        'mean': statistics.fmean(ordered),
+        'stdev': statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        'min': ordered[0],
+        'repeats': len(ordered),
+    }
+
+def run_scenario(name, module, warmup=1, repeats=10):
+    'Run one scenario on one backend, returning the summary of its repeat times'
+    run = SCENARIOS[name](module)
+    for i in range(warmup):
+        run()
+    times = []
+    for i in range(repeats):
+        tick = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - tick)
+    return summarize(times)
+
+def run_suite(scenarios=None, implementations=None, warmup=1, repeats=10, report=None):
+    '''
+    Run every scenario against every backend. Returns a dict of scenario name
+    to a dict of implementation name to summary. report, if given, is called
+    with (scenario, implementation, summary) as each one finishes.
+    '''
+    results = {}
+    for name in scenarios or SCENARIOS:
+        results[name] = {}
+        for implementation in implementations or IMPLEMENTATIONS:
+            summary = run_scenario(name, IMPLEMENTATIONS[implementation], warmup=warmup, repeats=repeats)
+            results[name][implementation] = summary
+            if report is not None:
+                report(name, implementation, summary)
+    return results
+
+def compare(results, baseline, threshold=0.1):
+    '''
+    Compare median times against a baseline from an earlier run. Returns a
+    list of (scenario, implementation, baseline median, median, ratio) for
+    each one in both, and a list of those whose ratio exceeds 1 + threshold.
+    '''
+    comparisons = []
+    for name, by_implementation in results.items():
+        for implementation, summary in by_implementation.items():
+            base = baseline.get(name, {}).get(implementation)
+            if base is not None:
+                comparisons.append((name, implementation, base['median'], summary['median'],
+                                    summary['median'] / base['median']))
+    regressions = [comparison for comparison in comparisons if comparison[4] > 1 + threshold]
+    return comparisons, regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the benchmark scenarios against every backend.')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS),
+                        help='scenarios to run (default: all)')
+    parser.add_argument('--implementations', nargs='+', choices=list(IMPLEMENTATIONS),
+                        help='backends to run them on (default: all)')
+    parser.add_argument('--warmup', default=1, type=int,
+                        help='untimed runs of each scenario before timing')
+    parser.add_argument('--repeats', default=10, type=int,
+                        help='timed runs of each scenario')
+    parser.add_argument('--json', metavar='PATH',
+                        help='save the results to this file')
+    parser.add_argument('--baseline', metavar='PATH',
+                        help='compare against results saved with --json, failing on regressions')
+    parser.add_argument('--threshold', default=0.1, type=float,
+                        help='slowdown of the median, as a fraction, that counts as a regression')
+    args = parser.parse_args(argv)
+
+    def report(name, implementation, summary):
+        print("%-10s %-10s median %9.3f ms  p95 %9.3f ms  (+- %.3f ms over %d repeats)" % (
+            name, implementation, summary['median'] * 1e3, summary['p95'] * 1e3, summary['stdev'] * 1e3,
+            summary['repeats']))
+
+    results = run_suite(args.scenarios, args.implementations, warmup=args.warmup, repeats=args.repeats,
+                        report=report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'warmup': args.warmup,
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        comparisons, regressions = compare(results, baseline, args.threshold)
+        print()
+        for name, implementation, base_median, median, ratio in comparisons:
+            flag = '  REGRESSION' if ratio > 1 + args.threshold else ''
+            print("%-10s %-10s %9.3f ms -> %9.3f ms  (%+.1f%%)%s" % (
+                name, implementation, base_median * 1e3, median * 1e3, (ratio - 1) * 100, flag))
+        if regressions:
+            print("%d regression(s) past the %.0f%% threshold" % (len(regressions), args.threshold * 100))
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
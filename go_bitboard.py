@@ -0,0 +1,389 @@
+from collections import namedtuple
+from go_geometry import get_geometry, geometry_for_board
+from go_serialize import encode_position, decode_position
+from go_symmetry import update_symmetry_hashes
+N = 19
+NN = N ** 2
+WHITE, BLACK, EMPTY = 'O', 'X', '.'
+
+def swap_colors(color):
+    if color == BLACK:
+        return WHITE
+    elif color == WHITE:
+        return BLACK
+    else:
+        return color
+
+EMPTY_BOARD = EMPTY * NN
+
+def flatten(c):
+    return N * c[0] + c[1]
+
+# Convention: coords that have been flattened have a "f" prefix
+def unflatten(fc):
+    return divmod(fc, N)
+
+# Boards are stored as a pair of NN-bit integers, one per color, where bit fc
+# is set if that color has a stone at fc. Shifting a mask by 1 moves every
+# stone one column over, so stones in the edge column have to be masked off
+# first to stop them wrapping around onto the next row. The masks for each
+# board size live on its Geometry; the functions below take the geometry as
+# an optional last argument, defaulting to 19x19.
+GEOMETRY = get_geometry(N)
+FULL_BOARD = GEOMETRY.full_board
+NOT_FIRST_COLUMN = GEOMETRY.not_first_column
+NOT_LAST_COLUMN = GEOMETRY.not_last_column
+
+def adjacent(mask, geometry=GEOMETRY):
+    'Return the mask of points orthogonally adjacent to any point in mask'
+    n = geometry.n
+    return (((mask & geometry.not_last_column) << 1) | ((mask & geometry.not_first_column) >> 1)
+            | (mask << n) | (mask >> n)) & geometry.full_board
+
+def iter_points(mask):
+    'Yield the flat coordinates of each bit set in mask'
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+# Zobrist hashing: one random 64-bit key per (color, point). The hash of a
+# board is the XOR of the keys of every stone on it, so it can be updated
+# incrementally as stones are placed and captured. The empty board hashes to 0.
+ZOBRIST = GEOMETRY.zobrist
+
+# Translation tables from a board string to the binary digits of each color's bitmask
+BLACK_BITS = str.maketrans({BLACK: '1', WHITE: '0', EMPTY: '0'})
+WHITE_BITS = str.maketrans({BLACK: '0', WHITE: '1', EMPTY: '0'})
+
+def zobrist_hash(board):
+    keys = geometry_for_board(board).zobrist
+    h = 0
+    for fc, color in enumerate(board):
+        if color != EMPTY:
+            h ^= keys[color][fc]
+    return h
+
+def find_chain(stones, seed, geometry=GEOMETRY):
+    'Grow seed into the chain of stones it belongs to'
+    chain = seed
+    while True:
+        grown = (chain | adjacent(chain, geometry)) & stones
+        if grown == chain:
+            return chain
+        chain = grown
+
+class IllegalMove(Exception): pass
+
+def update_legal_moves(legal_moves, black, white, ko, region, geometry=GEOMETRY):
+    '''
+    Recompute whether each color may play at the points in region.
+    legal_moves is a dict of color to bitmask of legal points; an updated copy
+    is returned.
+    '''
+    empty = geometry.full_board ^ (black | white)
+    candidates = region & empty
+    if ko is not None:
+        candidates &= ~(1 << ko)
+    # Any point next to an empty point is legal for both colors. Otherwise a
+    # point is legal if it connects to a friendly group with a liberty to
+    # spare, or if it captures an opponent group in atari.
+    legal = {BLACK: candidates & adjacent(empty, geometry), WHITE: candidates & adjacent(empty, geometry)}
+    for color, stones in ((BLACK, black), (WHITE, white)):
+        nearby = stones & adjacent(candidates, geometry)
+        while nearby:
+            chain = find_chain(stones, nearby & -nearby, geometry)
+            liberties = adjacent(chain, geometry) & empty
+            if liberties & (liberties - 1):
+                legal[color] |= liberties & candidates
+            else:
+                legal[swap_colors(color)] |= liberties & candidates
+            nearby &= ~chain
+    return {color: (legal_moves[color] & ~region) | legal[color] for color in (BLACK, WHITE)}
+
+def liberties_from_board(black, white, geometry=GEOMETRY):
+    empty = geometry.full_board ^ (black | white)
+    liberties = bytearray(geometry.nn)
+    for stones in (white, black):
+        while stones:
+            chain = find_chain(stones, stones & -stones, geometry)
+            num_libs = (adjacent(chain, geometry) & empty).bit_count()
+            for fs in iter_points(chain):
+                liberties[fs] = num_libs
+            stones ^= chain
+    return liberties
+
+def update_liberties(liberties, black, white, move, captured, geometry=GEOMETRY):
+    '''
+    Update the liberty counts of the chains touched by the stone played at
+    move (a single bit mask): the chain at move, the opponent chains next to
+    it, and the chains next to the captured stones, whose counts are reset to
+    0. liberties is a NN-length bytearray; an updated copy is returned.
+    '''
+    liberties = liberties[:]
+    for fs in iter_points(captured):
+        liberties[fs] = 0
+    empty = geometry.full_board ^ (black | white)
+    seeds = move | adjacent(move | captured, geometry)
+    for stones in (white, black):
+        nearby = seeds & stones
+        while nearby:
+            chain = find_chain(stones, nearby & -nearby, geometry)
+            num_libs = (adjacent(chain, geometry) & empty).bit_count()
+            for fs in iter_points(chain):
+                liberties[fs] = num_libs
+            nearby &= ~chain
+    return liberties
+
+class Territory(namedtuple('Territory', ['regions', 'score'])):
+    '''
+    The empty regions of a board, kept up to date as moves are played so that
+    scoring doesn't need to flood fill the whole board.
+
+    regions: a dict of the bitmask of each empty region to the area it adds
+        to the score
+    score: the area score of the board, stones plus territory
+    '''
+    pass
+
+def region_score(region, black, white, geometry=GEOMETRY):
+    'Territory belongs to a color if only that color borders it'
+    borders = adjacent(region, geometry)
+    if not borders & white:
+        return region.bit_count() if borders & black else 0
+    return 0 if borders & black else -region.bit_count()
+
+def add_regions(regions, empty, black, white, geometry=GEOMETRY):
+    'Split the empty points into regions, add them to regions, and return their score'
+    score = 0
+    while empty:
+        region = find_chain(empty, empty & -empty, geometry)
+        regions[region] = region_score(region, black, white, geometry)
+        score += regions[region]
+        empty ^= region
+    return score
+
+def territory_from_board(black, white, geometry=GEOMETRY):
+    regions = {}
+    score = black.bit_count() - white.bit_count()
+    score += add_regions(regions, geometry.full_board ^ (black | white), black, white, geometry)
+    return Territory(regions, score)
+
+def update_territory(territory, black, white, move, captured, geometry=GEOMETRY):
+    '''
+    Update territory for the stone played at move (a single bit mask) and the
+    stones it captured, to match black and white; an updated copy is returned.
+    Only the region the move was played in and the regions next to captured
+    stones are affected. When nothing is captured and the move's empty
+    neighbors are still joined within a few points of it, the region is
+    rescored without a flood fill.
+    '''
+    regions = territory.regions.copy()
+    num_stones = 1 + captured.bit_count()
+    score = territory.score + (num_stones if black & move else -num_stones)
+    for region in territory.regions:
+        if region & move:
+            break
+    score -= regions.pop(region)
+    remaining = region ^ move
+    if not captured:
+        empty_neighbors = adjacent(move, geometry) & remaining
+        if not empty_neighbors:
+            return Territory(regions, score)
+        # Walking around the move joins any two of its neighbors in 4 steps
+        reached = empty_neighbors & -empty_neighbors
+        for i in range(4):
+            reached = (reached | adjacent(reached, geometry)) & remaining
+        if not empty_neighbors & ~reached:
+            regions[remaining] = region_score(remaining, black, white, geometry)
+            return Territory(regions, score + regions[remaining])
+
+    # The region was split, or merged with the captured stones and the regions
+    # around them: flood fill all of them again
+    stale = remaining | captured
+    if captured:
+        captured_neighbors = adjacent(captured, geometry)
+        for region in territory.regions:
+            if region & captured_neighbors and region in regions:
+                score -= regions.pop(region)
+                stale |= region
+    return Territory(regions, score + add_regions(regions, stale, black, white, geometry))
+
+class Position(namedtuple('Position', ['black', 'white', 'ko', 'zobrist', 'history', 'geometry'],
+                          defaults=[GEOMETRY])):
+    '''
+    black, white: bitmasks of the stones of each color
+    zobrist: Zobrist hash of the board.
+    history: None, or a frozenset of the Zobrist hashes of every position seen
+        so far, in which case moves that repeat a position are rejected
+        (positional superko). Each position returned by play_move gets its own
+        history, extended with its hash.
+    geometry: the Geometry for the size of the board. Defaults to 19x19.
+    '''
+    # legal_moves_cache: None, or a dict of color to bitmask of legal points, kept up
+    # to date incrementally by play_move once legal_moves() has been called.
+    legal_moves_cache = None
+    # territory_cache: None, or the Territory of the board, kept up to date
+    # incrementally by play_move once score() has been called.
+    territory_cache = None
+    # liberties_cache: None, or a bytearray of the liberty count of the chain at
+    # each point, kept up to date incrementally by play_move once
+    # get_liberties() has been called.
+    liberties_cache = None
+    # symmetry_cache: None, or a tuple of the Zobrist hash of the board under each
+    # of the 8 symmetries, kept up to date incrementally by play_move once
+    # go_symmetry.symmetry_hashes() has been called.
+    symmetry_cache = None
+    # captures: the number of stones captured by the move that led to this
+    # position, set by play_move.
+    captures = 0
+
+    @staticmethod
+    def initial_state(superko=False, size=N):
+        return Position(black=0, white=0, ko=None, zobrist=0, history=frozenset([0]) if superko else None,
+                        geometry=get_geometry(size))
+
+    @staticmethod
+    def from_bytes(data, superko=False):
+        'Return the Position serialized by to_bytes, and the color to play'
+        board, ko, to_play, n = decode_position(data)
+        # Reversed, so that the first point is the lowest bit
+        reversed_board = board[::-1]
+        black = int(reversed_board.translate(BLACK_BITS), 2)
+        white = int(reversed_board.translate(WHITE_BITS), 2)
+        zobrist = zobrist_hash(board)
+        return Position(black, white, ko, zobrist, frozenset([zobrist]) if superko else None, get_geometry(n)), to_play
+
+    def to_bytes(self, to_play):
+        'Serialize the position with to_play to move, in the format of go_serialize'
+        return encode_position(self.get_board(), self.ko, to_play, self.geometry.n)
+
+    @property
+    def board(self):
+        return self.get_board()
+
+    def get_board(self):
+        board = bytearray(self.geometry.empty_board, encoding='ascii')
+        for color, stones in ((BLACK, self.black), (WHITE, self.white)):
+            color = ord(color)
+            for fs in iter_points(stones):
+                board[fs] = color
+        return board.decode('ascii')
+
+    def __str__(self):
+        import textwrap
+        return '\n'.join(textwrap.wrap(self.get_board(), self.geometry.n))
+
+    def play_move(self, fc, color):
+        black, white, ko, zobrist, history, geometry = self
+        if fc == ko:
+            raise IllegalMove("%s\n Move at %s illegally retakes ko." % (self, fc))
+
+        move = 1 << fc
+        if (black | white) & move:
+            raise IllegalMove("%s\n Stone exists at %s." % (self, fc))
+
+        if color == BLACK:
+            mine, theirs = black, white
+        else:
+            mine, theirs = white, black
+        opp_color = swap_colors(color)
+
+        move_neighbors = adjacent(move, geometry)
+        koish = not (move_neighbors & ~theirs)
+        mine |= move
+        empty = geometry.full_board ^ (mine | theirs)
+
+        captured = 0
+        opp_neighbors = move_neighbors & theirs
+        while opp_neighbors:
+            chain = find_chain(theirs, opp_neighbors & -opp_neighbors, geometry)
+            if not adjacent(chain, geometry) & empty:
+                captured |= chain
+            opp_neighbors &= ~chain
+
+        if captured:
+            theirs ^= captured
+            empty |= captured
+        elif not adjacent(find_chain(mine, move, geometry), geometry) & empty:
+            # Only possible to be suicide if nothing was captured
+            raise IllegalMove("\n%s\n Move at %s is suicide." % (self, fc))
+
+        new_zobrist = zobrist ^ geometry.zobrist[color][fc]
+        opp_keys = geometry.zobrist[opp_color]
+        for fs in iter_points(captured):
+            new_zobrist ^= opp_keys[fs]
+
+        if history is not None:
+            if new_zobrist in history:
+                raise IllegalMove("\n%s\n Move at %s repeats a previous position." % (self, fc))
+            history = history | {new_zobrist}
+
+        if koish and captured and not captured & (captured - 1):
+            new_ko = captured.bit_length() - 1
+        else:
+            new_ko = None
+
+        if color == BLACK:
+            new_position = Position(mine, theirs, new_ko, new_zobrist, history, geometry)
+        else:
+            new_position = Position(theirs, mine, new_ko, new_zobrist, history, geometry)
+        if captured:
+            new_position.captures = captured.bit_count()
+
+        if self.legal_moves_cache is not None:
+            # Points whose legality may have changed: the move, the captured
+            # stones, and the liberties of every chain next to either.
+            touched = move | captured
+            nearby = adjacent(touched, geometry)
+            touched_chains = find_chain(mine, (nearby & mine) | move, geometry) | find_chain(theirs, nearby & theirs, geometry)
+            region = touched | (adjacent(touched_chains, geometry) & empty)
+            for fp in (ko, new_ko):
+                if fp is not None:
+                    region |= 1 << fp
+            new_position.legal_moves_cache = update_legal_moves(
+                self.legal_moves_cache, new_position.black, new_position.white, new_ko, region, geometry)
+        if self.territory_cache is not None:
+            new_position.territory_cache = update_territory(
+                self.territory_cache, new_position.black, new_position.white, move, captured, geometry)
+        if self.liberties_cache is not None:
+            new_position.liberties_cache = update_liberties(
+                self.liberties_cache, new_position.black, new_position.white, move, captured, geometry)
+        if self.symmetry_cache is not None:
+            new_position.symmetry_cache = update_symmetry_hashes(
+                self.symmetry_cache, geometry.n, color, fc, opp_color, list(iter_points(captured)))
+        return new_position
+
+    def pass_move(self):
+        'Pass, which leaves the board as is and clears the ko'
+        new_position = self._replace(ko=None)
+        if self.legal_moves_cache is not None and self.ko is not None:
+            new_position.legal_moves_cache = update_legal_moves(
+                self.legal_moves_cache, self.black, self.white, None, 1 << self.ko, self.geometry)
+        else:
+            new_position.legal_moves_cache = self.legal_moves_cache
+        new_position.territory_cache = self.territory_cache
+        new_position.liberties_cache = self.liberties_cache
+        new_position.symmetry_cache = self.symmetry_cache
+        return new_position
+
+    def legal_moves(self, color):
+        '''
+        Return a bitmask of the points where color may play, with bit fc set if
+        fc is legal. Positional superko is not taken into account.
+        '''
+        if self.legal_moves_cache is None:
+            self.legal_moves_cache = update_legal_moves(
+                {BLACK: 0, WHITE: 0}, self.black, self.white, self.ko, self.geometry.full_board, self.geometry)
+        return self.legal_moves_cache[color]
+
+    def score(self):
+        if self.territory_cache is None:
+            self.territory_cache = territory_from_board(self.black, self.white, self.geometry)
+        return self.territory_cache.score
+
+    def get_liberties(self):
+        'Return a read-only view of the liberty count of the chain at each point'
+        if self.liberties_cache is None:
+            self.liberties_cache = liberties_from_board(self.black, self.white, self.geometry)
+        return memoryview(self.liberties_cache).toreadonly()
@@ -0,0 +1,300 @@
+'''
+Flood fills and the incremental caches built on them, shared by the backends
+that keep a board of points: go_naive and go_sets, whose boards are strings
+of 'X', 'O' and '.', and go_mutable, whose boards are bytearrays of their
+byte values. Functions find the colors to compare against from the type of
+the board they are given.
+'''
+from collections import namedtuple
+from go_geometry import get_geometry
+# The black, white and empty colors of each type of board
+BOARD_COLORS = {
+    str: ('X', 'O', '.'),
+    bytearray: (ord('X'), ord('O'), ord('.')),
+}
+# Neighbors are indexed by flat coordinates. Functions default to the 19x19
+# table, and take another Geometry's as an optional last argument.
+NEIGHBORS = get_geometry(19).neighbors
+
+def find_reached(board, fc, neighbors=NEIGHBORS):
+    color = board[fc]
+    chain = set([fc])
+    reached = set()
+    frontier = [fc]
+    while frontier:
+        current_fc = frontier.pop()
+        chain.add(current_fc)
+        for fn in neighbors[current_fc]:
+            if board[fn] == color and not fn in chain:
+                frontier.append(fn)
+            elif board[fn] != color:
+                reached.add(fn)
+    return chain, reached
+
+class LazyLiberties(dict):
+    'Liberty counts of the stones on board, flood filling each group on first lookup'
+    def __init__(self, board, neighbors=NEIGHBORS):
+        self.board = board
+        self.neighbors = neighbors
+        self.empty = BOARD_COLORS[type(board)][2]
+
+    def __missing__(self, fs):
+        board, empty = self.board, self.empty
+        chain, reached = find_reached(board, fs, self.neighbors)
+        num_libs = len([fr for fr in reached if board[fr] == empty])
+        for fc in chain:
+            self[fc] = num_libs
+        return num_libs
+
+def is_legal_move(board, fc, color, liberties, neighbors=NEIGHBORS):
+    'Check if color can play at the empty point fc without committing suicide'
+    empty = BOARD_COLORS[type(board)][2]
+    for fn in neighbors[fc]:
+        neighbor_color = board[fn]
+        if neighbor_color == empty:
+            return True
+        elif neighbor_color == color:
+            if liberties[fn] > 1:
+                return True
+        elif liberties[fn] == 1:
+            return True
+    return False
+
+def update_legal_moves(legal_moves, board, ko, points, neighbors=NEIGHBORS, liberties=None):
+    '''
+    Recompute whether each color may play at each of points.
+    legal_moves is a dict of color to bitmask of legal points, with bit fc set
+    if fc is legal; an updated copy is returned. liberties maps each stone to
+    the liberty count of its group, and is found by flood filling the groups
+    next to points if not given.
+    '''
+    black, white, empty = BOARD_COLORS[type(board)]
+    if liberties is None:
+        liberties = LazyLiberties(board, neighbors)
+    black_legal, white_legal = legal_moves[black], legal_moves[white]
+    for fc in points:
+        bit = 1 << fc
+        black_legal &= ~bit
+        white_legal &= ~bit
+        if board[fc] == empty and fc != ko:
+            if is_legal_move(board, fc, black, liberties, neighbors):
+                black_legal |= bit
+            if is_legal_move(board, fc, white, liberties, neighbors):
+                white_legal |= bit
+    return {black: black_legal, white: white_legal}
+
+def touched_points(board, fc, seeds, captured, neighbors=NEIGHBORS):
+    '''
+    Points whose legality may have changed after a stone was played at fc:
+    fc, the captured stones, and the liberties of every group that gained or
+    lost a liberty (the group at fc, and the groups of the stones in seeds).
+    '''
+    empty = BOARD_COLORS[type(board)][2]
+    points = set(captured)
+    points.add(fc)
+    seeds = set(seeds)
+    seeds.add(fc)
+    for fs in captured:
+        seeds.update(neighbors[fs])
+    seen = set()
+    for fs in seeds:
+        if board[fs] == empty or fs in seen:
+            continue
+        chain, reached = find_reached(board, fs, neighbors)
+        seen.update(chain)
+        points.update(fr for fr in reached if board[fr] == empty)
+    return points
+
+def liberties_from_board(board, neighbors=NEIGHBORS):
+    'Return a bytearray of the liberty count of the group at each point'
+    empty = BOARD_COLORS[type(board)][2]
+    liberties = bytearray(len(board))
+    seen = set()
+    for fc, color in enumerate(board):
+        if color == empty or fc in seen:
+            continue
+        chain, reached = find_reached(board, fc, neighbors)
+        seen.update(chain)
+        num_libs = len([fr for fr in reached if board[fr] == empty])
+        for fs in chain:
+            liberties[fs] = num_libs
+    return liberties
+
+def update_liberties(liberties, board, fc, seeds, captured, neighbors=NEIGHBORS):
+    '''
+    Update the liberty counts of the groups touched by a stone played at fc:
+    the group at fc, the groups of the stones in seeds, and the groups next to
+    the captured stones, whose counts are reset to 0. liberties is a NN-length
+    bytearray; an updated copy is returned.
+    '''
+    empty = BOARD_COLORS[type(board)][2]
+    liberties = liberties[:]
+    seeds = set(seeds)
+    seeds.add(fc)
+    for fs in captured:
+        liberties[fs] = 0
+        seeds.update(neighbors[fs])
+    seen = set()
+    for fs in seeds:
+        if board[fs] == empty or fs in seen:
+            continue
+        chain, reached = find_reached(board, fs, neighbors)
+        seen.update(chain)
+        num_libs = len([fr for fr in reached if board[fr] == empty])
+        for fc in chain:
+            liberties[fc] = num_libs
+    return liberties
+
+class Region(namedtuple('Region', ['points', 'black_borders', 'white_borders'])):
+    '''
+    points: a set of the points of a connected empty region
+    black_borders, white_borders: the number of neighboring pairs of a point
+        in this region and a stone of each color
+    '''
+    def score(self):
+        'Territory belongs to a color if only that color borders it'
+        if not self.white_borders:
+            return len(self.points) if self.black_borders else 0
+        return 0 if self.black_borders else -len(self.points)
+
+class Territory(namedtuple('Territory', ['region_index', 'regions', 'score'])):
+    '''
+    The empty regions of a board, kept up to date as moves are played so that
+    scoring doesn't need to flood fill the whole board.
+
+    region_index: a NN-length list of the id of the region at each empty
+        point, or None for stones. A region's id is one of its points.
+    regions: a dict of region id to Region
+    score: the area score of the board, stones plus territory
+    '''
+    pass
+
+def find_region(board, fc, neighbors=NEIGHBORS):
+    'Flood fill the empty region containing fc, counting its borders'
+    black, white, empty = BOARD_COLORS[type(board)]
+    points = {fc}
+    black_borders = white_borders = 0
+    frontier = [fc]
+    while frontier:
+        current_fc = frontier.pop()
+        for fn in neighbors[current_fc]:
+            neighbor_color = board[fn]
+            if neighbor_color == empty:
+                if not fn in points:
+                    points.add(fn)
+                    frontier.append(fn)
+            elif neighbor_color == black:
+                black_borders += 1
+            else:
+                white_borders += 1
+    return Region(points, black_borders, white_borders)
+
+def add_regions(region_index, regions, board, seeds, neighbors=NEIGHBORS):
+    'Flood fill the regions of the empty points in seeds not yet in a region, and return their score'
+    empty = BOARD_COLORS[type(board)][2]
+    score = 0
+    for fs in seeds:
+        if board[fs] == empty and region_index[fs] is None:
+            region = find_region(board, fs, neighbors)
+            for fr in region.points:
+                region_index[fr] = fs
+            regions[fs] = region
+            score += region.score()
+    return score
+
+def territory_from_board(board, neighbors=NEIGHBORS):
+    black, white, empty = BOARD_COLORS[type(board)]
+    region_index = [None] * len(board)
+    regions = {}
+    score = board.count(black) - board.count(white)
+    score += add_regions(region_index, regions, board, range(len(board)), neighbors)
+    return Territory(region_index, regions, score)
+
+def is_connected(board, fc, points, neighbors=NEIGHBORS):
+    '''
+    Check if points, the empty neighbors of fc, are all in one region without
+    going through fc. Two neighbors on either side of an empty corner point
+    are joined through it; otherwise fall back to a breadth first search from
+    the first point that stops as soon as it has reached the rest.
+    '''
+    empty = BOARD_COLORS[type(board)][2]
+    joined = [points[0]]
+    for fa in joined:
+        for fb in points:
+            # the corner between two perpendicular neighbors is fa + fb - fc
+            if not fb in joined and fa + fb != 2 * fc and board[fa + fb - fc] == empty:
+                joined.append(fb)
+    if len(joined) == len(points):
+        return True
+
+    remaining = set(points[1:])
+    seen = {points[0]}
+    frontier = [points[0]]
+    for current_fc in frontier:
+        for fn in neighbors[current_fc]:
+            if board[fn] == empty and not fn in seen:
+                remaining.discard(fn)
+                if not remaining:
+                    return True
+                seen.add(fn)
+                frontier.append(fn)
+    return False
+
+def update_territory(territory, board, fc, captured, neighbors=NEIGHBORS):
+    '''
+    Update territory for the stone played at fc and the stones it captured, to
+    match board; an updated copy is returned. Only the region fc was played in
+    and the regions next to captured stones are affected. When nothing is
+    captured and the move doesn't split its region, the region is updated
+    without a flood fill.
+    '''
+    black, white, empty = BOARD_COLORS[type(board)]
+    color = board[fc]
+    region_index = territory.region_index[:]
+    regions = territory.regions.copy()
+    num_stones = 1 + len(captured)
+    score = territory.score + (num_stones if color == black else -num_stones)
+
+    region_id = region_index[fc]
+    region = regions.pop(region_id)
+    region_index[fc] = None
+    score -= region.score()
+    empty_neighbors = [fn for fn in neighbors[fc] if board[fn] == empty]
+    if not captured and (len(empty_neighbors) < 2 or is_connected(board, fc, empty_neighbors, neighbors)):
+        if empty_neighbors:
+            black_borders, white_borders = region.black_borders, region.white_borders
+            for fn in neighbors[fc]:
+                if board[fn] == black:
+                    black_borders -= 1
+                elif board[fn] == white:
+                    white_borders -= 1
+            if color == black:
+                black_borders += len(empty_neighbors)
+            else:
+                white_borders += len(empty_neighbors)
+            new_region = Region(region.points - {fc}, black_borders, white_borders)
+            if region_id == fc:
+                region_id = empty_neighbors[0]
+                for fr in new_region.points:
+                    region_index[fr] = region_id
+            regions[region_id] = new_region
+            score += new_region.score()
+        return Territory(region_index, regions, score)
+
+    # The region was split, or merged with the captured stones and the regions
+    # around them: flood fill all of them again
+    stale_regions = [region]
+    for fs in captured:
+        for fn in neighbors[fs]:
+            neighbor_region_id = region_index[fn]
+            if neighbor_region_id is not None and neighbor_region_id != region_id and neighbor_region_id in regions:
+                stale_regions.append(regions.pop(neighbor_region_id))
+    seeds = list(captured)
+    for stale_region in stale_regions:
+        if stale_region is not region:
+            score -= stale_region.score()
+        for fr in stale_region.points:
+            region_index[fr] = None
+        seeds.extend(stale_region.points)
+    score += add_regions(region_index, regions, board, seeds, neighbors)
+    return Territory(region_index, regions, score)
@@ -0,0 +1,139 @@
+'''
+Files of positions in the binary format of go_serialize, for training data.
+Every position in a file has the same size of board, so records have a fixed
+length: the file is memory mapped and indexed without parsing, and NumPy can
+view any slice of it in place.
+
+    with DatasetWriter('positions.bin', size=19) as writer:
+        writer.write(position, 'X')
+    with PositionDataset('positions.bin', go_sets) as dataset:
+        position, to_play = dataset[1234]
+        points = unpack_points(dataset.records(0, 1024))
+
+The file starts with an 8 byte header: the magic bytes b'GOPS', a format
+version, the board size and two bytes of padding. Records follow it.
+'''
+import functools
+import mmap
+import struct
+import go_naive
+from go_serialize import HEADER, record_size
+MAGIC = b'GOPS'
+VERSION = 1
+FILE_HEADER = struct.Struct('<4sBB2x')
+
+@functools.lru_cache(maxsize=None)
+def record_dtype(n):
+    'A NumPy structured dtype matching the records of an n x n dataset'
+    import numpy as np
+    return np.dtype([('n', 'u1'), ('to_play', 'u1'), ('ko', '<i2'), ('points', 'u1', record_size(n) - HEADER.size)])
+
+def unpack_points(records):
+    '''
+    Unpack the points of an array of records into a (len(records), n * n)
+    uint8 array of 0 for empty, 1 for black and 2 for white.
+    '''
+    import numpy as np
+    if not len(records):
+        return np.zeros((0, 0), dtype=np.uint8)
+    n = int(records['n'][0])
+    packed = records['points']
+    points = (packed[:, :, np.newaxis] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 3
+    return points.reshape(len(records), -1)[:, :n * n]
+
+class DatasetWriter():
+    'Writes positions of one size of board to a new dataset file'
+    __slots__ = ('file', 'n', 'record_size', 'count')
+
+    def __init__(self, path, size=19):
+        self.file = open(path, 'wb')
+        self.n = size
+        self.record_size = record_size(size)
+        self.count = 0
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, size))
+
+    def write(self, position, to_play):
+        'Append position, of any backend, with to_play to move'
+        self.write_bytes(position.to_bytes(to_play))
+
+    def write_bytes(self, data):
+        'Append a position already serialized with to_bytes'
+        if len(data) != self.record_size or data[0] != self.n:
+            raise ValueError("Not a serialized %dx%d position" % (self.n, self.n))
+        self.file.write(data)
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class PositionDataset():
+    '''
+    A read-only, memory mapped dataset file. Indexing returns a (Position,
+    color to play) tuple, with the Position of module.
+    '''
+    __slots__ = ('file', 'mmap', 'module', 'n', 'record_size', 'count')
+
+    def __init__(self, path, module=go_naive):
+        self.file = open(path, 'rb')
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.n = FILE_HEADER.unpack_from(self.mmap)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("%s is not a position dataset" % path)
+        self.module = module
+        self.record_size = record_size(self.n)
+        # A record cut short by an interrupted write isn't counted
+        self.count = (len(self.mmap) - FILE_HEADER.size) // self.record_size
+
+    def __len__(self):
+        return self.count
+
+    def record(self, i):
+        'The bytes of record i, as a memoryview of the file, to be released before closing the dataset'
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("Dataset index out of range")
+        start = FILE_HEADER.size + i * self.record_size
+        return memoryview(self.mmap)[start:start + self.record_size]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.count))]
+        record = self.record(i)
+        try:
+            return self.module.Position.from_bytes(record)
+        finally:
+            record.release()
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def records(self, start=0, stop=None):
+        '''
+        A NumPy structured array of records start to stop, viewing the file
+        in place, with fields n, to_play (0 for black, 1 for white), ko (-1 for
+        none) and points (packed, see unpack_points). The dataset can't be
+        closed while arrays viewing it are still alive.
+        '''
+        import numpy as np
+        start, stop, step = slice(start, stop).indices(self.count)
+        return np.frombuffer(self.mmap, dtype=record_dtype(self.n), count=max(stop - start, 0),
+                             offset=FILE_HEADER.size + start * self.record_size)
+
+    def close(self):
+        self.mmap.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
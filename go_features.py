@@ -0,0 +1,80 @@
+'''
+Input planes for a policy/value network, extracted from a batch of positions
+of any backend straight into a NumPy buffer.
+'''
+import numpy as np
+# Same byte values as go_mutable and go_batched
+WHITE, BLACK, EMPTY = ord('O'), ord('X'), ord('.')
+
+# The planes of the feature tensor, in order. liberties_n is set on stones
+# whose group has n liberties; the last bucket holds n or more.
+PLANES = ('black', 'white', 'empty', 'liberties_1', 'liberties_2', 'liberties_3', 'liberties_4',
+          'ko', 'legal', 'black_to_play')
+NUM_PLANES = len(PLANES)
+LIBERTY_BUCKETS = 4
+BLACK_PLANE, WHITE_PLANE, EMPTY_PLANE, LIBERTIES_PLANE = 0, 1, 2, 3
+KO_PLANE, LEGAL_PLANE, TO_PLAY_PLANE = 7, 8, 9
+
+def allocate(batch_size, size=19):
+    'Return a buffer for extract_features to fill with up to batch_size positions'
+    return np.zeros((batch_size, NUM_PLANES, size, size), dtype=np.uint8)
+
+def unpack_masks(masks, nn):
+    'Unpack a list of nn-bit integer masks into a (len(masks), nn) array of 0/1'
+    num_bytes = (nn + 7) // 8
+    packed = np.frombuffer(b''.join(mask.to_bytes(num_bytes, 'little') for mask in masks), dtype=np.uint8)
+    return np.unpackbits(packed.reshape(len(masks), num_bytes), axis=1, count=nn, bitorder='little')
+
+def get_boards(positions, nn):
+    'Return a (len(positions), nn) uint8 array of WHITE/BLACK/EMPTY'
+    if hasattr(positions[0], 'black'):
+        # go_bitboard: expand the stone masks rather than building each board string
+        black = unpack_masks([position.black for position in positions], nn)
+        white = unpack_masks([position.white for position in positions], nn)
+        return np.where(black, BLACK, np.where(white, WHITE, EMPTY)).astype(np.uint8)
+    boards = b''.join(position.board.encode('ascii') if isinstance(position.board, str) else position.board
+                      for position in positions)
+    return np.frombuffer(boards, dtype=np.uint8).reshape(len(positions), nn)
+
+def extract_features(positions, colors, out=None):
+    '''
+    Write the feature planes of each position into out, a (batch, NUM_PLANES,
+    N, N) uint8 buffer from allocate() with batch >= len(positions), and
+    return the filled part of it. colors is the color to play, 'X' or 'O',
+    either one for the whole batch or one per position; it decides the legal
+    move plane.
+
+    Positions from go_mutable share their board with every position on the
+    same line of play, so only the latest of them may be passed in.
+    '''
+    batch_size = len(positions)
+    geometry = positions[0].geometry
+    nn = geometry.nn
+    if out is None:
+        out = allocate(batch_size, geometry.n)
+    out = out[:batch_size]
+    if isinstance(colors, str):
+        colors = [colors] * batch_size
+    planes = out.reshape(batch_size, NUM_PLANES, nn)
+
+    boards = get_boards(positions, nn)
+    np.equal(boards, BLACK, out=planes[:, BLACK_PLANE], casting='unsafe')
+    np.equal(boards, WHITE, out=planes[:, WHITE_PLANE], casting='unsafe')
+    np.equal(boards, EMPTY, out=planes[:, EMPTY_PLANE], casting='unsafe')
+
+    liberties = np.empty((batch_size, nn), dtype=np.uint8)
+    for i, position in enumerate(positions):
+        liberties[i] = position.get_liberties()
+    np.minimum(liberties, LIBERTY_BUCKETS, out=liberties)
+    for bucket in range(LIBERTY_BUCKETS):
+        np.equal(liberties, bucket + 1, out=planes[:, LIBERTIES_PLANE + bucket], casting='unsafe')
+
+    planes[:, KO_PLANE] = 0
+    ko = np.array([-1 if position.ko is None else position.ko for position in positions], dtype=np.intp)
+    has_ko = np.nonzero(ko >= 0)[0]
+    planes[has_ko, KO_PLANE, ko[has_ko]] = 1
+
+    planes[:, LEGAL_PLANE] = unpack_masks(
+        [position.legal_moves(color) for position, color in zip(positions, colors)], nn)
+    planes[:, TO_PLAY_PLANE] = np.array([color == 'X' for color in colors], dtype=np.uint8)[:, None]
+    return out
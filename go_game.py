@@ -0,0 +1,128 @@
+'''
+A game of go over any backend's Position: the side to move, passes and the
+end of the game, prisoners, and the record of moves played.
+'''
+import sys
+from array import array
+PASS = -1
+WHITE, BLACK = 'O', 'X'
+# Instance attributes that backends use to cache what they keep up to date
+# incrementally. Caches are replaced, never modified, by play_move, so a
+# snapshot can share them.
+CACHES = ('legal_moves_cache', 'territory_cache', 'liberties_cache', 'symmetry_cache')
+
+def swap_colors(color):
+    return WHITE if color == BLACK else BLACK
+
+def count_stones(position, color):
+    'Return the number of stones of color on the board of position'
+    if hasattr(position, 'black'):
+        # go_bitboard
+        return (position.black if color == BLACK else position.white).bit_count()
+    board = position.board
+    return board.count(color if isinstance(board, str) else ord(color))
+
+def copy_position(position):
+    '''
+    Return a position that moves can be played from independently of the
+    original. Only backends that play moves in place (go_mutable) need
+    one: the copy gets its own board, superko history and GroupTracker, and
+    can't be undone past. Positions of the other backends are shared as they
+    are.
+    '''
+    if not hasattr(position, 'undo_move'):
+        return position
+    history = None if position.history is None else set(position.history)
+    groups = None if position.groups is None else position.groups.copy()
+    copied = type(position)(position.board[:], position.ko, position.zobrist, history,
+                            geometry=position.geometry, groups=groups)
+    cached = vars(position)
+    for name in CACHES:
+        if name in cached:
+            setattr(copied, name, cached[name])
+    return copied
+
+class Game():
+    '''
+    position: the current Position, of any backend
+    to_play: the color to move
+    passes: the number of passes in a row just played; the game is over after
+        two
+    prisoners: a dict of color to the number of stones that color captured
+    stone_counts: a dict of color to the number of its stones on the board
+    moves: an array('h') of every move played, with PASS for a pass
+    komi: added to white's score
+    '''
+    __slots__ = ('position', 'to_play', 'passes', 'prisoners', 'stone_counts', 'moves', 'komi')
+
+    def __init__(self, position, to_play=BLACK, komi=7.5):
+        self.position = position
+        self.to_play = to_play
+        self.passes = 0
+        self.prisoners = {BLACK: 0, WHITE: 0}
+        self.stone_counts = {BLACK: count_stones(position, BLACK), WHITE: count_stones(position, WHITE)}
+        self.moves = array('h')
+        self.komi = komi
+
+    @staticmethod
+    def new(module, size=19, superko=False, komi=7.5):
+        'Start a game on the empty board with one of the backend modules'
+        return Game(module.Position.initial_state(superko=superko, size=size), komi=komi)
+
+    def is_over(self):
+        return self.passes >= 2
+
+    def play(self, fc):
+        '''
+        Play a stone at fc for the side to move, or pass if fc is None or PASS.
+        Raises the backend's IllegalMove for illegal moves, and once the game
+        is over.
+        '''
+        if self.passes >= 2:
+            raise sys.modules[type(self.position).__module__].IllegalMove("The game is over.")
+        if fc is None or fc == PASS:
+            self.position = self.position.pass_move()
+            self.passes += 1
+            self.moves.append(PASS)
+        else:
+            color = self.to_play
+            opp_color = swap_colors(color)
+            self.position = position = self.position.play_move(fc, color)
+            captures = position.captures
+            self.prisoners[color] += captures
+            stone_counts = self.stone_counts
+            stone_counts[opp_color] -= captures
+            stone_counts[color] += 1
+            self.passes = 0
+            self.moves.append(fc)
+        self.to_play = swap_colors(self.to_play)
+
+    def pass_move(self):
+        self.play(PASS)
+
+    def score(self):
+        'The area score of the board, less komi: positive if black is ahead'
+        return self.position.score() - self.komi
+
+    def winner(self):
+        'The color ahead on the board, or None for a tie'
+        score = self.score()
+        if score == 0:
+            return None
+        return BLACK if score > 0 else WHITE
+
+    def snapshot(self):
+        '''
+        Return a copy of this game that can be played on independently, for
+        branching. Only what is played in place is copied: the move record, and
+        the board, superko history and GroupTracker of go_mutable positions.
+        '''
+        game = Game.__new__(Game)
+        game.position = copy_position(self.position)
+        game.to_play = self.to_play
+        game.passes = self.passes
+        game.prisoners = self.prisoners.copy()
+        game.stone_counts = self.stone_counts.copy()
+        game.moves = self.moves[:]
+        game.komi = self.komi
+        return game
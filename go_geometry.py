@@ -0,0 +1,71 @@
+'''
+Board geometry: everything that depends only on the size of the board,
+precomputed once per size and shared by every Position of that size.
+'''
+import functools
+import random
+WHITE, BLACK, EMPTY = 'O', 'X', '.'
+
+class Geometry():
+    '''
+    n: the board is n x n
+    nn: number of points on the board
+    neighbors, diagonals: lists of the on-board neighbors/diagonals of each
+        flat coordinate
+    empty_board: the empty board, as a string
+    zobrist: one random 64-bit key per (color, point), for Zobrist hashing.
+        Keyed by both the 'X'/'O' colors and their byte values, since
+        go_mutable stores its board as bytes.
+    zobrist_ko, zobrist_black_to_play: further keys for the ko point and the
+        side to move, for hashes that tell apart positions with the same board
+    full_board, not_first_column, not_last_column: bitmasks over flat
+        coordinates, for backends that store the board as integers
+    '''
+    __slots__ = ('n', 'nn', 'neighbors', 'diagonals', 'empty_board', 'zobrist', 'zobrist_ko', 'zobrist_black_to_play',
+                 'full_board', 'not_first_column', 'not_last_column')
+
+    def __init__(self, n):
+        self.n = n
+        self.nn = n ** 2
+        self.neighbors = [self._on_board((x+1, y), (x-1, y), (x, y+1), (x, y-1))
+                          for x, y in map(self.unflatten, range(self.nn))]
+        self.diagonals = [self._on_board((x+1, y+1), (x+1, y-1), (x-1, y+1), (x-1, y-1))
+                          for x, y in map(self.unflatten, range(self.nn))]
+        self.empty_board = EMPTY * self.nn
+
+        rng = random.Random(n)
+        self.zobrist = {}
+        for color in (WHITE, BLACK):
+            keys = [rng.getrandbits(64) for fc in range(self.nn)]
+            self.zobrist[color] = self.zobrist[ord(color)] = keys
+        self.zobrist_ko = [rng.getrandbits(64) for fc in range(self.nn)]
+        self.zobrist_black_to_play = rng.getrandbits(64)
+
+        self.full_board = (1 << self.nn) - 1
+        first_column = sum(1 << (n * row) for row in range(n))
+        self.not_first_column = self.full_board ^ first_column
+        self.not_last_column = self.full_board ^ (first_column << (n - 1))
+
+    def flatten(self, c):
+        return self.n * c[0] + c[1]
+
+    # Convention: coords that have been flattened have a "f" prefix
+    def unflatten(self, fc):
+        return divmod(fc, self.n)
+
+    def is_on_board(self, c):
+        return c[0] % self.n == c[0] and c[1] % self.n == c[1]
+
+    def _on_board(self, *coords):
+        return [self.flatten(c) for c in coords if self.is_on_board(c)]
+
+    def __repr__(self):
+        return 'Geometry(%d)' % self.n
+
+@functools.lru_cache(maxsize=None)
+def get_geometry(n):
+    return Geometry(n)
+
+def geometry_for_board(board):
+    'Look up the geometry of a flat board from its length'
+    return get_geometry(int(round(len(board) ** 0.5)))
@@ -0,0 +1,228 @@
+'''
+Opt-in instrumentation of the phases of play_move in each backend: ko
+checks, capture detection, liberty updates, copying. For each phase, counts
+the calls, the nanoseconds spent in them, and a size, such as the number of
+stones captured or liberties touched:
+
+    with Instrumentation(go_sets) as instrumentation:
+        ...play some moves...
+    print(instrumentation.table())
+
+While enabled, the backend's phase functions are replaced with timing
+wrappers, and the originals are put back when disabled, so that
+instrumentation costs nothing until it is used. Times are inclusive: a phase
+called from another (_capture_group from add_stone) is counted in both, along
+with the overhead of its wrapper.
+'''
+import json
+import time
+from collections import namedtuple
+
+class Phase(namedtuple('Phase', ['name', 'size', 'size_label'])):
+    '''
+    name: the function to instrument, relative to its backend module, such as
+        'is_koish' or 'LibertyTracker._capture_group'
+    size: None, or a function of (args, kwargs, result) returning the size of
+        a call
+    size_label: what the size counts
+    '''
+    __slots__ = ()
+
+    def __new__(cls, name, size=None, size_label=None):
+        return super().__new__(cls, name, size, size_label)
+
+def captured_size(args, kwargs, result):
+    'Stones captured, from the (board, captured) returned by maybe_capture_stones in go_naive and go_sets'
+    return len(result[1])
+
+def chains_size(args, kwargs, result):
+    'Stones in a list of captured chains'
+    return sum(len(chain) for chain in result)
+
+def liberties_size(args, kwargs, result):
+    'Liberties added and removed by LibertyTracker._update_liberties(group_id, add=None, remove=None)'
+    add = args[2] if len(args) > 2 else kwargs.get('add')
+    remove = args[3] if len(args) > 3 else kwargs.get('remove')
+    return len(add or ()) + len(remove or ())
+
+PLAY_MOVE = 'Position.play_move'
+
+# Backend module name to the phases instrumented in it
+PHASES = {
+    'go_naive': (
+        Phase(PLAY_MOVE),
+        Phase('is_koish'),
+        Phase('maybe_capture_stones', captured_size, 'stones captured'),
+        Phase('find_reached', lambda args, kwargs, result: len(result[0]), 'chain stones'),
+        Phase('place_stone'),
+        Phase('update_legal_moves', lambda args, kwargs, result: len(args[3]), 'points updated'),
+        Phase('update_territory', lambda args, kwargs, result: len(args[3]), 'stones captured'),
+        Phase('update_liberties', lambda args, kwargs, result: len(args[3]) + len(args[4]), 'points touched'),
+    ),
+    'go_mutable': (
+        Phase(PLAY_MOVE),
+        Phase('Position.undo_move'),
+        Phase('is_koish'),
+        Phase('maybe_capture_stones', lambda args, kwargs, result: len(result), 'stones captured'),
+        Phase('find_reached', lambda args, kwargs, result: len(result[0]), 'chain stones'),
+        Phase('unmake_move'),
+        Phase('GroupTracker.add_stone', chains_size, 'stones captured'),
+        Phase('GroupTracker._union', lambda args, kwargs, result: 1, 'groups merged'),
+        Phase('GroupTracker._remove_group', lambda args, kwargs, result: len(result), 'stones captured'),
+        Phase('GroupTracker.undo'),
+        Phase('update_legal_moves', lambda args, kwargs, result: len(args[3]), 'points updated'),
+        Phase('update_territory', lambda args, kwargs, result: len(args[3]), 'stones captured'),
+        Phase('update_liberties', lambda args, kwargs, result: len(args[3]) + len(args[4]), 'points touched'),
+    ),
+    'go_sets': (
+        Phase(PLAY_MOVE),
+        Phase('is_koish'),
+        Phase('place_stone'),
+        Phase('bulk_place_stones', lambda args, kwargs, result: len(args[2]), 'stones placed'),
+        Phase('LibertyTracker.add_stone', lambda args, kwargs, result: len(result[1]), 'stones captured'),
+        Phase('LibertyTracker.__deepcopy__', lambda args, kwargs, result: len(result.groups), 'groups copied'),
+        Phase('LibertyTracker._merge_groups', lambda args, kwargs, result: 1, 'groups merged'),
+        Phase('LibertyTracker._capture_group', lambda args, kwargs, result: len(result), 'stones captured'),
+        Phase('LibertyTracker._update_liberties', liberties_size, 'liberties touched'),
+        Phase('LibertyTracker._handle_captures', lambda args, kwargs, result: len(args[1]), 'stones captured'),
+        Phase('PersistentLibertyTracker.add_stone', lambda args, kwargs, result: len(result[1]), 'stones captured'),
+        Phase('CompactLibertyTracker.add_stone', lambda args, kwargs, result: len(result[1]), 'stones captured'),
+        Phase('CompactLibertyTracker._set_group', lambda args, kwargs, result: args[3].bit_count(), 'group liberties'),
+        Phase('CompactLibertyTracker._handle_captures', lambda args, kwargs, result: args[1].bit_count(), 'stones captured'),
+        Phase('update_legal_moves', lambda args, kwargs, result: len(args[3]), 'points updated'),
+        Phase('update_territory', lambda args, kwargs, result: len(args[3]), 'stones captured'),
+    ),
+    'go_bitboard': (
+        Phase(PLAY_MOVE),
+        Phase('find_chain', lambda args, kwargs, result: result.bit_count(), 'chain stones'),
+        Phase('update_legal_moves', lambda args, kwargs, result: args[4].bit_count(), 'points updated'),
+        Phase('update_territory', lambda args, kwargs, result: args[4].bit_count(), 'stones captured'),
+        Phase('update_liberties', lambda args, kwargs, result: args[4].bit_count(), 'stones captured'),
+    ),
+}
+
+class PhaseStats():
+    'Totals over the calls to one phase'
+    __slots__ = ('calls', 'ns', 'size', 'max_size')
+
+    def __init__(self):
+        self.calls = self.ns = self.size = self.max_size = 0
+
+def instrument(function, stats, size=None):
+    'Wrap function to add its calls, time and size to stats'
+    perf_counter_ns = time.perf_counter_ns
+    def instrumented(*args, **kwargs):
+        tick = perf_counter_ns()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            stats.ns += perf_counter_ns() - tick
+            stats.calls += 1
+        if size is not None:
+            call_size = size(args, kwargs, result)
+            stats.size += call_size
+            if call_size > stats.max_size:
+                stats.max_size = call_size
+        return result
+    instrumented.__wrapped__ = function
+    instrumented.__name__ = function.__name__
+    return instrumented
+
+class Instrumentation():
+    '''
+    Instrumentation of the phases of one backend module, enabled with
+    enable() and disable() or as a context manager. Stats accumulate over
+    every time it is enabled, until reset(). Instrumentations of the same
+    module shouldn't be enabled at the same time.
+
+    stats: a dict of phase name to PhaseStats
+    '''
+    __slots__ = ('module', 'phases', 'stats', 'originals')
+
+    def __init__(self, module, phases=None):
+        self.module = module
+        self.phases = PHASES[module.__name__] if phases is None else phases
+        self.stats = {phase.name: PhaseStats() for phase in self.phases}
+        self.originals = None
+
+    def _owner(self, name):
+        'The module or class holding the function name, and its attribute name there'
+        *path, attribute = name.split('.')
+        owner = self.module
+        for part in path:
+            owner = getattr(owner, part)
+        return owner, attribute
+
+    def enable(self):
+        if self.originals is not None:
+            raise RuntimeError("%s is already instrumented" % self.module.__name__)
+        self.originals = []
+        for phase in self.phases:
+            owner, attribute = self._owner(phase.name)
+            # Only functions the owner defines itself, so that disabling
+            # doesn't leave a copy of an inherited one behind
+            original = vars(owner)[attribute]
+            self.originals.append((owner, attribute, original))
+            setattr(owner, attribute, instrument(original, self.stats[phase.name], phase.size))
+
+    def disable(self):
+        for owner, attribute, original in reversed(self.originals):
+            setattr(owner, attribute, original)
+        self.originals = None
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def reset(self):
+        for stats in self.stats.values():
+            stats.__init__()
+
+    def report(self):
+        '''
+        Return a dict of phase name to its calls, total and mean nanoseconds,
+        fraction of the time spent in play_move, and total, mean and maximum
+        size, for each phase that was called.
+        '''
+        play_move = self.stats.get(PLAY_MOVE)
+        play_move_ns = play_move.ns if play_move is not None else 0
+        report = {}
+        for phase in self.phases:
+            stats = self.stats[phase.name]
+            if not stats.calls:
+                continue
+            entry = {
+                'calls': stats.calls,
+                'ns': stats.ns,
+                'ns_per_call': stats.ns / stats.calls,
+                'fraction_of_play_move': stats.ns / play_move_ns if play_move_ns else None,
+            }
+            if phase.size is not None:
+                entry.update({
+                    'size_label': phase.size_label,
+                    'size': stats.size,
+                    'size_per_call': stats.size / stats.calls,
+                    'max_size': stats.max_size,
+                })
+            report[phase.name] = entry
+        return report
+
+    def to_json(self, **kwargs):
+        return json.dumps({self.module.__name__: self.report()}, **kwargs)
+
+    def table(self, title=None):
+        'The report as a text table, one row per phase, headed by title or the module name'
+        lines = ["%-40s %9s %10s %9s %7s  %s" % (
+            title or self.module.__name__, 'calls', 'total ms', 'ns/call', '% play', 'size per call (max)')]
+        for name, entry in self.report().items():
+            fraction = entry['fraction_of_play_move']
+            line = "%-40s %9d %10.2f %9.0f %7s" % (
+                name, entry['calls'], entry['ns'] / 1e6, entry['ns_per_call'],
+                '' if fraction is None else '%.1f' % (fraction * 100))
+            if 'size_label' in entry:
+                line += "  %.2f %s (%d)" % (entry['size_per_call'], entry['size_label'], entry['max_size'])
+            lines.append(line)
+        return '\n'.join(lines)
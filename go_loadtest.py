@@ -0,0 +1,127 @@
+'''
+A load test of go_server: many concurrent clients each playing self-play
+games over GTP, mixing genmove with score, liberty and legality queries.
+Reports requests/sec and latency percentiles.
+
+    python go_loadtest.py sets --clients 50 --requests 200
+    python go_loadtest.py --connect 127.0.0.1:5000 --clients 50
+
+Without --connect, a server on the given backend is started in the same
+process, on a free localhost port.
+'''
+import argparse
+import asyncio
+import math
+import statistics
+import time
+import go_server
+
+async def run_client(open_connection, num_requests, size, latencies):
+    '''
+    Play self-play games over one connection until num_requests commands
+    have been answered, adding each command's latency to latencies
+    '''
+    reader, writer = await open_connection()
+    async def request(command):
+        tick = time.perf_counter()
+        writer.write(command.encode('ascii') + b'\n')
+        response = (await reader.readuntil(b'\n\n')).decode('ascii')
+        latencies.append(time.perf_counter() - tick)
+        if not response.startswith('='):
+            raise RuntimeError("%s failed: %s" % (command, response.strip()))
+        return response[1:].strip()
+
+    await request('boardsize %d' % size)
+    last_move = 'pass'
+    passes = moves = 0
+    colors = ('b', 'w')
+    for i in range(num_requests - 1):
+        kind = i % 8
+        if kind == 3:
+            await request('final_score')
+        elif kind == 5 and last_move != 'pass':
+            await request('liberties %s' % last_move)
+        elif kind == 7:
+            await request('is_legal %s %s' % (colors[moves % 2], last_move))
+        elif passes >= 2 or moves >= 3 * size * size:
+            await request('clear_board')
+            passes = moves = 0
+        else:
+            move = await request('genmove %s' % colors[moves % 2])
+            moves += 1
+            if move == 'pass':
+                passes += 1
+            else:
+                passes = 0
+                last_move = move
+    writer.write(b'quit\n')
+    await reader.readuntil(b'\n\n')
+    writer.close()
+
+def percentile(ordered, fraction):
+    'Nearest rank percentile of a sorted list'
+    return ordered[math.ceil(fraction * len(ordered)) - 1]
+
+async def run_load_test(open_connection, clients=50, requests=200, size=19):
+    '''
+    Run clients concurrent connections of requests commands each. Returns
+    the number of requests, the requests/sec, and the median, 99th
+    percentile and maximum latency in seconds.
+    '''
+    latencies = []
+    tick = time.perf_counter()
+    await asyncio.gather(*[run_client(open_connection, requests, size, latencies) for i in range(clients)])
+    elapsed = time.perf_counter() - tick
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'requests_per_sec': len(ordered) / elapsed,
+        'median': statistics.median(ordered),
+        'p99': percentile(ordered, 0.99),
+        'max': ordered[-1],
+    }
+
+async def load_test_server(module, clients=50, requests=200, size=19):
+    'Start a server on module on a free localhost port and load test it, returning the stats and the server'
+    game_server = go_server.GameServer(module, size=size)
+    server = await game_server.start('127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        stats = await run_load_test(lambda: asyncio.open_connection('127.0.0.1', port), clients, requests, size)
+    return stats, game_server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test a go_server.')
+    parser.add_argument('implementation', nargs='?', default='sets', choices=list(go_server.IMPLEMENTATIONS),
+                        help='backend of the in-process server')
+    parser.add_argument('--connect', metavar='HOST:PORT',
+                        help='load test a running server instead of starting one')
+    parser.add_argument('--unix', metavar='PATH',
+                        help='load test a running server on a Unix socket')
+    parser.add_argument('--clients', default=50, type=int,
+                        help='concurrent connections')
+    parser.add_argument('--requests', default=200, type=int,
+                        help='commands sent by each client')
+    parser.add_argument('--size', default=19, type=int)
+    args = parser.parse_args(argv)
+
+    game_server = None
+    if args.unix:
+        stats = asyncio.run(run_load_test(lambda: asyncio.open_unix_connection(args.unix),
+                                          args.clients, args.requests, args.size))
+    elif args.connect:
+        host, port = args.connect.rsplit(':', 1)
+        stats = asyncio.run(run_load_test(lambda: asyncio.open_connection(host, int(port)),
+                                          args.clients, args.requests, args.size))
+    else:
+        stats, game_server = asyncio.run(load_test_server(go_server.IMPLEMENTATIONS[args.implementation],
+                                                          args.clients, args.requests, args.size))
+    print("%d requests from %d clients: %.0f requests/sec, latency median %.2f ms, p99 %.2f ms, max %.2f ms" % (
+        stats['requests'], args.clients, stats['requests_per_sec'], stats['median'] * 1e3, stats['p99'] * 1e3,
+        stats['max'] * 1e3))
+    if game_server is not None:
+        batcher = game_server.batcher
+        print("%d score and liberty queries answered in %d batches" % (batcher.queries, batcher.flushes))
+
+if __name__ == '__main__':
+    main()
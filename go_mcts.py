@@ -0,0 +1,211 @@
+'''
+Monte Carlo tree search over the Position API, so any backend can be searched
+with its own play_move, pass_move and legal_moves.
+'''
+import math
+import random
+import sys
+import time
+from array import array
+import go_mutable
+PASS = -1
+WHITE, BLACK = 'O', 'X'
+
+def swap_colors(color):
+    return WHITE if color == BLACK else BLACK
+
+def rollout(position, color, rng):
+    '''
+    Return the score of a go_mutable.playout from position with color to play.
+    The playout runs on a copy of the board, whatever backend position is from.
+    '''
+    board = bytearray(position.get_board(), encoding='ascii')
+    start = go_mutable.Position(board, position.ko, geometry=position.geometry)
+    return go_mutable.playout(start, rng, color)
+
+class SearchTree():
+    '''
+    A search tree kept as a struct of arrays: node i is described by the i-th
+    entry of each array, and its children are the nodes first_child[i] to
+    first_child[i] + num_children[i] - 1. Node 0 is the root.
+
+    moves: the point played to reach each node, or PASS
+    visits, value_sums: how often each node was visited, and the sum of the
+        results seen through it, from the point of view of the player who
+        played its move (+1 for a win, -1 for a loss)
+    priors: the policy's probability for each node's move, only used by PUCT
+    first_child, num_children: where each node's children are; num_children
+        is -1 until the node is expanded
+    positions: the Position at each node, or None until it is first visited.
+        Children are only played out when selection first reaches them.
+        Backends that play moves in place on a shared board (go_mutable) keep
+        no positions: each playout replays its path from the root with
+        play_move and takes it back with undo_move.
+
+    Without a policy, children are selected by UCT, visiting every child once
+    before revisiting any. With a policy, a function of (position, color,
+    moves) returning one prior per move, they are selected by PUCT.
+    '''
+    __slots__ = ('moves', 'visits', 'value_sums', 'priors', 'first_child', 'num_children', 'positions',
+                 'root', 'root_color', 'exploration', 'komi', 'policy', 'rollout', 'rng', 'illegal_move')
+
+    def __init__(self, position, color, exploration=None, komi=7.5, policy=None, rollout=rollout, seed=0):
+        self.moves = array('i', [PASS])
+        self.visits = array('i', [0])
+        self.value_sums = array('d', [0])
+        self.priors = array('d', [1])
+        self.first_child = array('i', [0])
+        self.num_children = array('i', [-1])
+        self.root = position
+        self.positions = None if hasattr(position, 'undo_move') else [position]
+        self.root_color = color
+        if exploration is None:
+            exploration = 1.5 if policy is not None else 1.4
+        self.exploration = exploration
+        self.komi = komi
+        self.policy = policy
+        self.rollout = rollout
+        self.rng = random.Random(seed)
+        # Each backend has its own IllegalMove; play_move raises it for moves
+        # that legal_moves allows but positional superko doesn't
+        self.illegal_move = sys.modules[type(position).__module__].IllegalMove
+
+    def __len__(self):
+        return len(self.moves)
+
+    def select_child(self, node):
+        'Return the child of node with the highest UCT or PUCT score'
+        visits, value_sums, priors = self.visits, self.value_sums, self.priors
+        first = self.first_child[node]
+        best_child, best_score = first, -math.inf
+        if self.policy is None:
+            log_visits = math.log(visits[node])
+            for child in range(first, first + self.num_children[node]):
+                child_visits = visits[child]
+                if not child_visits:
+                    return child
+                score = value_sums[child] / child_visits + self.exploration * math.sqrt(log_visits / child_visits)
+                if score > best_score:
+                    best_child, best_score = child, score
+        else:
+            scale = self.exploration * math.sqrt(visits[node])
+            for child in range(first, first + self.num_children[node]):
+                child_visits = visits[child]
+                q = value_sums[child] / child_visits if child_visits else 0
+                score = q + scale * priors[child] / (1 + child_visits)
+                if score > best_score:
+                    best_child, best_score = child, score
+        return best_child
+
+    def expand(self, node, position, color):
+        'Add a child for each legal move of color, and pass, at node'
+        legal = position.legal_moves(color)
+        moves = [fc for fc in range(position.geometry.nn) if legal >> fc & 1]
+        moves.append(PASS)
+        if self.policy is not None:
+            priors = self.policy(position, color, moves)
+        else:
+            priors = [1 / len(moves)] * len(moves)
+        self.first_child[node] = len(self.moves)
+        self.num_children[node] = len(moves)
+        self.moves.extend(moves)
+        self.priors.extend(priors)
+        zeros = [0] * len(moves)
+        self.visits.extend(zeros)
+        self.value_sums.extend(zeros)
+        self.first_child.extend(zeros)
+        self.num_children.extend([-1] * len(moves))
+        if self.positions is not None:
+            self.positions.extend([None] * len(moves))
+
+    def play(self, child, position, color):
+        '''
+        Return the position at child, played by color from position, its
+        parent's. Returns None, and rules the child out of further search, if
+        the move is illegal under positional superko.
+        '''
+        positions = self.positions
+        if positions is not None and positions[child] is not None:
+            return positions[child]
+        move = self.moves[child]
+        try:
+            child_position = position.pass_move() if move == PASS else position.play_move(move, color)
+        except self.illegal_move:
+            self.visits[child] = 1
+            self.value_sums[child] = -math.inf
+            self.priors[child] = 0
+            return None
+        if positions is not None:
+            positions[child] = child_position
+        return child_position
+
+    def playout(self):
+        '''
+        Run one iteration: select a path down to a leaf, creating the leaf's
+        position and expanding it, evaluate it with a rollout, and back the
+        result up the path. Returns the result for black.
+        '''
+        node, position, color = 0, self.root, self.root_color
+        path = [0]
+        while self.num_children[node] > 0:
+            child = self.select_child(node)
+            child_position = self.play(child, position, color)
+            if child_position is None:
+                continue
+            node, position = child, child_position
+            color = swap_colors(color)
+            path.append(node)
+
+        moves = self.moves
+        if len(path) > 2 and moves[node] == PASS and moves[path[-2]] == PASS:
+            # Both players passed: the game is over
+            self.num_children[node] = 0
+            score = position.score()
+        else:
+            if self.num_children[node] < 0:
+                self.expand(node, position, color)
+            score = self.rollout(position, color, self.rng)
+        black_result = (score > self.komi) - (score < self.komi)
+        if self.positions is None:
+            for i in range(len(path) - 1):
+                position = position.undo_move()
+
+        # The player who moved into a node is the opposite of the one to play there
+        result = black_result if color == WHITE else -black_result
+        visits, value_sums = self.visits, self.value_sums
+        for node in reversed(path):
+            visits[node] += 1
+            value_sums[node] += result
+            result = -result
+        return black_result
+
+    def search(self, playouts=None, seconds=None):
+        '''
+        Run playouts until either the given number of them have been run, or
+        the time budget in seconds has been used up, and return the best move.
+        '''
+        if playouts is None and seconds is None:
+            raise ValueError("Give a number of playouts, a time budget in seconds, or both")
+        deadline = None if seconds is None else time.perf_counter() + seconds
+        num_playouts = 0
+        while playouts is None or num_playouts < playouts:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            self.playout()
+            num_playouts += 1
+        return self.best_move()
+
+    def best_move(self):
+        'The most visited move at the root, or PASS if the root has no children'
+        first, count = self.first_child[0], self.num_children[0]
+        if count <= 0:
+            return PASS
+        best_child = max(range(first, first + count), key=self.visits.__getitem__)
+        return self.moves[best_child]
+
+    def root_children(self):
+        'Return a list of (move, visits, mean value) for each child of the root'
+        first, count = self.first_child[0], max(self.num_children[0], 0)
+        return [(self.moves[child], self.visits[child],
+                 self.value_sums[child] / self.visits[child] if self.visits[child] else 0)
+                for child in range(first, first + count)]
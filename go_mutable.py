@@ -1,4 +1,10 @@
 import itertools
+from collections import namedtuple
+from go_geometry import get_geometry, geometry_for_board
+from go_serialize import encode_position, decode_position
+from go_symmetry import update_symmetry_hashes
+from go_board import (update_legal_moves, touched_points, territory_from_board, update_territory,
+                      liberties_from_board, update_liberties)
 N = 19
 NN = N ** 2
 WHITE, BLACK, EMPTY = ord('O'), ord('X'), ord('.')
@@ -23,26 +29,38 @@ def unflatten(fc):
 def is_on_board(c):
     return c[0] % N == c[0] and c[1] % N == c[1]
 
-def get_valid_neighbors(fc):
-    x, y = unflatten(fc)
-    possible_neighbors = ((x+1, y), (x-1, y), (x, y+1), (x, y-1))
-    return [flatten(n) for n in possible_neighbors if is_on_board(n)]
-
+# The tables for a 19x19 board. Other sizes get their own Geometry, and the
+# functions below take its tables as optional last arguments.
+GEOMETRY = get_geometry(N)
 # Neighbors are indexed by flat coordinates
-NEIGHBORS = [get_valid_neighbors(fc) for fc in range(NN)]
+NEIGHBORS = GEOMETRY.neighbors
+DIAGONALS = GEOMETRY.diagonals
+
+# Zobrist hashing: one random 64-bit key per (color, point). The hash of a
+# board is the XOR of the keys of every stone on it, so it can be updated
+# incrementally as stones are placed and captured. The empty board hashes to 0.
+ZOBRIST = GEOMETRY.zobrist
+
+def zobrist_hash(board):
+    keys = geometry_for_board(board).zobrist
+    h = 0
+    for fc, color in enumerate(board):
+        if color != EMPTY:
+            h ^= keys[color][fc]
+    return h
 
 def unpack_bools(bool_array):
-    return list(itertools.compress(range(NN), bool_array))
+    return list(itertools.compress(range(len(bool_array)), bool_array))
 
-def find_reached(board, fc):
+def find_reached(board, fc, neighbors=NEIGHBORS):
     color = board[fc]
-    chain = bytearray(NN); chain[fc] = 1
-    reached = bytearray(NN)
+    chain = bytearray(len(board)); chain[fc] = 1
+    reached = bytearray(len(board))
     frontier = [fc]
     while frontier:
         current_fc = frontier.pop()
         chain[current_fc] = 1
-        for fn in NEIGHBORS[current_fc]:
+        for fn in neighbors[current_fc]:
             if board[fn] == color and not chain[fn]:
                 frontier.append(fn)
             elif board[fn] != color:
@@ -55,8 +73,8 @@ def bulk_place_stones(color, board, stones):
     for fstone in stones:
         board[fstone] = color
 
-def maybe_capture_stones(board, fc):
-    chain, reached = find_reached(board, fc)
+def maybe_capture_stones(board, fc, neighbors=NEIGHBORS):
+    chain, reached = find_reached(board, fc, neighbors)
     if not any(board[fr] == EMPTY for fr in reached):
         bulk_place_stones(EMPTY, board, chain)
         return chain
@@ -86,34 +104,255 @@ def play_move_incomplete(board, fc, color):
     return board
 
 
-def is_koish(board, fc):
+def unmake_move(board, fc, opp_color, captured_chains):
+    'Remove the stone played at fc, and put back the opponent chains it captured'
+    board[fc] = EMPTY
+    for chain in captured_chains:
+        bulk_place_stones(opp_color, board, chain)
+
+def is_koish(board, fc, neighbors=NEIGHBORS):
     'Check if fc is surrounded on all sides by 1 color, and return that color'
     if board[fc] != EMPTY: return None
-    neighbor_colors = {board[fn] for fn in NEIGHBORS[fc]}
+    neighbor_colors = {board[fn] for fn in neighbors[fc]}
     if len(neighbor_colors) == 1 and not EMPTY in neighbor_colors:
         return list(neighbor_colors)[0]
     else:
         return None
 
+class GroupTracker():
+    '''
+    The groups of stones on a board, kept up to date in place as stones are
+    played, so that capture and suicide checks don't need a flood fill.
+    Groups are merged with union-find (union by size, with path compression),
+    and each group's stones are only walked when it is captured.
+
+    parent: a NN-length list; following it from a stone leads to the root
+        stone of its group
+    stones: a NN-length list holding, at each root, the list of its group's stones
+    pseudo_liberties: a NN-length list holding, at each root, the number of
+        neighboring pairs of a stone in the group and an empty point. An empty
+        point next to several of the group's stones counts several times, so
+        this isn't the liberty count, but it is 0 exactly when the group has
+        no liberties.
+    undo_stack: a record of each stone added, for undo()
+    '''
+    def __init__(self, board, geometry=GEOMETRY):
+        self.neighbors = geometry.neighbors
+        self.parent = list(range(geometry.nn))
+        self.stones = [None] * geometry.nn
+        self.pseudo_liberties = [0] * geometry.nn
+        self.undo_stack = []
+        for fc in range(geometry.nn):
+            if board[fc] != EMPTY:
+                self._make_group(board, fc)
+                for fn in self.neighbors[fc]:
+                    if fn < fc and board[fn] == board[fc] and self.find(fn) != self.find(fc):
+                        self._union(self.find(fc), self.find(fn), [])
+
+    def find(self, fc):
+        'Return the root stone of the group at fc'
+        parent = self.parent
+        root = fc
+        while parent[root] != root:
+            root = parent[root]
+        while parent[fc] != root:
+            parent[fc], fc = root, parent[fc]
+        return root
+
+    def _make_group(self, board, fc):
+        self.parent[fc] = fc
+        self.stones[fc] = [fc]
+        self.pseudo_liberties[fc] = len([fn for fn in self.neighbors[fc] if board[fn] == EMPTY])
+
+    def _union(self, root1, root2, merges):
+        'Merge the smaller of two groups into the larger, and return the root of the result'
+        stones = self.stones
+        if len(stones[root1]) < len(stones[root2]):
+            root1, root2 = root2, root1
+        merges.append((root1, len(stones[root1]), root2, self.pseudo_liberties[root2]))
+        self.parent[root2] = root1
+        stones[root1].extend(stones[root2])
+        stones[root2] = None
+        self.pseudo_liberties[root1] += self.pseudo_liberties[root2]
+        return root1
+
+    def _remove_group(self, board, root):
+        stones, parent, pseudo_liberties, neighbors = self.stones[root], self.parent, self.pseudo_liberties, self.neighbors
+        for fs in stones:
+            board[fs] = EMPTY
+        for fs in stones:
+            for fn in neighbors[fs]:
+                if board[fn] != EMPTY:
+                    pseudo_liberties[self.find(fn)] += 1
+        self.stones[root] = None
+        return stones
+
+    def add_stone(self, board, fc):
+        '''
+        Update the groups for the stone just placed at board[fc], removing any
+        opponent groups it captures from board. Returns the captured chains.
+        '''
+        color = board[fc]
+        pseudo_liberties = self.pseudo_liberties
+        friendly_roots = []
+        opp_roots = []
+        for fn in self.neighbors[fc]:
+            neighbor_color = board[fn]
+            if neighbor_color != EMPTY:
+                root = self.find(fn)
+                pseudo_liberties[root] -= 1
+                if neighbor_color == color:
+                    friendly_roots.append(root)
+                else:
+                    opp_roots.append(root)
+        self._make_group(board, fc)
+
+        root = fc
+        merges = []
+        for friendly_root in friendly_roots:
+            friendly_root = self.find(friendly_root)
+            if friendly_root != root:
+                root = self._union(root, friendly_root, merges)
+
+        captured = []
+        for opp_root in opp_roots:
+            if pseudo_liberties[opp_root] == 0 and self.stones[opp_root] is not None:
+                captured.append((opp_root, self._remove_group(board, opp_root)))
+        self.undo_stack.append((fc, merges, captured))
+        return [stones for opp_root, stones in captured]
+
+    def is_captured(self, fc):
+        'Check if the group at fc has no liberties'
+        return self.pseudo_liberties[self.find(fc)] == 0
+
+    def undo(self, board):
+        'Take back the last stone added, restoring board and the groups in place'
+        fc, merges, captured = self.undo_stack.pop()
+        parent, stones, pseudo_liberties, neighbors = self.parent, self.stones, self.pseudo_liberties, self.neighbors
+        opp_color = swap_colors(board[fc])
+        for root, chain in reversed(captured):
+            for fs in chain:
+                for fn in neighbors[fs]:
+                    if board[fn] != EMPTY:
+                        pseudo_liberties[self.find(fn)] -= 1
+            for fs in chain:
+                board[fs] = opp_color
+                parent[fs] = root
+            stones[root] = chain
+            pseudo_liberties[root] = 0
+        for root1, num_stones, root2, root2_pseudo_liberties in reversed(merges):
+            moved = stones[root1][num_stones:]
+            del stones[root1][num_stones:]
+            for fs in moved:
+                parent[fs] = root2
+            stones[root2] = moved
+            pseudo_liberties[root1] -= root2_pseudo_liberties
+            pseudo_liberties[root2] = root2_pseudo_liberties
+        board[fc] = EMPTY
+        stones[fc] = None
+        for fn in neighbors[fc]:
+            if board[fn] != EMPTY:
+                pseudo_liberties[self.find(fn)] += 1
+
+    def get_liberties(self, board):
+        'Return a NN-length list of the liberty count of the group at each point'
+        liberties = [0] * len(board)
+        neighbors = self.neighbors
+        for root, group_stones in enumerate(self.stones):
+            if group_stones is None or board[root] == EMPTY:
+                continue
+            num_libs = len({fn for fs in group_stones for fn in neighbors[fs] if board[fn] == EMPTY})
+            for fs in group_stones:
+                liberties[fs] = num_libs
+        return liberties
+
+    def copy(self):
+        'Return a copy of the groups that can be played on independently, with nothing to undo'
+        copied = GroupTracker.__new__(GroupTracker)
+        copied.neighbors = self.neighbors
+        copied.parent = self.parent[:]
+        copied.stones = [None if group_stones is None else group_stones[:] for group_stones in self.stones]
+        copied.pseudo_liberties = self.pseudo_liberties[:]
+        copied.undo_stack = []
+        return copied
+
 class Position():
-    def __init__(self, board, ko):
+    '''
+    zobrist: Zobrist hash of board. Computed from the board if not given.
+    history: None, or a set of the Zobrist hashes of every position seen so
+        far, in which case moves that repeat a position are rejected
+        (positional superko). The set is shared along a line of play.
+    undo_entry: None, or (fc, captured_chains, parent) recording how this
+        position was reached from parent, for use by undo_move. fc is None
+        for a pass.
+    geometry: the Geometry for the size of board. Looked up from the length of
+        the board if not given.
+    groups: None, or a GroupTracker for board, shared along a line of play,
+        in which case it is used to find captures instead of flood fills.
+    '''
+    # legal_moves_cache: None, or a dict of color to bitmask of legal points, kept up
+    # to date incrementally by play_move once legal_moves() has been called.
+    legal_moves_cache = None
+    # territory_cache: None, or the Territory of board, kept up to date
+    # incrementally by play_move once score() has been called.
+    territory_cache = None
+    # liberties_cache: None, or a bytearray of the liberty count of the group at
+    # each point, kept up to date incrementally by play_move once
+    # get_liberties() has been called.
+    liberties_cache = None
+    # symmetry_cache: None, or a tuple of the Zobrist hash of the board under each
+    # of the 8 symmetries, kept up to date incrementally by play_move once
+    # go_symmetry.symmetry_hashes() has been called.
+    symmetry_cache = None
+    # captures: the number of stones captured by the move that led to this
+    # position, set by play_move.
+    captures = 0
+
+    def __init__(self, board, ko, zobrist=None, history=None, undo_entry=None, geometry=None, groups=None):
         self.board = board
         self.ko = ko
+        if zobrist is None:
+            zobrist = zobrist_hash(board)
+        self.zobrist = zobrist
+        self.history = history
+        self.undo_entry = undo_entry
+        if geometry is None:
+            geometry = geometry_for_board(board)
+        self.geometry = geometry
+        self.groups = groups
 
     @staticmethod
-    def initial_state():
-        return Position(board=EMPTY_BOARD[:], ko=None)
+    def initial_state(superko=False, size=N, union_find=False):
+        geometry = get_geometry(size)
+        board = bytearray(geometry.empty_board, encoding='ascii')
+        return Position(board=board, ko=None, zobrist=0, history={0} if superko else None, geometry=geometry,
+                        groups=GroupTracker(board, geometry) if union_find else None)
+
+    @staticmethod
+    def from_bytes(data, superko=False, union_find=False):
+        'Return the Position serialized by to_bytes, on a board of its own, and the color to play'
+        board, ko, to_play, n = decode_position(data)
+        geometry = get_geometry(n)
+        board = bytearray(board, encoding='ascii')
+        zobrist = zobrist_hash(board)
+        return Position(board=board, ko=ko, zobrist=zobrist, history={zobrist} if superko else None, geometry=geometry,
+                        groups=GroupTracker(board, geometry) if union_find else None), to_play
+
+    def to_bytes(self, to_play):
+        'Serialize the position with to_play to move, in the format of go_serialize'
+        return encode_position(self.get_board(), self.ko, to_play, self.geometry.n)
 
     def get_board(self):
         return self.board.decode('ascii')
 
     def __str__(self):
         import textwrap
-        return '\n'.join(textwrap.wrap(self.get_board(), N))
+        return '\n'.join(textwrap.wrap(self.get_board(), self.geometry.n))
     
     def play_move(self, fc, color):
         color = ord(color)
-        board, ko = self.board, self.ko
+        board, ko, geometry = self.board, self.ko, self.geometry
+        neighbors = geometry.neighbors
 
         if fc == ko:
             raise IllegalMove("%s\n Move at %s illegally retakes ko." % (self, fc))
@@ -121,57 +360,304 @@ class Position():
         if board[fc] != EMPTY:
             raise IllegalMove("%s\n Stone exists at %s." % (self, fc))
 
+        possible_ko_color = is_koish(board, fc, neighbors)
         board[fc] = color
+        zobrist = self.zobrist ^ geometry.zobrist[color][fc]
 
         opp_color = swap_colors(color)
         opp_stones = []
         my_stones = []
-        for fn in NEIGHBORS[fc]:
+        for fn in neighbors[fc]:
             if board[fn] == color:
                 my_stones.append(fn)
             elif board[fn] == opp_color:
                 opp_stones.append(fn)
 
-        opp_captured = 0
-        for fs in opp_stones:
-            captured = maybe_capture_stones(board, fs)
-            opp_captured += len(captured)
-
-        # Check for suicide
-        captured = maybe_capture_stones(board, fc)
-        if captured:
-            raise IllegalMove("\n%s\n Move at %s is suicide." % (self, fc))
-
-        if opp_captured == 1 and is_koish(board, fc) == opp_color:
-            new_ko = fc
+        groups = self.groups
+        opp_keys = geometry.zobrist[opp_color]
+        if groups is not None:
+            captured_chains = groups.add_stone(board, fc)
+            # Only possible to be suicide if nothing was captured
+            if not captured_chains and groups.is_captured(fc):
+                groups.undo(board)
+                raise IllegalMove("\n%s\n Move at %s is suicide." % (self, fc))
+            for captured in captured_chains:
+                for fc_captured in captured:
+                    zobrist ^= opp_keys[fc_captured]
+        else:
+            captured_chains = []
+            for fs in opp_stones:
+                if board[fs] != opp_color:
+                    continue # already captured via another neighbor
+                captured = maybe_capture_stones(board, fs, neighbors)
+                if captured:
+                    captured_chains.append(captured)
+                    for fc_captured in captured:
+                        zobrist ^= opp_keys[fc_captured]
+
+            # Check for suicide
+            captured = maybe_capture_stones(board, fc, neighbors)
+            if captured:
+                bulk_place_stones(color, board, captured)
+                board[fc] = EMPTY
+                raise IllegalMove("\n%s\n Move at %s is suicide." % (self, fc))
+
+        if self.history is not None:
+            if zobrist in self.history:
+                if groups is not None:
+                    groups.undo(board)
+                else:
+                    unmake_move(board, fc, opp_color, captured_chains)
+                raise IllegalMove("\n%s\n Move at %s repeats a previous position." % (self, fc))
+            self.history.add(zobrist)
+
+        if len(captured_chains) == 1 and len(captured_chains[0]) == 1 and possible_ko_color == opp_color:
+            new_ko = captured_chains[0][0]
         else:
             new_ko = None
 
-        return Position(board, new_ko)
+        new_position = Position(board, new_ko, zobrist, self.history, (fc, captured_chains, self), geometry, groups)
+        captured = [fs for chain in captured_chains for fs in chain]
+        if captured:
+            new_position.captures = len(captured)
+        if self.legal_moves_cache is not None:
+            points = touched_points(board, fc, opp_stones, captured, neighbors)
+            points.update(fp for fp in (ko, new_ko) if fp is not None)
+            new_position.legal_moves_cache = update_legal_moves(
+                self.legal_moves_cache, board, new_ko, points, neighbors)
+        if self.territory_cache is not None:
+            new_position.territory_cache = update_territory(self.territory_cache, board, fc, captured, neighbors)
+        if self.liberties_cache is not None:
+            new_position.liberties_cache = update_liberties(
+                self.liberties_cache, board, fc, opp_stones, captured, neighbors)
+        if self.symmetry_cache is not None:
+            new_position.symmetry_cache = update_symmetry_hashes(
+                self.symmetry_cache, geometry.n, color, fc, opp_color, captured)
+        return new_position
+
+    def pass_move(self):
+        'Pass, which leaves the board as is and clears the ko'
+        new_position = Position(self.board, None, self.zobrist, self.history, (None, [], self), self.geometry, self.groups)
+        if self.legal_moves_cache is not None and self.ko is not None:
+            new_position.legal_moves_cache = update_legal_moves(
+                self.legal_moves_cache, self.board, None, [self.ko], self.geometry.neighbors)
+        else:
+            new_position.legal_moves_cache = self.legal_moves_cache
+        new_position.territory_cache = self.territory_cache
+        new_position.liberties_cache = self.liberties_cache
+        new_position.symmetry_cache = self.symmetry_cache
+        return new_position
+
+    def legal_moves(self, color):
+        '''
+        Return a bitmask of the points where color may play, with bit fc set if
+        fc is legal. Positional superko is not taken into account.
+        '''
+        if self.legal_moves_cache is None:
+            self.legal_moves_cache = update_legal_moves(
+                {BLACK: 0, WHITE: 0}, self.board, self.ko, range(self.geometry.nn), self.geometry.neighbors)
+        return self.legal_moves_cache[ord(color)]
+
+    def undo_move(self):
+        '''
+        Take back the move that produced this position, restoring the shared
+        board in place, and return the position it was played from. Only
+        valid while this is the latest position played on the board.
+        '''
+        fc, captured_chains, parent = self.undo_entry
+        if fc is None:
+            # undoing a pass
+            return parent
+        if self.groups is not None:
+            self.groups.undo(self.board)
+        else:
+            opp_color = swap_colors(self.board[fc])
+            unmake_move(self.board, fc, opp_color, captured_chains)
+        if self.history is not None:
+            self.history.discard(self.zobrist)
+        return parent
 
     def score(self):
-        board = self.board[:] # copy board so we don't mutate it
-        while EMPTY in board:
-            fempty = board.index(EMPTY)
-            empties, borders = find_reached(board, fempty)
-            possible_border_color = board[borders[0]]
-            if all(board[fb] == possible_border_color for fb in borders):
-                bulk_place_stones(possible_border_color, board, empties)
-            else:
-                # if an empty intersection reaches both white and black,
-                # then it belongs to neither player. 
-                bulk_place_stones(ord('?'), board, empties)
-        return board.count(BLACK) - board.count(WHITE)
+        if self.territory_cache is None:
+            self.territory_cache = territory_from_board(self.board, self.geometry.neighbors)
+        return self.territory_cache.score
 
     def get_liberties(self):
-        board = self.board[:]
-        liberties = bytearray(NN)
-        for color in (WHITE, BLACK):
-            while color in board:
-                fc = board.index(color)
-                stones, borders = find_reached(board, fc)
-                num_libs = len([fb for fb in borders if board[fb] == EMPTY])
-                for fs in stones:
-                    liberties[fs] = num_libs
-                bulk_place_stones(ord('?'), board, stones)
-        return list(liberties)
+        'Return a read-only view of the liberty count of the group at each point'
+        if self.liberties_cache is None:
+            if self.groups is not None:
+                self.liberties_cache = bytearray(self.groups.get_liberties(self.board))
+            else:
+                self.liberties_cache = liberties_from_board(self.board, self.geometry.neighbors)
+        return memoryview(self.liberties_cache).toreadonly()
+
+
+def is_eye(board, fc, color, geometry=GEOMETRY):
+    '''
+    Check if the empty point fc is an eye of color: every neighbor is color, and
+    not enough diagonals are held by the opponent to make it a false eye.
+    '''
+    for fn in geometry.neighbors[fc]:
+        if board[fn] != color:
+            return False
+    opp_color = swap_colors(color)
+    diagonals = geometry.diagonals[fc]
+    opp_diagonals = 0
+    for fd in diagonals:
+        if board[fd] == opp_color:
+            opp_diagonals += 1
+    if len(diagonals) < 4:
+        return opp_diagonals == 0
+    return opp_diagonals < 2
+
+class PlayoutBoard():
+    '''
+    Scratch state for random playouts, allocated once and reused for every
+    move: the board, the list of empty points (with each point's index into
+    it, for O(1) removal), and the marks and stack used by flood fills.
+    Marks are stamped with a counter that wraps at 256, so the mark array
+    only needs clearing every 255 flood fills.
+    '''
+    def __init__(self, board, geometry=GEOMETRY):
+        self.board = board[:]
+        self.geometry = geometry
+        self.neighbors = geometry.neighbors
+        self.empties = [fc for fc in range(geometry.nn) if board[fc] == EMPTY]
+        self.empty_index = [0] * geometry.nn
+        for i, fc in enumerate(self.empties):
+            self.empty_index[fc] = i
+        self.marks = bytearray(geometry.nn)
+        self.stamp = 0
+        self.stack = []
+        self.chain = []
+
+    def remove_empty(self, fc):
+        empties, empty_index = self.empties, self.empty_index
+        last = empties.pop()
+        if last != fc:
+            i = empty_index[fc]
+            empties[i] = last
+            empty_index[last] = i
+
+    def add_empty(self, fc):
+        self.empty_index[fc] = len(self.empties)
+        self.empties.append(fc)
+
+    def swap_empties(self, i, j):
+        'Swap the empty points at indexes i and j of the list of empty points'
+        empties, empty_index = self.empties, self.empty_index
+        fi, fj = empties[i], empties[j]
+        empties[i], empties[j] = fj, fi
+        empty_index[fj], empty_index[fi] = i, j
+
+    def chain_has_liberty(self, fc, excluded):
+        '''
+        Flood fill the chain at fc, stopping as soon as it reaches an empty point
+        other than excluded. The stones visited are left in self.chain.
+        '''
+        board, marks, stack, chain, neighbors = self.board, self.marks, self.stack, self.chain, self.neighbors
+        if self.stamp == 255:
+            marks[:] = bytes(len(marks))
+            self.stamp = 0
+        self.stamp += 1
+        stamp = self.stamp
+        color = board[fc]
+        chain.clear()
+        stack.clear()
+        stack.append(fc)
+        marks[fc] = stamp
+        while stack:
+            current_fc = stack.pop()
+            chain.append(current_fc)
+            for fn in neighbors[current_fc]:
+                neighbor_color = board[fn]
+                if neighbor_color == EMPTY:
+                    if fn != excluded:
+                        return True
+                elif neighbor_color == color and marks[fn] != stamp:
+                    marks[fn] = stamp
+                    stack.append(fn)
+        return False
+
+    def is_legal(self, fc, color, ko):
+        'Check if color can play at the empty point fc, without playing it'
+        if fc == ko:
+            return False
+        board = self.board
+        for fn in self.neighbors[fc]:
+            neighbor_color = board[fn]
+            if neighbor_color == EMPTY:
+                return True
+            has_liberty = self.chain_has_liberty(fn, fc)
+            if (neighbor_color == color) == has_liberty:
+                # connects to a friendly chain with a liberty to spare,
+                # or captures an opponent chain
+                return True
+        return False
+
+    def play(self, fc, color):
+        'Play a legal move, returning the new ko point'
+        board, neighbors = self.board, self.neighbors
+        opp_color = swap_colors(color)
+        # The move can only start a ko if it is surrounded by opponent stones
+        koish = True
+        for fn in neighbors[fc]:
+            if board[fn] != opp_color:
+                koish = False
+                break
+        board[fc] = color
+        self.remove_empty(fc)
+        num_captured = 0
+        ko = None
+        for fn in neighbors[fc]:
+            if board[fn] == opp_color and not self.chain_has_liberty(fn, None):
+                for fs in self.chain:
+                    board[fs] = EMPTY
+                    self.add_empty(fs)
+                num_captured += len(self.chain)
+                ko = fn
+        if num_captured == 1 and koish:
+            return ko
+        return None
+
+def playout(position, rng, color='X', max_moves=None, moves_played=None):
+    '''
+    Play uniformly random legal moves from position, starting with color, until
+    both players pass in a row, and return the score of the final board. Each
+    move is drawn from the empty points not yet rejected, which are moved to
+    the end of the list of empty points as they are rejected.
+    Neither player fills its own eyes, and a player passes when no other move
+    is left. Gives up after max_moves (3 moves per point by default), which
+    only guards against long superko cycles. If moves_played is given, each
+    move is appended to it, with None for a pass.
+    '''
+    geometry = position.geometry
+    if max_moves is None:
+        max_moves = 3 * geometry.nn
+    playout_board = PlayoutBoard(position.board, geometry)
+    board, empties = playout_board.board, playout_board.empties
+    is_legal, play, swap_empties = playout_board.is_legal, playout_board.play, playout_board.swap_empties
+    color = ord(color)
+    ko = position.ko
+    passes = 0
+    for _ in range(max_moves):
+        num_candidates = len(empties)
+        while num_candidates:
+            pick = int(rng.random() * num_candidates)
+            fc = empties[pick]
+            if not is_eye(board, fc, color, geometry) and is_legal(fc, color, ko):
+                ko = play(fc, color)
+                passes = 0
+                break
+            num_candidates -= 1
+            swap_empties(pick, num_candidates)
+        else:
+            fc = None
+            ko = None
+            passes += 1
+        if moves_played is not None:
+            moves_played.append(fc)
+        if passes == 2:
+            break
+        color = swap_colors(color)
+    return territory_from_board(board, geometry.neighbors).score
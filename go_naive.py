@@ -1,5 +1,10 @@
 import itertools
 from collections import namedtuple
+from go_geometry import get_geometry, geometry_for_board
+from go_serialize import encode_position, decode_position
+from go_symmetry import update_symmetry_hashes
+from go_board import (find_reached, update_legal_moves, touched_points, territory_from_board, update_territory,
+                      liberties_from_board, update_liberties)
 N = 19
 NN = N ** 2
 WHITE, BLACK, EMPTY = 'O', 'X', '.'
@@ -24,28 +29,24 @@ def unflatten(fc):
 def is_on_board(c):
     return c[0] % N == c[0] and c[1] % N == c[1]
 
-def get_valid_neighbors(fc):
-    x, y = unflatten(fc)
-    possible_neighbors = ((x+1, y), (x-1, y), (x, y+1), (x, y-1))
-    return [flatten(n) for n in possible_neighbors if is_on_board(n)]
-
+# The tables for a 19x19 board. Other sizes get their own Geometry, and the
+# functions below take its neighbors table as an optional last argument.
+GEOMETRY = get_geometry(N)
 # Neighbors are indexed by flat coordinates
-NEIGHBORS = [get_valid_neighbors(fc) for fc in range(NN)]
-
-def find_reached(board, fc):
-    color = board[fc]
-    chain = set([fc])
-    reached = set()
-    frontier = [fc]
-    while frontier:
-        current_fc = frontier.pop()
-        chain.add(current_fc)
-        for fn in NEIGHBORS[current_fc]:
-            if board[fn] == color and not fn in chain:
-                frontier.append(fn)
-            elif board[fn] != color:
-                reached.add(fn)
-    return chain, reached
+NEIGHBORS = GEOMETRY.neighbors
+
+# Zobrist hashing: one random 64-bit key per (color, point). The hash of a
+# board is the XOR of the keys of every stone on it, so it can be updated
+# incrementally as stones are placed and captured. The empty board hashes to 0.
+ZOBRIST = GEOMETRY.zobrist
+
+def zobrist_hash(board):
+    keys = geometry_for_board(board).zobrist
+    h = 0
+    for fc, color in enumerate(board):
+        if color != EMPTY:
+            h ^= keys[color][fc]
+    return h
 
 class IllegalMove(Exception): pass
 
@@ -59,8 +60,8 @@ def bulk_place_stones(color, board, stones):
         byteboard[fstone] = color
     return byteboard.decode('ascii') # and cast back to string when done
 
-def maybe_capture_stones(board, fc):
-    chain, reached = find_reached(board, fc)
+def maybe_capture_stones(board, fc, neighbors=NEIGHBORS):
+    chain, reached = find_reached(board, fc, neighbors)
     if not any(board[fr] == EMPTY for fr in reached):
         board = bulk_place_stones(EMPTY, board, chain)
         return board, chain
@@ -89,88 +90,171 @@ def play_move_incomplete(board, fc, color):
 
     return board
 
-def is_koish(board, fc):
+def is_koish(board, fc, neighbors=NEIGHBORS):
     'Check if fc is surrounded on all sides by 1 color, and return that color'
     if board[fc] != EMPTY: return None
-    neighbor_colors = {board[fn] for fn in NEIGHBORS[fc]}
+    neighbor_colors = {board[fn] for fn in neighbors[fc]}
     if len(neighbor_colors) == 1 and not EMPTY in neighbor_colors:
         return list(neighbor_colors)[0]
     else:
         return None
 
-class Position(namedtuple('Position', ['board', 'ko'])):
+class Position(namedtuple('Position', ['board', 'ko', 'zobrist', 'history', 'geometry'])):
+    '''
+    zobrist: Zobrist hash of board. Computed from the board if not given.
+    history: None, or a frozenset of the Zobrist hashes of every position seen
+        so far, in which case moves that repeat a position are rejected
+        (positional superko). Each position returned by play_move gets its own
+        history, extended with its hash.
+    geometry: the Geometry for the size of board. Looked up from the length of
+        the board if not given.
+    '''
+    # legal_moves_cache: None, or a dict of color to bitmask of legal points, kept up
+    # to date incrementally by play_move once legal_moves() has been called.
+    legal_moves_cache = None
+    # territory_cache: None, or the Territory of board, kept up to date
+    # incrementally by play_move once score() has been called.
+    territory_cache = None
+    # liberties_cache: None, or a bytearray of the liberty count of the group at
+    # each point, kept up to date incrementally by play_move once
+    # get_liberties() has been called.
+    liberties_cache = None
+    # symmetry_cache: None, or a tuple of the Zobrist hash of the board under each
+    # of the 8 symmetries, kept up to date incrementally by play_move once
+    # go_symmetry.symmetry_hashes() has been called.
+    symmetry_cache = None
+    # captures: the number of stones captured by the move that led to this
+    # position, set by play_move.
+    captures = 0
+
+    def __new__(cls, board, ko, zobrist=None, history=None, geometry=None):
+        if zobrist is None:
+            zobrist = zobrist_hash(board)
+        if geometry is None:
+            geometry = geometry_for_board(board)
+        return super().__new__(cls, board, ko, zobrist, history, geometry)
+
+    @staticmethod
+    def initial_state(superko=False, size=N):
+        geometry = get_geometry(size)
+        return Position(board=geometry.empty_board, ko=None, zobrist=0,
+                        history=frozenset([0]) if superko else None, geometry=geometry)
+
     @staticmethod
-    def initial_state():
-        return Position(board=EMPTY_BOARD, ko=None)
+    def from_bytes(data, superko=False):
+        'Return the Position serialized by to_bytes, and the color to play'
+        board, ko, to_play, n = decode_position(data)
+        zobrist = zobrist_hash(board)
+        return Position(board, ko, zobrist, frozenset([zobrist]) if superko else None, get_geometry(n)), to_play
+
+    def to_bytes(self, to_play):
+        'Serialize the position with to_play to move, in the format of go_serialize'
+        return encode_position(self.board, self.ko, to_play, self.geometry.n)
 
     def get_board(self):
         return self.board
 
     def __str__(self):
         import textwrap
-        return '\n'.join(textwrap.wrap(self.board, N))
+        return '\n'.join(textwrap.wrap(self.board, self.geometry.n))
     
     def play_move(self, fc, color):
-        board, ko = self
+        board, ko, zobrist, history, geometry = self
+        neighbors = geometry.neighbors
         if fc == ko:
             raise IllegalMove("%s\n Move at %s illegally retakes ko." % (self, fc))
 
         if board[fc] != EMPTY:
             raise IllegalMove("%s\n Stone exists at %s." % (self, fc))
 
-        possible_ko_color = is_koish(board, fc)
+        possible_ko_color = is_koish(board, fc, neighbors)
         new_board = place_stone(color, board, fc)
+        new_zobrist = zobrist ^ geometry.zobrist[color][fc]
 
         opp_color = swap_colors(color)
         opp_stones = []
         my_stones = []
-        for fn in NEIGHBORS[fc]:
+        for fn in neighbors[fc]:
             if new_board[fn] == color:
                 my_stones.append(fn)
             elif new_board[fn] == opp_color:
                 opp_stones.append(fn)
 
-        opp_captured = 0
+        opp_captured = []
         for fs in opp_stones:
-            new_board, captured = maybe_capture_stones(new_board, fs)
-            opp_captured += len(captured)
+            if new_board[fs] != opp_color:
+                continue # already captured via another neighbor
+            new_board, captured = maybe_capture_stones(new_board, fs, neighbors)
+            opp_captured.extend(captured)
 
         # Check for suicide
-        new_board, captured = maybe_capture_stones(new_board, fc)
+        new_board, captured = maybe_capture_stones(new_board, fc, neighbors)
         if captured:
             raise IllegalMove("\n%s\n Move at %s is suicide." % (self, fc))
 
-        if opp_captured == 1 and possible_ko_color == opp_color:
-            new_ko = list(opp_captured)[0]
+        opp_keys = geometry.zobrist[opp_color]
+        for fs in opp_captured:
+            new_zobrist ^= opp_keys[fs]
+
+        if history is not None:
+            if new_zobrist in history:
+                raise IllegalMove("\n%s\n Move at %s repeats a previous position." % (self, fc))
+            history = history | {new_zobrist}
+
+        if len(opp_captured) == 1 and possible_ko_color == opp_color:
+            new_ko = opp_captured[0]
         else:
             new_ko = None
 
-        return Position(new_board, new_ko)
+        new_position = Position(new_board, new_ko, new_zobrist, history, geometry)
+        if opp_captured:
+            new_position.captures = len(opp_captured)
+        if self.legal_moves_cache is not None:
+            points = touched_points(new_board, fc, opp_stones, opp_captured, neighbors)
+            points.update(fp for fp in (ko, new_ko) if fp is not None)
+            new_position.legal_moves_cache = update_legal_moves(
+                self.legal_moves_cache, new_board, new_ko, points, neighbors)
+        if self.territory_cache is not None:
+            new_position.territory_cache = update_territory(self.territory_cache, new_board, fc, opp_captured, neighbors)
+        if self.liberties_cache is not None:
+            new_position.liberties_cache = update_liberties(
+                self.liberties_cache, new_board, fc, opp_stones, opp_captured, neighbors)
+        if self.symmetry_cache is not None:
+            new_position.symmetry_cache = update_symmetry_hashes(
+                self.symmetry_cache, geometry.n, color, fc, opp_color, opp_captured)
+        return new_position
+
+    def pass_move(self):
+        'Pass, which leaves the board as is and clears the ko'
+        new_position = self._replace(ko=None)
+        if self.legal_moves_cache is not None and self.ko is not None:
+            new_position.legal_moves_cache = update_legal_moves(
+                self.legal_moves_cache, self.board, None, [self.ko], self.geometry.neighbors)
+        else:
+            new_position.legal_moves_cache = self.legal_moves_cache
+        new_position.territory_cache = self.territory_cache
+        new_position.liberties_cache = self.liberties_cache
+        new_position.symmetry_cache = self.symmetry_cache
+        return new_position
+
+    def legal_moves(self, color):
+        '''
+        Return a bitmask of the points where color may play, with bit fc set if
+        fc is legal. Positional superko is not taken into account.
+        '''
+        if self.legal_moves_cache is None:
+            self.legal_moves_cache = update_legal_moves(
+                {BLACK: 0, WHITE: 0}, self.board, self.ko, range(self.geometry.nn), self.geometry.neighbors)
+        return self.legal_moves_cache[color]
 
     def score(self):
-        board = self.board
-        while EMPTY in board:
-            fempty = board.index(EMPTY)
-            empties, borders = find_reached(board, fempty)
-            possible_border_color = board[list(borders)[0]]
-            if all(board[fb] == possible_border_color for fb in borders):
-                board = bulk_place_stones(possible_border_color, board, empties)
-            else:
-                # if an empty intersection reaches both white and black,
-                # then it belongs to neither player. 
-                board = bulk_place_stones('?', board, empties)
-        return board.count(BLACK) - board.count(WHITE)
+        if self.territory_cache is None:
+            self.territory_cache = territory_from_board(self.board, self.geometry.neighbors)
+        return self.territory_cache.score
 
     def get_liberties(self):
-        board = self.board
-        liberties = bytearray(NN)
-        for color in (WHITE, BLACK):
-            while color in board:
-                fc = board.index(color)
-                stones, borders = find_reached(board, fc)
-                num_libs = len([fb for fb in borders if board[fb] == EMPTY])
-                for fs in stones:
-                    liberties[fs] = num_libs
-                board = bulk_place_stones('?', board, stones)
-        return list(liberties)
+        'Return a read-only view of the liberty count of the group at each point'
+        if self.liberties_cache is None:
+            self.liberties_cache = liberties_from_board(self.board, self.geometry.neighbors)
+        return memoryview(self.liberties_cache).toreadonly()
 
@@ -0,0 +1,49 @@
+'''
+A compact binary format for a position with the side to move, used by each
+backend's Position.to_bytes() and Position.from_bytes():
+
+    byte 0: n, for an n x n board
+    byte 1: the side to move, 0 for black and 1 for white
+    bytes 2-3: the ko point, as a little-endian signed short, or -1 for none
+    then the points, 2 bits each and 4 to a byte starting from the low bits:
+        0 for empty, 1 for black and 2 for white
+
+A 19x19 position takes 95 bytes, and every position of a size takes the same
+number of bytes, so that files of them can be indexed without parsing.
+'''
+import struct
+WHITE, BLACK, EMPTY = 'O', 'X', '.'
+HEADER = struct.Struct('<BBh')
+POINTS = EMPTY + BLACK + WHITE
+COLORS = BLACK + WHITE
+NO_KO = -1
+
+# Each 4 points of a board string to the byte packing them, and back. Bytes
+# with the unused code 3 decode to '?'.
+DECODE = [''.join((POINTS + '?')[(byte >> shift) & 3] for shift in (0, 2, 4, 6)) for byte in range(256)]
+ENCODE = {points: byte for byte, points in enumerate(DECODE) if '?' not in points}
+
+def record_size(n):
+    'The number of bytes a position on an n x n board takes'
+    return HEADER.size + (n * n + 3) // 4
+
+def encode_position(board, ko, to_play, n):
+    'Serialize a board string with its ko point and the color to play'
+    nn = n * n
+    board += EMPTY * (-nn % 4)
+    return HEADER.pack(n, COLORS.index(to_play), NO_KO if ko is None else ko) + bytes(
+        [ENCODE[board[i:i+4]] for i in range(0, nn, 4)])
+
+def decode_position(data):
+    '''
+    Deserialize a position, from bytes or any buffer such as a memoryview of
+    an mmap. Returns the board string, the ko point, the color to play and n.
+    '''
+    n, to_play, ko = HEADER.unpack_from(data)
+    nn = n * n
+    if len(data) != record_size(n) or to_play > 1 or not -1 <= ko < nn:
+        raise ValueError("Not a serialized %dx%d position" % (n, n))
+    board = ''.join(map(DECODE.__getitem__, data[HEADER.size:]))[:nn]
+    if '?' in board:
+        raise ValueError("Invalid point in serialized position")
+    return board, None if ko == NO_KO else ko, COLORS[to_play], n
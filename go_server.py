@@ -0,0 +1,375 @@
+'''
+A game server speaking a subset of GTP (the Go Text Protocol) over
+localhost TCP or a Unix socket, holding one go_game.Game in memory for each
+connection, on any backend:
+
+    python go_server.py sets --port 5000
+    python go_server.py mutable --unix /tmp/go.sock
+
+Supported commands: protocol_version, name, version, known_command,
+list_commands, quit, boardsize, clear_board, komi, play, genmove,
+final_score and showboard, plus is_legal COLOR VERTEX, liberties VERTEX (the
+liberties of the chain at VERTEX) and captures COLOR as extensions.
+genmove plays a random legal move that doesn't fill one of the player's own
+eyes, for self-play.
+
+Score and liberty queries made by all connections during one tick of the
+event loop are answered together at the end of it by a QueryBatcher, once
+for each distinct board. Liberties are found with one go_batched pass on
+go_naive, go_mutable and go_bitboard, and read from the LibertyTracker on
+go_sets. Scores aren't batched: each position keeps its territory up to date
+incrementally, which is cheaper.
+'''
+import argparse
+import asyncio
+import random
+import go_naive
+import go_mutable
+import go_sets
+import go_bitboard
+from go_game import Game, PASS
+
+IMPLEMENTATIONS = {
+    'naive': go_naive,
+    'mutable': go_mutable,
+    'sets': go_sets,
+    'bitboard': go_bitboard,
+}
+# GTP columns skip the letter I
+COLUMNS = 'ABCDEFGHJKLMNOPQRSTUVWXYZ'
+MAX_SIZE = len(COLUMNS)
+COLORS = {'b': 'X', 'black': 'X', 'w': 'O', 'white': 'O'}
+SCORE, LIBERTIES = 'score', 'liberties'
+
+class GTPError(Exception): pass
+
+def parse_vertex(vertex, n):
+    'Return the flat coordinate of a GTP vertex such as D4 (counted from the bottom left), or PASS'
+    vertex = vertex.upper()
+    if vertex == 'PASS':
+        return PASS
+    column = COLUMNS.find(vertex[:1])
+    if not 0 <= column < n or not vertex[1:].isdigit() or not 1 <= int(vertex[1:]) <= n:
+        raise GTPError("invalid coordinate")
+    return n * (n - int(vertex[1:])) + column
+
+def format_vertex(fc, n):
+    if fc == PASS:
+        return 'pass'
+    row, column = divmod(fc, n)
+    return '%s%d' % (COLUMNS[column], n - row)
+
+def parse_color(color):
+    try:
+        return COLORS[color.lower()]
+    except KeyError:
+        raise GTPError("invalid color") from None
+
+def fill_liberties(positions):
+    '''
+    Fill in the liberties_cache of positions of backends that keep one
+    (go_naive, go_mutable and go_bitboard), with a single go_batched
+    labelling of all their boards per size of board. play_move keeps the
+    caches up to date from then on.
+    '''
+    import numpy as np
+    import go_batched
+    by_size = {}
+    for position in positions:
+        by_size.setdefault(position.geometry.n, []).append(position)
+    for n, same_size in by_size.items():
+        boards = np.frombuffer(''.join([position.get_board() for position in same_size]).encode('ascii'),
+                               dtype=np.int8).reshape(len(same_size), n * n)
+        batch = go_batched.PositionBatch(boards, np.full(len(same_size), -1, dtype=np.intp), same_size[0].geometry)
+        for position, liberties in zip(same_size, batch.get_liberties()):
+            position.liberties_cache = bytearray(liberties.tobytes())
+
+class QueryBatcher():
+    '''
+    Collects the score and liberty queries submitted during one tick of the
+    event loop, and answers them at the end of it. Queries about the same
+    board, from any game, are answered once. Which queries are batched
+    depends on the backend:
+
+    - Liberties: go_naive, go_mutable and go_bitboard positions without a
+      liberties_cache get it from one go_batched pass over all their boards
+      (see fill_liberties), after which play_move keeps it up to date. go_sets
+      positions read their liberties from their LibertyTracker, which is
+      always up to date, so there is nothing to batch.
+    - Scores: not batched on any backend. Each board is scored by its
+      position's score(), which flood fills the board the first time and then
+      keeps a territory_cache up to date through play_move. That is cheaper
+      than a go_batched pass over every board on each query.
+
+    flushes, queries: counters of the ticks with queries and of the queries
+    '''
+    __slots__ = ('pending', 'scheduled', 'flushes', 'queries')
+
+    def __init__(self):
+        self.pending = []
+        self.scheduled = False
+        self.flushes = self.queries = 0
+
+    def submit(self, kind, position):
+        'Return a future of the score or the liberties (kind SCORE or LIBERTIES) of position'
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((kind, position, future))
+        if not self.scheduled:
+            self.scheduled = True
+            loop.call_soon(self.flush)
+        return future
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        self.scheduled = False
+        self.flushes += 1
+        self.queries += len(pending)
+        # One position for each distinct kind of query and board, keyed by
+        # the Zobrist hash of the board
+        distinct = {}
+        for kind, position, future in pending:
+            distinct.setdefault((kind, position.geometry.n, position.zobrist), position)
+        unfilled = [position for (kind, n, zobrist), position in distinct.items()
+                    if kind == LIBERTIES and hasattr(position, 'liberties_cache') and position.liberties_cache is None]
+        if unfilled:
+            fill_liberties(unfilled)
+        results = {}
+        for kind, position, future in pending:
+            if future.cancelled():
+                continue
+            key = (kind, position.geometry.n, position.zobrist)
+            if key not in results:
+                position = distinct[key]
+                try:
+                    results[key] = position.score() if kind == SCORE else position.get_liberties()
+                except Exception as e:
+                    future.set_exception(e)
+                    continue
+            future.set_result(results[key])
+
+class Session():
+    'The state of one connection: its game, and the random number generator for genmove'
+    __slots__ = ('game', 'rng')
+
+    def __init__(self, game, rng):
+        self.game = game
+        self.rng = rng
+
+class GameServer():
+    '''
+    Serves GTP connections with games on one backend module.
+
+    sessions: a set of the Session of each open connection
+    connections: the number of connections accepted, which seeds each
+        session's random number generator apart from all the others
+    requests: the number of commands answered
+    '''
+    __slots__ = ('module', 'size', 'komi', 'batcher', 'sessions', 'connections', 'requests', 'seed')
+
+    def __init__(self, module, size=19, komi=7.5, seed=0):
+        self.module = module
+        self.size = size
+        self.komi = komi
+        self.batcher = QueryBatcher()
+        self.sessions = set()
+        self.connections = 0
+        self.requests = 0
+        self.seed = seed
+
+    def new_game(self, size, komi):
+        return Game.new(self.module, size=size, komi=komi)
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        'Start serving on a Unix socket at path, or on host and port'
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_connection, path=path)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def handle_connection(self, reader, writer):
+        session = Session(self.new_game(self.size, self.komi), random.Random(self.seed + self.connections))
+        self.connections += 1
+        self.sessions.add(session)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response, quit = await self.execute(session, line.decode('ascii', 'replace'))
+                if response is None:
+                    continue
+                writer.write(response.encode('ascii'))
+                await writer.drain()
+                if quit:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+
+    async def execute(self, session, line):
+        '''
+        Run one line of GTP, returning the response (None for an empty line)
+        and whether the connection should close
+        '''
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            return None, False
+        args = line.split()
+        command_id = args.pop(0) if args[0].isdigit() else ''
+        if not args:
+            return '?%s syntax error\n\n' % command_id, False
+        command = args.pop(0).lower()
+        self.requests += 1
+        handler = COMMANDS.get(command)
+        if handler is None:
+            return '?%s unknown command\n\n' % command_id, False
+        # Every handler takes self and session, then the command's arguments
+        if len(args) != handler.__code__.co_argcount - 2:
+            return '?%s syntax error\n\n' % command_id, False
+        try:
+            result = handler(self, session, *args)
+            if asyncio.iscoroutine(result):
+                result = await result
+        except GTPError as e:
+            return '?%s %s\n\n' % (command_id, e), False
+        return '=%s %s\n\n' % (command_id, result), command == 'quit'
+
+    def gtp_protocol_version(self, session):
+        return '2'
+
+    def gtp_name(self, session):
+        return 'go_server'
+
+    def gtp_version(self, session):
+        return self.module.__name__
+
+    def gtp_known_command(self, session, command):
+        return 'true' if command.lower() in COMMANDS else 'false'
+
+    def gtp_list_commands(self, session):
+        return '\n'.join(COMMANDS)
+
+    def gtp_quit(self, session):
+        return ''
+
+    def gtp_boardsize(self, session, size):
+        if not size.isdigit() or not 2 <= int(size) <= MAX_SIZE:
+            raise GTPError("unacceptable size")
+        session.game = self.new_game(int(size), session.game.komi)
+        return ''
+
+    def gtp_clear_board(self, session):
+        game = session.game
+        session.game = self.new_game(game.position.geometry.n, game.komi)
+        return ''
+
+    def gtp_komi(self, session, komi):
+        try:
+            session.game.komi = float(komi)
+        except ValueError:
+            raise GTPError("syntax error") from None
+        return ''
+
+    def gtp_play(self, session, color, vertex):
+        game = session.game
+        color = parse_color(color)
+        fc = parse_vertex(vertex, game.position.geometry.n)
+        # GTP lets either color move at any time
+        game.to_play = color
+        try:
+            game.play(fc)
+        except self.module.IllegalMove:
+            raise GTPError("illegal move") from None
+        return ''
+
+    def gtp_genmove(self, session, color):
+        game = session.game
+        color = parse_color(color)
+        if game.is_over():
+            raise GTPError("game is over")
+        position = game.position
+        board, neighbors = position.get_board(), position.geometry.neighbors
+        # Legal moves that don't fill one of color's own eyes
+        legal = position.legal_moves(color)
+        candidates = []
+        while legal:
+            fc = (legal & -legal).bit_length() - 1
+            legal &= legal - 1
+            for fn in neighbors[fc]:
+                if board[fn] != color:
+                    candidates.append(fc)
+                    break
+        game.to_play = color
+        session.rng.shuffle(candidates)
+        for fc in candidates:
+            try:
+                game.play(fc)
+                return format_vertex(fc, position.geometry.n)
+            except self.module.IllegalMove:
+                # Only possible with superko, which legal_moves ignores
+                pass
+        game.play(PASS)
+        return 'pass'
+
+    def gtp_is_legal(self, session, color, vertex):
+        position = session.game.position
+        fc = parse_vertex(vertex, position.geometry.n)
+        if fc == PASS:
+            return '1'
+        return '1' if position.legal_moves(parse_color(color)) >> fc & 1 else '0'
+
+    async def gtp_final_score(self, session):
+        game = session.game
+        score = await self.batcher.submit(SCORE, game.position) - game.komi
+        if score == 0:
+            return '0'
+        return '%s+%g' % ('B' if score > 0 else 'W', abs(score))
+
+    async def gtp_liberties(self, session, vertex):
+        position = session.game.position
+        fc = parse_vertex(vertex, position.geometry.n)
+        if fc == PASS:
+            raise GTPError("invalid coordinate")
+        liberties = await self.batcher.submit(LIBERTIES, position)
+        return str(liberties[fc])
+
+    def gtp_captures(self, session, color):
+        return str(session.game.prisoners[parse_color(color)])
+
+    def gtp_showboard(self, session):
+        position = session.game.position
+        n = position.geometry.n
+        board = position.get_board()
+        return '\n' + '\n'.join(board[row * n:(row + 1) * n] for row in range(n))
+
+# Command name to GameServer method
+COMMANDS = {name: getattr(GameServer, 'gtp_' + name) for name in (
+    'protocol_version', 'name', 'version', 'known_command', 'list_commands', 'quit', 'boardsize',
+    'clear_board', 'komi', 'play', 'genmove', 'final_score', 'showboard', 'is_legal', 'liberties', 'captures')}
+
+async def serve(module, host='127.0.0.1', port=5000, path=None, size=19, komi=7.5):
+    server = await GameServer(module, size=size, komi=komi).start(host, port, path)
+    async with server:
+        await server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve games of go over GTP.')
+    parser.add_argument('implementation', choices=list(IMPLEMENTATIONS),
+                        help='backend to play on')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', default=5000, type=int)
+    parser.add_argument('--unix', metavar='PATH',
+                        help='listen on a Unix socket at PATH instead of TCP')
+    parser.add_argument('--size', default=19, type=int,
+                        help='board size of new games')
+    parser.add_argument('--komi', default=7.5, type=float)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(IMPLEMENTATIONS[args.implementation], args.host, args.port, args.unix, args.size, args.komi))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,11 @@
 import copy
+from array import array
 from collections import namedtuple
+from collections.abc import Mapping
+from go_geometry import get_geometry, geometry_for_board
+from go_serialize import encode_position, decode_position
+from go_symmetry import update_symmetry_hashes
+from go_board import find_reached, update_legal_moves, territory_from_board, update_territory
 N = 19
 NN = N ** 2
 WHITE, BLACK, EMPTY = 'O', 'X', '.'
@@ -24,28 +30,24 @@ def unflatten(fc):
 def is_on_board(c):
     return c[0] % N == c[0] and c[1] % N == c[1]
 
-def get_valid_neighbors(fc):
-    x, y = unflatten(fc)
-    possible_neighbors = ((x+1, y), (x-1, y), (x, y+1), (x, y-1))
-    return [flatten(n) for n in possible_neighbors if is_on_board(n)]
-
+# The tables for a 19x19 board. Other sizes get their own Geometry, and the
+# functions below take its neighbors table as an optional last argument.
+GEOMETRY = get_geometry(N)
 # Neighbors are indexed by flat coordinates
-NEIGHBORS = [get_valid_neighbors(fc) for fc in range(NN)]
-
-def find_reached(board, fc):
-    color = board[fc]
-    chain = set([fc])
-    reached = set()
-    frontier = [fc]
-    while frontier:
-        current_fc = frontier.pop()
-        chain.add(current_fc)
-        for fn in NEIGHBORS[current_fc]:
-            if board[fn] == color and not fn in chain:
-                frontier.append(fn)
-            elif board[fn] != color:
-                reached.add(fn)
-    return chain, reached
+NEIGHBORS = GEOMETRY.neighbors
+
+# Zobrist hashing: one random 64-bit key per (color, point). The hash of a
+# board is the XOR of the keys of every stone on it, so it can be updated
+# incrementally as stones are placed and captured. The empty board hashes to 0.
+ZOBRIST = GEOMETRY.zobrist
+
+def zobrist_hash(board):
+    keys = geometry_for_board(board).zobrist
+    h = 0
+    for fc, color in enumerate(board):
+        if color != EMPTY:
+            h ^= keys[color][fc]
+    return h
 
 class IllegalMove(Exception): pass
 
@@ -59,8 +61,8 @@ def bulk_place_stones(color, board, stones):
         byteboard[fs] = color
     return byteboard.decode('ascii') # and cast back to string when done
 
-def maybe_capture_stones(board, fc):
-    chain, reached = find_reached(board, fc)
+def maybe_capture_stones(board, fc, neighbors=NEIGHBORS):
+    chain, reached = find_reached(board, fc, neighbors)
     if not any(board[fr] == EMPTY for fr in reached):
         board = bulk_place_stones(EMPTY, board, chain)
         return board, chain
@@ -76,44 +78,79 @@ class Group(namedtuple('Group', ['id', 'stones', 'liberties', 'color'])):
     pass
 
 class LibertyTracker():
-    @staticmethod
-    def from_board(board):
-        curr_group_id = 0
-        lib_tracker = LibertyTracker([None] * NN, {})
+    @classmethod
+    def from_board(cls, board, geometry=None):
+        '''
+        Build a tracker for a board string in one pass over the stones of
+        each color, flood filling each group from its first stone. Groups are
+        numbered from 1, white groups first, each color in order of their
+        first stone.
+        '''
+        if geometry is None:
+            geometry = geometry_for_board(board)
+        neighbors = geometry.neighbors
+        group_index = [None] * geometry.nn
+        liberty_cache = [0] * geometry.nn
+        groups = {}
+        group_id = 0
         for color in (WHITE, BLACK):
-            while color in board:
-                curr_group_id += 1
-                coord = board.index(color)
-                chain, reached = find_reached(board, coord)
-                liberties = set(fr for fr in reached if board[fr] == EMPTY)
-                new_group = Group(curr_group_id, chain, liberties, color)
-                lib_tracker.groups[curr_group_id] = new_group
-                for fs in chain:
-                    lib_tracker.group_index[fs] = curr_group_id
-                board = bulk_place_stones('?', board, chain)
-
-        lib_tracker.max_group_id = curr_group_id
-
-        liberty_counts = [0] * NN
-        for group in lib_tracker.groups.values():
-            num_libs = len(group.liberties)
-            for fs in group.stones:
-                liberty_counts[fs] = num_libs
-        lib_tracker.liberty_cache = liberty_counts
-
-        return lib_tracker
-
-    def __init__(self, group_index, groups, liberty_cache=None, max_group_id=1):
+            fc = board.find(color)
+            while fc != -1:
+                if group_index[fc] is None:
+                    group_id += 1
+                    group_index[fc] = group_id
+                    # Each stone is appended to chain once, and its neighbors
+                    # visited as the loop reaches it
+                    chain = [fc]
+                    liberties = set()
+                    for fs in chain:
+                        for fn in neighbors[fs]:
+                            neighbor_color = board[fn]
+                            if neighbor_color == color:
+                                if group_index[fn] is None:
+                                    group_index[fn] = group_id
+                                    chain.append(fn)
+                            elif neighbor_color == EMPTY:
+                                liberties.add(fn)
+                    groups[group_id] = Group(group_id, set(chain), liberties, color)
+                    num_libs = len(liberties)
+                    for fs in chain:
+                        liberty_cache[fs] = num_libs
+                fc = board.find(color, fc + 1)
+        return cls(group_index, groups, liberty_cache=liberty_cache, max_group_id=group_id, geometry=geometry)
+
+    @classmethod
+    def from_boards(cls, boards):
+        '''
+        Build a tracker for each of a batch of board strings, looking up the
+        geometry once per size of board
+        '''
+        from_board = cls.from_board
+        geometries = {}
+        trackers = []
+        for board in boards:
+            geometry = geometries.get(len(board))
+            if geometry is None:
+                geometry = geometries[len(board)] = geometry_for_board(board)
+            trackers.append(from_board(board, geometry))
+        return trackers
+
+    def __init__(self, group_index, groups, liberty_cache=None, max_group_id=1, geometry=None):
         # group_index: a NN-length array of None/group_ids
         # groups: a dict of group_id to groups
         # liberty_cache: a NN-length array of liberty counts
+        # geometry: the Geometry of the board, looked up from the length of
+        #   group_index if not given
         self.group_index = group_index
         self.groups = groups
         if liberty_cache is not None:
             self.liberty_cache = liberty_cache
         else:
-            self.liberty_cache = [0]*NN
+            self.liberty_cache = [0]*len(group_index)
         self.max_group_id = max_group_id
+        if geometry is None:
+            geometry = geometry_for_board(group_index)
+        self.geometry = geometry
 
     def __deepcopy__(self, memodict={}):
         new_group_index = self.group_index[:]
@@ -122,7 +159,8 @@ class LibertyTracker():
             group.id: Group(group.id, set(group.stones), set(group.liberties), group.color)
             for group in self.groups.values()
         }
-        return LibertyTracker(new_group_index, new_groups, liberty_cache=new_lib_cache, max_group_id=self.max_group_id)
+        return type(self)(new_group_index, new_groups, liberty_cache=new_lib_cache, max_group_id=self.max_group_id,
+                          geometry=self.geometry)
 
     def get_liberties(self):
         return self.liberty_cache
@@ -139,7 +177,7 @@ class LibertyTracker():
         friendly_neighboring_group_ids = set()
         empty_neighbors = set()
 
-        for fn in NEIGHBORS[fc]:
+        for fn in self.geometry.neighbors[fc]:
             neighbor_group_id = self.group_index[fn]
             if neighbor_group_id is not None:
                 neighbor_group = self.groups[neighbor_group_id]
@@ -175,8 +213,12 @@ class LibertyTracker():
         self.liberty_cache[fc] = len(liberties)
         return new_group
 
+    def _writable_group(self, group_id):
+        'Return a group whose stones and liberties may be modified in place'
+        return self.groups[group_id]
+
     def _merge_groups(self, group1_id, group2_id):
-        group1 = self.groups[group1_id]
+        group1 = self._writable_group(group1_id)
         group2 = self.groups[group2_id]
         group1.stones.update(group2.stones)
         del self.groups[group2_id]
@@ -196,7 +238,7 @@ class LibertyTracker():
         return dead_group.stones
 
     def _update_liberties(self, group_id, add=None, remove=None):
-        group = self.groups[group_id]
+        group = self._writable_group(group_id)
         if add:
             group.liberties.update(add)
         if remove:
@@ -207,36 +249,478 @@ class LibertyTracker():
             self.liberty_cache[fs] = new_lib_count
 
     def _handle_captures(self, captured_stones):
+        neighbors = self.geometry.neighbors
         for fs in captured_stones:
-            for fn in NEIGHBORS[fs]:
+            for fn in neighbors[fs]:
                 group_id = self.group_index[fn]
                 if group_id is not None:
                     self._update_liberties(group_id, add={fs})
 
 
-def is_koish(board, fc):
+class PersistentLibertyTracker(LibertyTracker):
+    '''
+    A LibertyTracker that shares untouched groups with the tracker it was
+    derived from. add_stone copies the flat group_index/liberty_cache lists and
+    the groups dict, but only copies a group's stones and liberties sets the
+    first time this tracker modifies that group (copy-on-write).
+    '''
+    def __init__(self, group_index, groups, liberty_cache=None, max_group_id=1, geometry=None):
+        super().__init__(group_index, groups, liberty_cache=liberty_cache, max_group_id=max_group_id,
+                         geometry=geometry)
+        # owned_group_ids: groups created or copied by this tracker, which no
+        # other tracker holds a reference to
+        self.owned_group_ids = set()
+
+    def add_stone(self, color, fc):
+        new_lib_tracker = PersistentLibertyTracker(
+            self.group_index[:], self.groups.copy(), liberty_cache=self.liberty_cache[:], max_group_id=self.max_group_id,
+            geometry=self.geometry)
+        captured_stones = new_lib_tracker._add_stone(color, fc)
+        return new_lib_tracker, captured_stones
+
+    def _create_group(self, color, fc, liberties):
+        new_group = super()._create_group(color, fc, liberties)
+        self.owned_group_ids.add(new_group.id)
+        return new_group
+
+    def _writable_group(self, group_id):
+        if group_id in self.owned_group_ids:
+            return self.groups[group_id]
+        group = self.groups[group_id]
+        new_group = Group(group.id, set(group.stones), set(group.liberties), group.color)
+        self.groups[group_id] = new_group
+        self.owned_group_ids.add(group_id)
+        return new_group
+
+
+class UndoableLibertyTracker(LibertyTracker):
+    '''
+    A LibertyTracker that adds stones in place with make_move and takes them
+    back with unmake_move, for reading ahead without copying the tracker at
+    every move. A move copies each group the first time it modifies it, and
+    keeps the originals on the undo stack.
+    '''
+    def __init__(self, group_index, groups, liberty_cache=None, max_group_id=1, geometry=None):
+        super().__init__(group_index, groups, liberty_cache=liberty_cache, max_group_id=max_group_id,
+                         geometry=geometry)
+        # undo_stack: a list of (fc, max_group_id, journal) for each move
+        # made, where journal is a dict of the id of each group the move
+        # touched to the group before the move, or None for new groups
+        self.undo_stack = []
+        self.journal = None
+
+    @classmethod
+    def from_tracker(cls, liberty_tracker):
+        '''
+        Start from the state of another tracker, sharing its groups, which
+        are never modified in place
+        '''
+        return cls(liberty_tracker.group_index[:], liberty_tracker.groups.copy(), liberty_cache=liberty_tracker.liberty_cache[:],
+                   max_group_id=liberty_tracker.max_group_id, geometry=liberty_tracker.geometry)
+
+    def make_move(self, color, fc):
+        '''
+        Add a stone in place and return the captured stones. Suicide isn't
+        checked: the stone is left with a liberty count of 0.
+        '''
+        group_index, groups = self.group_index, self.groups
+        journal = {}
+        for fn in self.geometry.neighbors[fc]:
+            group_id = group_index[fn]
+            if group_id is not None:
+                journal[group_id] = groups[group_id]
+        self.journal = journal
+        max_group_id = self.max_group_id
+        captured_stones = self._add_stone(color, fc)
+        self.undo_stack.append((fc, max_group_id, journal))
+        self.journal = None
+        return captured_stones
+
+    def unmake_move(self):
+        '''
+        Take back the last move made. The points it changed are fc and the
+        stones of the groups it touched, so restoring those groups is enough.
+        '''
+        fc, self.max_group_id, journal = self.undo_stack.pop()
+        group_index, groups, liberty_cache = self.group_index, self.groups, self.liberty_cache
+        group_index[fc] = None
+        liberty_cache[fc] = 0
+        for group_id, group in journal.items():
+            if group is None:
+                groups.pop(group_id, None)
+                continue
+            groups[group_id] = group
+            num_libs = len(group.liberties)
+            for fs in group.stones:
+                group_index[fs] = group_id
+                liberty_cache[fs] = num_libs
+
+    def _create_group(self, color, fc, liberties):
+        new_group = super()._create_group(color, fc, liberties)
+        self.journal[new_group.id] = None
+        return new_group
+
+    def _writable_group(self, group_id):
+        group = self.groups[group_id]
+        journal = self.journal
+        if group_id in journal and group is not journal[group_id]:
+            # Created or already copied by this move
+            return group
+        journal.setdefault(group_id, group)
+        new_group = Group(group.id, set(group.stones), set(group.liberties), group.color)
+        self.groups[group_id] = new_group
+        return new_group
+
+def read_ladder(liberty_tracker, fc, ko=None, max_depth=None):
+    '''
+    Read out whether the group at fc escapes a ladder. A group with one
+    liberty is in atari with its own side to move: it can extend at its
+    liberty or capture a neighboring group in atari. A group with two
+    liberties has the attacker to move, who may atari it from either side.
+    The group escapes if it can reach three liberties whatever the attacker
+    does. ko is the point neither side may play at on the first move, as in
+    Position.ko; retaking a ko is illegal throughout. Reading stops after
+    max_depth moves (2 per point by default), counting the group as escaped.
+
+    The moves are read on an UndoableLibertyTracker with make/unmake, so only
+    one copy of liberty_tracker is made per call.
+    '''
+    num_libs = liberty_tracker.liberty_cache[fc]
+    if not 1 <= num_libs <= 2:
+        raise ValueError("The group at %s has %s liberties; ladders are read from 1 or 2" % (fc, num_libs))
+    tracker = UndoableLibertyTracker.from_tracker(liberty_tracker)
+    if max_depth is None:
+        max_depth = 2 * tracker.geometry.nn
+    color = tracker.groups[tracker.group_index[fc]].color
+    if num_libs == 1:
+        return _ladder_escapes(tracker, fc, color, ko, max_depth)
+    return not _ladder_captures(tracker, fc, swap_colors(color), ko, max_depth)
+
+def _make_ladder_move(tracker, color, move):
+    '''
+    Play move for color on tracker. Returns the new ko point, or False for
+    suicide, in which case the move has already been taken back.
+    '''
+    captured_stones = tracker.make_move(color, move)
+    if tracker.liberty_cache[move] == 0:
+        tracker.unmake_move()
+        return False
+    if len(captured_stones) == 1:
+        # A lone stone whose only liberty is the stone it captured takes a ko
+        group = tracker.groups[tracker.group_index[move]]
+        if len(group.stones) == 1 and group.liberties == captured_stones:
+            return next(iter(captured_stones))
+    return None
+
+def _ladder_escapes(tracker, fc, color, ko, depth):
+    '''
+    With the group at fc in atari and color, its owner, to move, check if
+    it escapes by extending or by capturing a neighboring group in atari.
+    '''
+    if depth == 0:
+        return True
+    group = tracker.groups[tracker.group_index[fc]]
+    candidates = list(group.liberties)
+    neighbors = tracker.geometry.neighbors
+    for group_id in {tracker.group_index[fn] for fs in group.stones for fn in neighbors[fs]}:
+        if group_id is not None and group_id != group.id:
+            neighbor_group = tracker.groups[group_id]
+            if len(neighbor_group.liberties) == 1:
+                candidates.extend(neighbor_group.liberties)
+
+    liberty_cache = tracker.liberty_cache
+    for move in candidates:
+        if move == ko:
+            continue
+        new_ko = _make_ladder_move(tracker, color, move)
+        if new_ko is False:
+            continue
+        num_libs = liberty_cache[fc]
+        if num_libs < 2:
+            escaped = False
+        elif num_libs > 2:
+            escaped = True
+        else:
+            escaped = not _ladder_captures(tracker, fc, swap_colors(color), new_ko, depth - 1)
+        tracker.unmake_move()
+        if escaped:
+            return True
+    return False
+
+def _ladder_captures(tracker, fc, color, ko, depth):
+    '''
+    With the group at fc on two liberties and color, the attacker, to move,
+    check if some atari keeps it in a ladder until it is captured.
+    '''
+    if depth == 0:
+        return False
+    liberty_cache = tracker.liberty_cache
+    for move in list(tracker.groups[tracker.group_index[fc]].liberties):
+        if move == ko:
+            continue
+        new_ko = _make_ladder_move(tracker, color, move)
+        if new_ko is False:
+            continue
+        if liberty_cache[fc] != 1:
+            captured = False
+        else:
+            captured = not _ladder_escapes(tracker, fc, swap_colors(color), new_ko, depth - 1)
+        tracker.unmake_move()
+        if captured:
+            return True
+    return False
+
+def iter_points(mask):
+    'Yield the flat coordinates of each bit set in mask'
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+class CompactGroup(namedtuple('CompactGroup', ['stones', 'liberties', 'color'])):
+    '''
+    stones: a bitmask of the points belonging to this group
+    liberties: a bitmask of the empty points adjacent to this group
+    color: color of this group
+    '''
+    pass
+
+class GroupsView(Mapping):
+    '''
+    A read-only dict of group id to Group over a CompactLibertyTracker's
+    groups, building each Group's sets when it is looked up.
+    '''
+    __slots__ = ('compact_groups',)
+
+    def __init__(self, compact_groups):
+        self.compact_groups = compact_groups
+
+    def __getitem__(self, group_id):
+        stones, liberties, color = self.compact_groups[group_id]
+        return Group(group_id, set(iter_points(stones)), set(iter_points(liberties)), color)
+
+    def __iter__(self):
+        return iter(self.compact_groups)
+
+    def __len__(self):
+        return len(self.compact_groups)
+
+class CompactLibertyTracker():
+    '''
+    A LibertyTracker that is cheap to copy and to keep many of in memory.
+    Groups hold bitmasks rather than sets, so add_stone only needs a shallow
+    copy of the groups dict, and untouched groups are shared between trackers.
+
+    group_index: an array('h') of the group id at each point, or 0 for empty
+        points. A group's id is 1 + one of its stones, so ids fit in 16 bits.
+    liberty_cache: a bytearray of the liberty count at each point
+    compact_groups: a dict of group id to CompactGroup
+    groups: a GroupsView of compact_groups, for the LibertyTracker API
+    '''
+    __slots__ = ('group_index', 'liberty_cache', 'compact_groups', 'geometry')
+
+    @classmethod
+    def from_board(cls, board, geometry=None):
+        lib_tracker = LibertyTracker.from_board(board, geometry)
+        group_index = array('h', bytes(2 * len(board)))
+        compact_groups = {}
+        for group in lib_tracker.groups.values():
+            group_id = min(group.stones) + 1
+            for fs in group.stones:
+                group_index[fs] = group_id
+            compact_groups[group_id] = CompactGroup(
+                sum(1 << fs for fs in group.stones), sum(1 << fr for fr in group.liberties), group.color)
+        return cls(group_index, compact_groups, bytearray(lib_tracker.liberty_cache), lib_tracker.geometry)
+
+    def __init__(self, group_index, compact_groups, liberty_cache, geometry):
+        self.group_index = group_index
+        self.compact_groups = compact_groups
+        self.liberty_cache = liberty_cache
+        self.geometry = geometry
+
+    @property
+    def groups(self):
+        return GroupsView(self.compact_groups)
+
+    def get_liberties(self):
+        return self.liberty_cache
+
+    def add_stone(self, color, fc):
+        new_lib_tracker = CompactLibertyTracker(
+            self.group_index[:], self.compact_groups.copy(), self.liberty_cache[:], self.geometry)
+        captured_stones = new_lib_tracker._add_stone(color, fc)
+        return new_lib_tracker, captured_stones
+
+    def _add_stone(self, color, fc):
+        assert self.group_index[fc] == 0
+        group_index, compact_groups, liberty_cache = self.group_index, self.compact_groups, self.liberty_cache
+        neighbors = self.geometry.neighbors
+        liberties = 0
+        friendly_group_ids = set()
+        opponent_group_ids = set()
+        for fn in neighbors[fc]:
+            neighbor_group_id = group_index[fn]
+            if not neighbor_group_id:
+                liberties |= 1 << fn
+            elif compact_groups[neighbor_group_id].color == color:
+                friendly_group_ids.add(neighbor_group_id)
+            else:
+                opponent_group_ids.add(neighbor_group_id)
+
+        # The merged group keeps the id of the biggest group it absorbs, so
+        # only the stones of the others need to be reindexed
+        stones = reindexed = 1 << fc
+        group_id = fc + 1
+        if friendly_group_ids:
+            group_id = max(friendly_group_ids, key=lambda friendly_id: compact_groups[friendly_id].stones.bit_count())
+            for friendly_group_id in friendly_group_ids:
+                friendly_group = compact_groups.pop(friendly_group_id)
+                stones |= friendly_group.stones
+                liberties |= friendly_group.liberties
+                if friendly_group_id != group_id:
+                    reindexed |= friendly_group.stones
+        for fs in iter_points(reindexed):
+            group_index[fs] = group_id
+        self._set_group(group_id, stones, liberties & ~(1 << fc), color)
+
+        captured_stones = 0
+        for group_id in opponent_group_ids:
+            stones, liberties, opp_color = compact_groups[group_id]
+            liberties &= ~(1 << fc)
+            if liberties:
+                self._set_group(group_id, stones, liberties, opp_color)
+            else:
+                del compact_groups[group_id]
+                captured_stones |= stones
+                for fs in iter_points(stones):
+                    group_index[fs] = 0
+                    liberty_cache[fs] = 0
+
+        self._handle_captures(captured_stones)
+        return set(iter_points(captured_stones))
+
+    def _set_group(self, group_id, stones, liberties, color):
+        self.compact_groups[group_id] = CompactGroup(stones, liberties, color)
+        num_libs = liberties.bit_count()
+        liberty_cache = self.liberty_cache
+        for fs in iter_points(stones):
+            liberty_cache[fs] = num_libs
+
+    def _handle_captures(self, captured_stones):
+        group_index = self.group_index
+        neighbors = self.geometry.neighbors
+        new_liberties = {}
+        for fs in iter_points(captured_stones):
+            for fn in neighbors[fs]:
+                group_id = group_index[fn]
+                if group_id:
+                    new_liberties[group_id] = new_liberties.get(group_id, 0) | 1 << fs
+        for group_id, liberties in new_liberties.items():
+            group = self.compact_groups[group_id]
+            self._set_group(group_id, group.stones, group.liberties | liberties, group.color)
+
+
+def is_koish(board, fc, neighbors=NEIGHBORS):
     'Check if fc is surrounded on all sides by 1 color, and return that color'
     if board[fc] != EMPTY: return None
-    neighbor_colors = {board[fn] for fn in NEIGHBORS[fc]}
+    neighbor_colors = {board[fn] for fn in neighbors[fc]}
     if len(neighbor_colors) == 1 and not EMPTY in neighbor_colors:
         return list(neighbor_colors)[0]
     else:
         return None
 
-class Position(namedtuple('Position', ['board', 'ko', 'liberty_tracker'])):
+def touched_points(liberty_tracker, fc, captured_stones):
+    '''
+    Points whose legality may have changed after a stone was played at fc:
+    fc, the captured stones, and the liberties of every group that gained or
+    lost a liberty.
+    '''
+    group_index = liberty_tracker.group_index
+    neighbors = liberty_tracker.geometry.neighbors
+    points = set(captured_stones)
+    points.add(fc)
+    group_ids = {group_index[fc]}
+    group_ids.update(group_index[fn] for fn in neighbors[fc])
+    for fs in captured_stones:
+        group_ids.update(group_index[fn] for fn in neighbors[fs])
+    # Empty points have a group id of None, or 0 in a CompactLibertyTracker
+    group_ids.discard(None)
+    group_ids.discard(0)
+    for group_id in group_ids:
+        points.update(liberty_tracker.groups[group_id].liberties)
+    return points
+
+class Position(namedtuple('Position', ['board', 'ko', 'liberty_tracker', 'zobrist', 'history', 'geometry'])):
+    '''
+    zobrist: Zobrist hash of board. Computed from the board if not given.
+    history: None, or a frozenset of the Zobrist hashes of every position seen
+        so far, in which case moves that repeat a position are rejected
+        (positional superko). Each position returned by play_move gets its own
+        history, extended with its hash.
+    geometry: the Geometry for the size of board. Taken from liberty_tracker
+        if not given.
+    '''
+    # legal_moves_cache: None, or a dict of color to bitmask of legal points, kept up
+    # to date incrementally by play_move once legal_moves() has been called.
+    legal_moves_cache = None
+    # territory_cache: None, or the Territory of board, kept up to date
+    # incrementally by play_move once score() has been called.
+    territory_cache = None
+    # symmetry_cache: None, or a tuple of the Zobrist hash of the board under each
+    # of the 8 symmetries, kept up to date incrementally by play_move once
+    # go_symmetry.symmetry_hashes() has been called.
+    symmetry_cache = None
+    # captures: the number of stones captured by the move that led to this
+    # position, set by play_move.
+    captures = 0
+
+    def __new__(cls, board, ko, liberty_tracker, zobrist=None, history=None, geometry=None):
+        if zobrist is None:
+            zobrist = zobrist_hash(board)
+        if geometry is None:
+            geometry = liberty_tracker.geometry
+        return super().__new__(cls, board, ko, liberty_tracker, zobrist, history, geometry)
+
+    @staticmethod
+    def initial_state(superko=False, persistent=False, size=N, compact=False):
+        if compact:
+            tracker_class = CompactLibertyTracker
+        else:
+            tracker_class = PersistentLibertyTracker if persistent else LibertyTracker
+        geometry = get_geometry(size)
+        return Position(board=geometry.empty_board, ko=None,
+                        liberty_tracker=tracker_class.from_board(geometry.empty_board, geometry),
+                        zobrist=0, history=frozenset([0]) if superko else None, geometry=geometry)
+
     @staticmethod
-    def initial_state():
-        return Position(board=EMPTY_BOARD, ko=None, liberty_tracker=LibertyTracker.from_board(EMPTY_BOARD))
+    def from_bytes(data, superko=False, persistent=False, compact=False):
+        '''
+        Return the Position serialized by to_bytes, with its LibertyTracker
+        rebuilt from the board, and the color to play
+        '''
+        if compact:
+            tracker_class = CompactLibertyTracker
+        else:
+            tracker_class = PersistentLibertyTracker if persistent else LibertyTracker
+        board, ko, to_play, n = decode_position(data)
+        zobrist = zobrist_hash(board)
+        geometry = get_geometry(n)
+        return Position(board, ko, tracker_class.from_board(board, geometry), zobrist,
+                        frozenset([zobrist]) if superko else None, geometry), to_play
+
+    def to_bytes(self, to_play):
+        'Serialize the position with to_play to move, in the format of go_serialize'
+        return encode_position(self.board, self.ko, to_play, self.geometry.n)
 
     def get_board(self):
         return self.board
 
     def __str__(self):
         import textwrap
-        return '\n'.join(textwrap.wrap(self.board, N))
+        return '\n'.join(textwrap.wrap(self.board, self.geometry.n))
 
     def play_move(self, fc, color):
-        board, ko, liberty_tracker = self
+        board, ko, liberty_tracker, zobrist, history, geometry = self
 
         if fc == ko:
             raise IllegalMove("%s\n Move at %s illegally retakes ko." % (self, fc))
@@ -244,7 +728,7 @@ class Position(namedtuple('Position', ['board', 'ko', 'liberty_tracker'])):
         if board[fc] != EMPTY:
             raise IllegalMove("%s\n Stone exists at %s." % (self, fc))
 
-        possible_ko_color = is_koish(board, fc)
+        possible_ko_color = is_koish(board, fc, geometry.neighbors)
         new_board = place_stone(color, board, fc)
         new_liberty_tracker, captured_stones = liberty_tracker.add_stone(color, fc)
         if new_liberty_tracker.get_liberties()[fc] == 0:
@@ -254,26 +738,65 @@ class Position(namedtuple('Position', ['board', 'ko', 'liberty_tracker'])):
 
         opp_color = swap_colors(color)
 
+        new_zobrist = zobrist ^ geometry.zobrist[color][fc]
+        opp_keys = geometry.zobrist[opp_color]
+        for fs in captured_stones:
+            new_zobrist ^= opp_keys[fs]
+
+        if history is not None:
+            if new_zobrist in history:
+                raise IllegalMove("\n%s\n Move at %s repeats a previous position." % (self, fc))
+            history = history | {new_zobrist}
+
         if len(captured_stones) == 1 and possible_ko_color == opp_color:
             new_ko = list(captured_stones)[0]
         else:
             new_ko = None
 
-        return Position(new_board, new_ko, new_liberty_tracker)
+        new_position = Position(new_board, new_ko, new_liberty_tracker, new_zobrist, history, geometry)
+        if captured_stones:
+            new_position.captures = len(captured_stones)
+        if self.legal_moves_cache is not None:
+            points = touched_points(new_liberty_tracker, fc, captured_stones)
+            points.update(fp for fp in (ko, new_ko) if fp is not None)
+            new_position.legal_moves_cache = update_legal_moves(
+                self.legal_moves_cache, new_board, new_ko, points, geometry.neighbors, new_liberty_tracker.liberty_cache)
+        if self.territory_cache is not None:
+            new_position.territory_cache = update_territory(
+                self.territory_cache, new_board, fc, captured_stones, geometry.neighbors)
+        if self.symmetry_cache is not None:
+            new_position.symmetry_cache = update_symmetry_hashes(
+                self.symmetry_cache, geometry.n, color, fc, opp_color, captured_stones)
+        return new_position
+
+    def pass_move(self):
+        'Pass, which leaves the board as is and clears the ko'
+        new_position = self._replace(ko=None)
+        if self.legal_moves_cache is not None and self.ko is not None:
+            new_position.legal_moves_cache = update_legal_moves(
+                self.legal_moves_cache, self.board, None, [self.ko], self.geometry.neighbors,
+                self.liberty_tracker.liberty_cache)
+        else:
+            new_position.legal_moves_cache = self.legal_moves_cache
+        new_position.territory_cache = self.territory_cache
+        new_position.symmetry_cache = self.symmetry_cache
+        return new_position
+
+    def legal_moves(self, color):
+        '''
+        Return a bitmask of the points where color may play, with bit fc set if
+        fc is legal. Positional superko is not taken into account.
+        '''
+        if self.legal_moves_cache is None:
+            self.legal_moves_cache = update_legal_moves(
+                {BLACK: 0, WHITE: 0}, self.board, self.ko, range(self.geometry.nn), self.geometry.neighbors,
+                self.liberty_tracker.liberty_cache)
+        return self.legal_moves_cache[color]
 
     def score(self):
-        board = self.board
-        while EMPTY in board:
-            fempty = board.index(EMPTY)
-            empties, borders = find_reached(board, fempty)
-            possible_border_color = board[list(borders)[0]]
-            if all(board[fb] == possible_border_color for fb in borders):
-                board = bulk_place_stones(possible_border_color, board, empties)
-            else:
-                # if an empty intersection reaches both white and black,
-                # then it belongs to neither player. 
-                board = bulk_place_stones('?', board, empties)
-        return board.count(BLACK) - board.count(WHITE)
+        if self.territory_cache is None:
+            self.territory_cache = territory_from_board(self.board, self.geometry.neighbors)
+        return self.territory_cache.score
 
     def get_liberties(self):
         return self.liberty_tracker.get_liberties()
@@ -0,0 +1,208 @@
+'''
+A streaming SGF reader. Games are parsed token by token from files read in
+chunks, so arbitrarily large collections can be replayed in constant memory.
+
+Only the main line of each game is followed; other variations are skipped.
+Each game is yielded as (setup, moves, result):
+    setup: a list of (fc, color) for the AB/AW stones of the root node(s),
+        which includes handicap stones
+    moves: a list of (fc, color), where fc is None for a pass
+    result: the RE property, or None if missing
+'''
+import io
+import os
+import re
+N = 19
+WHITE, BLACK = 'O', 'X'
+CHUNK_SIZE = 1 << 16
+
+class SGFError(ValueError): pass
+
+# A token is one of ( ) ; a property identifier, or a bracketed property
+# value, in which \ escapes the next character (notably ]).
+TOKEN = re.compile(r'\s*(?:([();])|([A-Za-z]+)|\[((?:[^\\\]]|\\.)*)\])', re.S)
+ESCAPE = re.compile(r'\\(.)', re.S)
+
+def tokenize(stream, chunk_size=CHUNK_SIZE):
+    '''
+    Yield ('(' | ')' | ';' | 'id' | 'value', text) tokens from a text stream,
+    reading it chunk_size characters at a time.
+    '''
+    buffer = ''
+    pos = 0
+    at_eof = False
+    while True:
+        match = TOKEN.match(buffer, pos)
+        # A match that runs into the end of the buffer may be cut short
+        # (a property identifier or a value whose ] hasn't been read yet)
+        if (match is None or match.end() == len(buffer)) and not at_eof:
+            chunk = stream.read(chunk_size)
+            at_eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        if match is None:
+            if buffer[pos:].strip():
+                raise SGFError("Unexpected text %r" % buffer[pos:pos + 20])
+            return
+        pos = match.end()
+        punctuation, identifier, value = match.groups()
+        if punctuation:
+            yield punctuation, punctuation
+        elif identifier:
+            # FF[3] allows lower case letters in identifiers, e.g. AddBlack
+            yield 'id', ''.join(c for c in identifier if c.isupper())
+        else:
+            yield 'value', ESCAPE.sub(r'\1', value)
+
+def parse_point(value, size=N):
+    'Convert an SGF point like "pd" to a flat coordinate, or None for a pass'
+    if value == '' or (value == 'tt' and size <= 19):
+        return None
+    if len(value) != 2:
+        raise SGFError("Bad point %r" % value)
+    col, row = ord(value[0]) - ord('a'), ord(value[1]) - ord('a')
+    if not (0 <= row < size and 0 <= col < size):
+        raise SGFError("Point %r is off the board" % value)
+    return size * row + col
+
+def parse_points(value, size=N):
+    'Expand an SGF point or compressed rectangle of points, like "aa:cc"'
+    if ':' not in value:
+        return [parse_point(value, size)]
+    corner1, corner2 = value.split(':')
+    row1, col1 = divmod(parse_point(corner1, size), size)
+    row2, col2 = divmod(parse_point(corner2, size), size)
+    return [size * row + col
+            for row in range(min(row1, row2), max(row1, row2) + 1)
+            for col in range(min(col1, col2), max(col1, col2) + 1)]
+
+class GameBuilder():
+    'Collects the main line properties of one game'
+    def __init__(self, size):
+        self.size = size
+        self.setup = []
+        self.moves = []
+        self.result = None
+
+    def add_property(self, identifier, values):
+        if identifier in ('B', 'W'):
+            color = BLACK if identifier == 'B' else WHITE
+            self.moves.append((parse_point(values[0], self.size), color))
+        elif identifier in ('AB', 'AW'):
+            if self.moves:
+                raise SGFError("Setup stones after the first move are not supported")
+            color = BLACK if identifier == 'AB' else WHITE
+            for value in values:
+                self.setup.extend((fc, color) for fc in parse_points(value, self.size))
+        elif identifier == 'AE':
+            raise SGFError("Removing stones (AE) is not supported")
+        elif identifier == 'SZ':
+            if values[0].strip() != str(self.size):
+                raise SGFError("Board size %s is not supported" % values[0])
+        elif identifier == 'RE':
+            self.result = values[0]
+
+    def build(self):
+        return self.setup, self.moves, self.result
+
+def parse_games(stream, size=N, skipped=None):
+    '''
+    Yield (setup, moves, result) for each game in an SGF text stream.
+
+    Games that can't be replayed (a different board size, stones removed
+    mid-game, malformed points) raise SGFError, unless skipped is a list,
+    in which case the error is appended to it and the game is skipped.
+    '''
+    depth = 0
+    # on_main_line[d]: whether the variation open at depth d is on the main
+    # line, i.e. it is the first child of a variation on the main line.
+    on_main_line = []
+    has_child = []
+    game = error = None
+    identifier = None
+    values = []
+
+    def flush_property():
+        nonlocal error
+        if identifier is not None and error is None and on_main_line[-1]:
+            try:
+                game.add_property(identifier, values)
+            except SGFError as e:
+                error = e
+
+    for kind, text in tokenize(stream):
+        if kind == 'value':
+            if identifier is None:
+                raise SGFError("Property value without an identifier")
+            values.append(text)
+            continue
+        flush_property()
+        identifier, values = None, []
+        if kind == 'id':
+            identifier = text
+        elif kind == '(':
+            if depth == 0:
+                game, error = GameBuilder(size), None
+                on_main_line, has_child = [True], [False]
+            else:
+                on_main_line.append(on_main_line[-1] and not has_child[-1])
+                has_child[-1] = True
+                has_child.append(False)
+            depth += 1
+        elif kind == ')':
+            if depth == 0:
+                raise SGFError("Unbalanced )")
+            depth -= 1
+            on_main_line.pop()
+            has_child.pop()
+            if depth == 0:
+                if error is None:
+                    yield game.build()
+                elif skipped is not None:
+                    skipped.append(error)
+                else:
+                    raise error
+    if depth:
+        raise SGFError("Unexpected end of file inside a game")
+
+def parse_string(text, size=N, skipped=None):
+    return parse_games(io.StringIO(text), size=size, skipped=skipped)
+
+def iter_sgf_paths(paths):
+    'Yield the SGF files named by paths, walking any directories in sorted order'
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.lower().endswith('.sgf'):
+                        yield os.path.join(dirpath, filename)
+        else:
+            yield path
+
+def iter_games(paths, size=N, skipped=None):
+    '''
+    Lazily yield (setup, moves, result) for every game in the given .sgf files
+    and directories.
+    '''
+    for path in iter_sgf_paths(paths):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            yield from parse_games(f, size=size, skipped=skipped)
+
+def replay(initial_state, setup, moves):
+    '''
+    Play a game through any backend's Position, returning the final position.
+    Setup stones are played as moves, followed by a pass to clear any ko.
+    '''
+    pos = initial_state()
+    if setup:
+        for fc, color in setup:
+            pos = pos.play_move(fc, color)
+        pos = pos.pass_move()
+    for fc, color in moves:
+        if fc is None:
+            pos = pos.pass_move()
+        else:
+            pos = pos.play_move(fc, color)
+    return pos
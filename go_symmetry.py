@@ -0,0 +1,148 @@
+'''
+The 8 symmetries of the board (rotations and reflections), for recognizing
+positions that are the same up to symmetry: in opening books, when
+deduplicating training data, or as transposition table keys.
+
+Symmetries act on flat coordinates through precomputed permutation tables:
+symmetry s takes the point fc to permutations[s][fc]. The hash of a board
+under symmetry s is the Zobrist hash of the board transformed by s, and the
+canonical hash of a position is the least of its 8 hashes. Positions keep the
+8 hashes in their symmetry_cache once symmetry_hashes() has been called on
+them, so that canonicalizing later positions doesn't need a pass over the
+board.
+'''
+import functools
+from array import array
+from go_geometry import get_geometry
+WHITE, BLACK, EMPTY = 'O', 'X', '.'
+
+# Each symmetry as a function of (row, column, n - 1)
+TRANSFORMS = (
+    lambda x, y, m: (x, y),          # identity
+    lambda x, y, m: (y, m - x),      # rotate 90 degrees
+    lambda x, y, m: (m - x, m - y),  # rotate 180 degrees
+    lambda x, y, m: (m - y, x),      # rotate 270 degrees
+    lambda x, y, m: (x, m - y),      # reflect left to right
+    lambda x, y, m: (y, x),          # reflect in the main diagonal
+    lambda x, y, m: (m - x, y),      # reflect top to bottom
+    lambda x, y, m: (m - y, m - x),  # reflect in the other diagonal
+)
+NUM_SYMMETRIES = len(TRANSFORMS)
+IDENTITY = 0
+
+class SymmetryTables():
+    '''
+    Everything about the symmetries that depends only on the size of the board.
+
+    permutations: for each symmetry s, an array('h') of the point fc is taken
+        to by s
+    inverses: for each symmetry, the symmetry that undoes it
+    zobrist: for each symmetry s, a dict of color to the keys hashing the board
+        transformed by s: zobrist[s][color][fc] is the Zobrist key of color at
+        permutations[s][fc]. Keyed by both 'X'/'O' and their byte values, like
+        Geometry.zobrist.
+    '''
+    __slots__ = ('geometry', 'permutations', 'inverses', 'zobrist')
+
+    def __init__(self, geometry):
+        self.geometry = geometry
+        n, m = geometry.n, geometry.n - 1
+        self.permutations = [
+            array('h', (geometry.flatten(transform(x, y, m)) for x, y in map(geometry.unflatten, range(geometry.nn))))
+            for transform in TRANSFORMS]
+        self.inverses = [
+            next(t for t in range(NUM_SYMMETRIES) if all(self.permutations[t][fp] == fc for fc, fp in enumerate(permutation)))
+            for permutation in self.permutations]
+        self.zobrist = []
+        for permutation in self.permutations:
+            keys = {}
+            for color in (WHITE, BLACK):
+                color_keys = geometry.zobrist[color]
+                keys[color] = keys[ord(color)] = [color_keys[fp] for fp in permutation]
+            self.zobrist.append(keys)
+
+@functools.lru_cache(maxsize=None)
+def get_tables(n):
+    return SymmetryTables(get_geometry(n))
+
+def transform_move(fc, symmetry, n=19):
+    'The point fc is taken to by symmetry'
+    return get_tables(n).permutations[symmetry][fc]
+
+def inverse(symmetry, n=19):
+    'The symmetry that undoes symmetry'
+    return get_tables(n).inverses[symmetry]
+
+def transform_board(board, symmetry):
+    'Return the board string transformed by symmetry'
+    tables = get_tables(int(round(len(board) ** 0.5)))
+    source = tables.permutations[tables.inverses[symmetry]]
+    return ''.join([board[fp] for fp in source])
+
+def hashes_from_board(board, n):
+    'Return a tuple of the hash of the board string under each symmetry'
+    hashes = []
+    stones = [(color, fc) for fc, color in enumerate(board) if color != EMPTY]
+    for keys in get_tables(n).zobrist:
+        h = 0
+        for color, fc in stones:
+            h ^= keys[color][fc]
+        hashes.append(h)
+    return tuple(hashes)
+
+def update_symmetry_hashes(hashes, n, color, fc, opp_color, captured):
+    '''
+    Return the hashes under each symmetry after a stone of color is played at
+    fc, capturing the opp_color stones in captured. Used by play_move to keep
+    symmetry_cache up to date.
+    '''
+    new_hashes = []
+    for h, keys in zip(hashes, get_tables(n).zobrist):
+        h ^= keys[color][fc]
+        opp_keys = keys[opp_color]
+        for fs in captured:
+            h ^= opp_keys[fs]
+        new_hashes.append(h)
+    return tuple(new_hashes)
+
+def symmetry_hashes(position):
+    '''
+    Return a tuple of the hash of the board of position, of any backend, under
+    each symmetry. The hash under IDENTITY is position.zobrist. Computed from
+    the board the first time, after which play_move keeps the hashes of the
+    positions it returns up to date.
+    '''
+    if position.symmetry_cache is None:
+        position.symmetry_cache = hashes_from_board(position.get_board(), position.geometry.n)
+    return position.symmetry_cache
+
+def canonical_symmetry(position):
+    'The symmetry taking position to its canonical form'
+    hashes = symmetry_hashes(position)
+    return hashes.index(min(hashes))
+
+def canonical_hash(position):
+    'A hash of position that is the same for all its symmetries'
+    return min(symmetry_hashes(position))
+
+def canonical_key(position, color):
+    '''
+    Like go_transposition.position_key, but the same for all the symmetries
+    of position: combines the canonical hash with keys for the ko point and
+    the side to move.
+    '''
+    geometry = position.geometry
+    hashes = symmetry_hashes(position)
+    ko = position.ko
+    if ko is not None:
+        zobrist_ko, permutations = geometry.zobrist_ko, get_tables(geometry.n).permutations
+        hashes = [h ^ zobrist_ko[permutations[s][ko]] for s, h in enumerate(hashes)]
+    key = min(hashes)
+    if color == BLACK:
+        key ^= geometry.zobrist_black_to_play
+    return key
+
+def canonical_board(position):
+    'Return the board string of position in its canonical form, and the symmetry taking it there'
+    symmetry = canonical_symmetry(position)
+    return transform_board(position.get_board(), symmetry), symmetry
@@ -0,0 +1,129 @@
+'''
+A fixed-size transposition table, for caching results computed for a
+position (its score, liberties, legal moves, a search evaluation...) so that
+a search reaching the same position through another move order can reuse them.
+'''
+from array import array
+BLACK = 'X'
+
+def position_key(position, color):
+    '''
+    Hash position with color to play: its Zobrist hash, combined with keys for
+    the ko point and the side to move. Works with any backend.
+    '''
+    geometry = position.geometry
+    key = position.zobrist
+    if position.ko is not None:
+        key ^= geometry.zobrist_ko[position.ko]
+    if color == BLACK:
+        key ^= geometry.zobrist_black_to_play
+    return key
+
+class TranspositionTable():
+    '''
+    A hash table of 64-bit keys to values, with a fixed number of slots that
+    are allocated up front and evicted from when full.
+
+    Open addressing: a key may be stored in any of the window slots starting
+    at key & mask. Slots are never emptied, only reused, so a lookup can stop
+    at the first empty slot of the window.
+
+    Eviction is by clock (second chance): a hit sets the slot's referenced
+    bit, and a put into a full window takes the first slot without the bit,
+    clearing the bits it passes over. The clock hand advances on every
+    eviction, so that the search starts at a different slot each time.
+
+    keys: an array('Q') of the key in each slot
+    values: a list of the value in each slot
+    occupied: a bytearray marking the slots that have been stored in
+    referenced: a bytearray of the referenced bit of each slot
+    hits, misses, evictions: counters for get() and put()
+    '''
+    __slots__ = ('keys', 'values', 'occupied', 'referenced', 'mask', 'window', 'hand', 'size', 'hits', 'misses', 'evictions')
+
+    def __init__(self, capacity=1 << 16, window=8):
+        # Round capacity up to a power of two, so slots can be found by masking
+        num_slots = 1 << max(capacity - 1, 1).bit_length()
+        self.keys = array('Q', bytes(8 * num_slots))
+        self.values = [None] * num_slots
+        self.occupied = bytearray(num_slots)
+        self.referenced = bytearray(num_slots)
+        self.mask = num_slots - 1
+        self.window = min(window, num_slots)
+        self.hand = 0
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return self.size
+
+    def capacity(self):
+        return len(self.keys)
+
+    def get(self, key, default=None):
+        'Return the value stored for key, or default'
+        keys, occupied, mask = self.keys, self.occupied, self.mask
+        for i in range(self.window):
+            index = (key + i) & mask
+            if not occupied[index]:
+                break
+            if keys[index] == key:
+                self.referenced[index] = 1
+                self.hits += 1
+                return self.values[index]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        'Store value for key, evicting another entry if its window is full'
+        keys, occupied, mask, window = self.keys, self.occupied, self.mask, self.window
+        for i in range(window):
+            index = (key + i) & mask
+            if not occupied[index]:
+                keys[index] = key
+                occupied[index] = 1
+                self.values[index] = value
+                self.size += 1
+                return
+            if keys[index] == key:
+                self.values[index] = value
+                return
+
+        referenced = self.referenced
+        hand = self.hand
+        self.hand += 1
+        # Two sweeps at most: the first may clear every referenced bit
+        for i in range(2 * window):
+            index = (key + (hand + i) % window) & mask
+            if not referenced[index]:
+                break
+            referenced[index] = 0
+        keys[index] = key
+        self.values[index] = value
+        self.evictions += 1
+
+    def lookup(self, position, color, compute):
+        '''
+        Return the value cached for position with color to play, calling
+        compute(position, color) and caching its result on a miss. compute
+        shouldn't return None, which can't be told apart from a miss.
+        '''
+        key = position_key(position, color)
+        value = self.get(key)
+        if value is None:
+            value = compute(position, color)
+            self.put(key, value)
+        return value
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
+
+    def clear(self):
+        self.keys = array('Q', bytes(8 * len(self.keys)))
+        self.values = [None] * len(self.keys)
+        self.occupied = bytearray(len(self.keys))
+        self.referenced = bytearray(len(self.keys))
+        self.hand = 0
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
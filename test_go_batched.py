@@ -0,0 +1,112 @@
+import random
+import re
+import unittest
+import numpy as np
+import go_naive
+import go_mutable
+import go_sets
+import go_bitboard
+from go_batched import PositionBatch, PASS
+
+def load_board(string):
+    return re.sub(r'[^XO\.]+', '', string)
+
+def make_batch(boards, ko=None):
+    'A PositionBatch of board strings, with ko points (None for none)'
+    ko = [-1 if fk is None else fk for fk in (ko or [None] * len(boards))]
+    array = np.frombuffer(''.join(boards).encode('ascii'), dtype=np.int8).reshape(len(boards), -1).copy()
+    return PositionBatch(array, np.array(ko, dtype=np.intp))
+
+# Black at 1 captures the white stones at 0 and 2, which aren't connected
+TWO_CHAINS = load_board('''
+    O.OX.
+    X.X..
+    .....
+    .....
+    .....
+''')
+# Black at 7 captures the white stone at 6, leaving a ko there
+KO = load_board('''
+    .XO..
+    XO.O.
+    .XO..
+    .....
+    .....
+''')
+# Black at 0 has no liberties and captures nothing
+SUICIDE = load_board('''
+    .O...
+    O....
+    .....
+    .....
+    .....
+''')
+
+class TestPositionBatch(unittest.TestCase):
+    def test_captures_several_chains(self):
+        batch = make_batch([TWO_CHAINS])
+        self.assertEqual(list(batch.play_moves([1], 'X')), [True])
+        self.assertEqual(batch.get_board(0), load_board('''
+            .X.X.
+            X.X..
+            .....
+            .....
+            .....
+        '''))
+        self.assertEqual(list(batch.ko), [-1])
+
+    def test_suicide(self):
+        batch = make_batch([SUICIDE])
+        self.assertEqual(list(batch.play_moves([0], 'X')), [False])
+        self.assertEqual(batch.get_board(0), SUICIDE)
+        # Not suicide for white
+        self.assertEqual(list(batch.play_moves([0], 'O')), [True])
+
+    def test_ko(self):
+        batch = make_batch([KO])
+        self.assertEqual(list(batch.play_moves([7], 'X')), [True])
+        self.assertEqual(list(batch.ko), [6])
+        self.assertEqual(list(batch.play_moves([6], 'O')), [False])
+        self.assertEqual(batch.get_board(0)[5:10], 'X.XO.')
+        # A pass clears the ko, after which it can be retaken
+        self.assertEqual(list(batch.play_moves([PASS], 'O')), [True])
+        self.assertEqual(list(batch.ko), [-1])
+        self.assertEqual(list(batch.play_moves([6], 'O')), [True])
+        self.assertEqual(batch.get_board(0)[5:10], 'XO.O.')
+        self.assertEqual(list(batch.ko), [7])
+
+    def test_illegal_rows_unchanged(self):
+        boards = [TWO_CHAINS, KO, SUICIDE, KO]
+        batch = make_batch(boards, ko=[None, 7, None, None])
+        # An occupied point, the ko point, suicide, and a legal capture
+        played = batch.play_moves([0, 7, 0, 7], 'X')
+        self.assertEqual(list(played), [False, False, False, True])
+        for row in range(3):
+            self.assertEqual(batch.get_board(row), boards[row])
+        self.assertEqual(list(batch.ko), [-1, 7, -1, 6])
+        self.assertEqual(batch.get_board(3)[5:10], 'X.XO.')
+
+    def test_liberties_match_backends(self):
+        # Positions along a random game on a 9x9 board
+        rng = random.Random(1)
+        position = go_naive.Position.initial_state(size=9)
+        moves = []
+        boards = []
+        for color in 'XO' * 40:
+            legal = position.legal_moves(color)
+            points = [fc for fc in range(81) if legal >> fc & 1]
+            moves.append(rng.choice(points))
+            position = position.play_move(moves[-1], color)
+            if len(moves) % 10 == 0:
+                boards.append(position.board)
+        batch_liberties = make_batch(boards).get_liberties()
+        for module in (go_naive, go_mutable, go_sets, go_bitboard):
+            position = module.Position.initial_state(size=9)
+            for i, (fc, color) in enumerate(zip(moves, 'XO' * 40)):
+                position = position.play_move(fc, color)
+                if (i + 1) % 10 == 0:
+                    self.assertEqual(list(batch_liberties[i // 10]), list(position.get_liberties()),
+                                     module.__name__)
+
+if __name__ == '__main__':
+    unittest.main()
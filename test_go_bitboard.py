@@ -0,0 +1,103 @@
+import random
+import re
+import unittest
+import go_naive
+from go_geometry import get_geometry
+from go_bitboard import Position, IllegalMove, adjacent, find_chain, liberties_from_board, BLACK, WHITE
+
+def load_board(string):
+    return re.sub(r'[^XO\.]+', '', string)
+
+def from_board(board, ko=None):
+    'A Position of a board string'
+    geometry = get_geometry(int(round(len(board) ** 0.5)))
+    black = sum(1 << fc for fc, color in enumerate(board) if color == BLACK)
+    white = sum(1 << fc for fc, color in enumerate(board) if color == WHITE)
+    return Position(black, white, ko, go_naive.zobrist_hash(board), None, geometry)
+
+# Each black stone at the end of a row is next to the one at the start of the
+# next row in flat coordinates, but not on the board
+EDGES = load_board('''
+    ....X
+    X...X
+    X....
+    ....X
+    X....
+''')
+
+class TestBitboard(unittest.TestCase):
+    def test_adjacent_edges(self):
+        geometry = get_geometry(5)
+        self.assertEqual(adjacent(1 << 4, geometry), (1 << 3) | (1 << 9))
+        self.assertEqual(adjacent(1 << 5, geometry), (1 << 0) | (1 << 6) | (1 << 10))
+        self.assertEqual(adjacent(1 << 24, geometry), (1 << 19) | (1 << 23))
+
+    def test_chains_dont_wrap(self):
+        position = from_board(EDGES)
+        geometry = position.geometry
+        self.assertEqual(find_chain(position.black, 1 << 4, geometry), (1 << 4) | (1 << 9))
+        self.assertEqual(find_chain(position.black, 1 << 5, geometry), (1 << 5) | (1 << 10))
+        self.assertEqual(find_chain(position.black, 1 << 19, geometry), 1 << 19)
+        self.assertEqual(list(position.get_liberties()[:10]), [0, 0, 0, 0, 3, 4, 0, 0, 0, 3])
+        # Joining across the edge takes a stone in between
+        position = position.play_move(14, BLACK)
+        self.assertEqual(find_chain(position.black, 1 << 4, geometry), sum(1 << fc for fc in (4, 9, 14, 19)))
+        self.assertEqual(position.get_liberties()[4], 5)
+
+    def test_capture(self):
+        position = from_board(load_board('''
+            OX...
+            .....
+            .....
+            .....
+            ...OX
+        '''))
+        position = position.play_move(19, WHITE)
+        self.assertEqual(position.get_board()[15:], '....O' + '...O.')
+        position = position.play_move(5, BLACK)
+        self.assertEqual(position.get_board()[:10], '.X...' + 'X....')
+        self.assertIsNone(position.ko)
+        self.assertEqual(position.zobrist, go_naive.zobrist_hash(position.get_board()))
+
+    def test_suicide(self):
+        position = from_board(load_board('''
+            .O...
+            O....
+            .....
+            .....
+            .....
+        '''))
+        with self.assertRaises(IllegalMove):
+            position.play_move(0, BLACK)
+        self.assertEqual(position.play_move(0, WHITE).white.bit_count(), 3)
+
+    def test_ko(self):
+        position = from_board(load_board('''
+            .XO..
+            XO.O.
+            .XO..
+            .....
+            .....
+        '''))
+        position = position.play_move(7, BLACK)
+        self.assertEqual(position.ko, 6)
+        with self.assertRaises(IllegalMove):
+            position.play_move(6, WHITE)
+        position = position.pass_move()
+        self.assertIsNone(position.ko)
+        position = position.play_move(6, WHITE)
+        self.assertEqual(position.ko, 7)
+
+    def test_liberties_cache(self):
+        rng = random.Random(0)
+        position = Position.initial_state(size=9)
+        position.get_liberties()
+        for color in 'XO' * 60:
+            legal = position.legal_moves(color)
+            points = [fc for fc in range(81) if legal >> fc & 1]
+            position = position.play_move(rng.choice(points), color)
+            self.assertEqual(position.liberties_cache,
+                             liberties_from_board(position.black, position.white, position.geometry))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import itertools
+import os
+import tempfile
+import unittest
+import go_naive
+import go_sets
+from go_benchmark import moves
+from go_dataset import DatasetWriter, PositionDataset, unpack_points
+
+class TestDataset(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        self.positions = []
+        position = go_naive.Position.initial_state()
+        for move, color in zip(moves[:50], itertools.cycle('XO')):
+            position = position.play_move(move, color)
+            self.positions.append((position, 'O' if color == 'X' else 'X'))
+        with DatasetWriter(self.path) as writer:
+            for position, to_play in self.positions:
+                writer.write(position, to_play)
+        self.assertEqual(writer.count, 50)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_random_access(self):
+        with PositionDataset(self.path, go_sets) as dataset:
+            self.assertEqual(len(dataset), 50)
+            for i in (0, 17, 49, -1):
+                position, to_play = dataset[i]
+                self.assertIsInstance(position, go_sets.Position)
+                self.assertEqual((position.get_board(), to_play),
+                                 (self.positions[i][0].board, self.positions[i][1]))
+            self.assertEqual([to_play for position, to_play in dataset[10:14]], ['O', 'X', 'O', 'X'])
+            with self.assertRaises(IndexError):
+                dataset[50]
+
+    def test_records(self):
+        with PositionDataset(self.path) as dataset:
+            records = dataset.records(10, 20)
+            self.assertEqual(len(records), 10)
+            self.assertEqual(list(records['to_play'][:2]), [1, 0])
+            points = unpack_points(records)
+            self.assertEqual(points.shape, (10, 361))
+            expected = [['.XO'.index(color) for color in position.board] for position, to_play in self.positions[10:20]]
+            self.assertEqual(points.tolist(), expected)
+            self.assertEqual(len(dataset.records(45, 100)), 5)
+            del records, points
+
+    def test_not_a_dataset(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a dataset')
+        with self.assertRaises(ValueError):
+            PositionDataset(self.path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import itertools
+import random
+import unittest
+import numpy as np
+import go_naive
+import go_mutable
+import go_sets
+import go_bitboard
+import go_features
+from go_features import extract_features, allocate, PLANES, NUM_PLANES
+
+BACKENDS = (go_naive, go_mutable, go_sets, go_bitboard)
+
+def random_positions(module, size, num_moves, seed):
+    'Play num_moves random legal moves, returning each position and the color to play there'
+    rng = random.Random(seed)
+    pos = module.Position.initial_state(size=size)
+    positions, colors = [], []
+    for color in itertools.islice(itertools.cycle('XO'), num_moves):
+        legal = pos.legal_moves(color)
+        candidates = [fc for fc in range(size * size) if legal >> fc & 1]
+        pos = pos.play_move(rng.choice(candidates), color)
+        if module is go_mutable:
+            positions.append(go_mutable.Position(pos.board[:], pos.ko, pos.zobrist, geometry=pos.geometry))
+        else:
+            positions.append(pos)
+        colors.append('O' if color == 'X' else 'X')
+    return positions, colors
+
+class TestFeatures(unittest.TestCase):
+    def test_matches_position(self):
+        for module in BACKENDS:
+            positions, colors = random_positions(module, 7, 30, seed=1)
+            out = allocate(40, size=7)
+            out.fill(0xff)
+            features = extract_features(positions, colors, out=out)
+            self.assertEqual(features.shape, (30, NUM_PLANES, 7, 7))
+            for position, color, planes in zip(positions, colors, features.reshape(30, NUM_PLANES, 49)):
+                board = position.get_board()
+                liberties = list(position.get_liberties())
+                for fc in range(49):
+                    expected = {
+                        'black': board[fc] == 'X',
+                        'white': board[fc] == 'O',
+                        'empty': board[fc] == '.',
+                        'liberties_1': liberties[fc] == 1,
+                        'liberties_2': liberties[fc] == 2,
+                        'liberties_3': liberties[fc] == 3,
+                        'liberties_4': liberties[fc] >= 4,
+                        'ko': position.ko == fc,
+                        'legal': position.legal_moves(color) >> fc & 1,
+                        'black_to_play': color == 'X',
+                    }
+                    self.assertEqual([int(expected[plane]) for plane in PLANES], list(planes[:, fc]),
+                                     (module.__name__, fc))
+
+    def test_backends_agree(self):
+        features = [extract_features(*random_positions(module, 9, 60, seed=2)) for module in BACKENDS]
+        for other in features[1:]:
+            np.testing.assert_array_equal(features[0], other)
+
+    def test_ko_plane(self):
+        board = '.XO' + '.' * 16 + 'XO.' + '.' * 16 + '.' * 19 * 17
+        position = go_naive.Position(board, None).play_move(0, 'O')
+        self.assertEqual(position.ko, 1)
+        features = extract_features([position], 'X')[0].reshape(NUM_PLANES, -1)
+        self.assertEqual(list(np.nonzero(features[go_features.KO_PLANE])[0]), [1])
+        self.assertEqual(features[go_features.LEGAL_PLANE, 1], 0)
+        self.assertEqual(features[go_features.EMPTY_PLANE, 1], 1)
+
+if __name__ == '__main__':
+    unittest.main()
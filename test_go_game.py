@@ -0,0 +1,88 @@
+import unittest
+import go_naive
+import go_mutable
+import go_sets
+import go_bitboard
+from go_game import Game, PASS, count_stones
+
+BACKENDS = (go_naive, go_mutable, go_sets, go_bitboard)
+
+class TestGame(unittest.TestCase):
+    def test_passes_end_game(self):
+        for module in BACKENDS:
+            game = Game.new(module, size=5, komi=0.5)
+            game.play(12)
+            game.pass_move()
+            self.assertFalse(game.is_over())
+            game.play(None)
+            self.assertEqual(game.to_play, 'O')
+            self.assertTrue(game.is_over())
+            with self.assertRaises(module.IllegalMove):
+                game.play(0)
+            self.assertEqual(list(game.moves), [12, PASS, PASS])
+            self.assertEqual(game.score(), 24.5)
+            self.assertEqual(game.winner(), 'X')
+
+    def test_prisoners(self):
+        for module in BACKENDS:
+            game = Game.new(module, size=5)
+            # White's stones at 0 and 5 are captured by black at 10
+            for fc in (1, 0, 2, 12, 6, 5, 10):
+                game.play(fc)
+            self.assertEqual(game.prisoners, {'X': 2, 'O': 0}, module.__name__)
+            self.assertEqual(game.stone_counts, {'X': 4, 'O': 1})
+            self.assertEqual(count_stones(game.position, 'O'), 1)
+
+    def test_liberties(self):
+        positions = [module.Position.initial_state(size=5) for module in BACKENDS]
+        positions.append(go_sets.Position.initial_state(size=5, compact=True))
+        for position in positions:
+            for fc, color in ((6, 'X'), (7, 'X'), (8, 'O')):
+                position = position.play_move(fc, color)
+            liberties = position.get_liberties()
+            self.assertEqual(list(liberties), [0] * 6 + [5, 5, 3] + [0] * 16, type(position).__module__)
+
+    def test_snapshot(self):
+        for module in BACKENDS:
+            game = Game.new(module, size=5, superko=True)
+            game.play(12)
+            branch = game.snapshot()
+            branch.play(7)
+            game.play(13)
+            self.assertEqual(game.position.get_board()[7], '.', module.__name__)
+            self.assertEqual(game.position.get_board()[13], 'O')
+            self.assertEqual(branch.position.get_board()[13], '.')
+            self.assertEqual(list(game.moves), [12, 13])
+            self.assertEqual(list(branch.moves), [12, 7])
+            self.assertNotIn(branch.position.zobrist, game.position.history)
+
+    def test_snapshot_union_find(self):
+        game = Game(go_mutable.Position.initial_state(size=5, union_find=True))
+        for fc in (1, 0, 2):
+            game.play(fc)
+        branch = game.snapshot()
+        self.assertIsNot(branch.position.groups, game.position.groups)
+        # White's stone at 0 is captured in the branch only, by its own groups
+        branch.play(12)
+        branch.play(5)
+        game.play(5)
+        self.assertEqual(branch.prisoners['X'], 1)
+        self.assertEqual(branch.position.get_board()[:6], '.XX..X')
+        self.assertEqual(game.position.get_board()[:6], 'OXX..O')
+        for position in (branch.position, game.position):
+            board = position.board
+            self.assertEqual(position.groups.get_liberties(board),
+                             list(go_mutable.liberties_from_board(board, position.geometry.neighbors)))
+
+    def test_superko_history_per_position(self):
+        # Sibling moves from one position don't see each other in its history
+        for module in (go_naive, go_sets, go_bitboard):
+            position = module.Position.initial_state(superko=True)
+            position.play_move(60, 'X')
+            position.play_move(61, 'X')
+            child = position.play_move(60, 'X')
+            self.assertEqual(child.history, {0, child.zobrist}, module.__name__)
+            self.assertEqual(position.history, {0}, module.__name__)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import go_naive
+import go_mutable
+import go_sets
+import go_bitboard
+from go_instrument import Instrumentation, PLAY_MOVE
+
+class TestInstrumentation(unittest.TestCase):
+    def test_restores_originals(self):
+        for module in (go_naive, go_mutable, go_sets, go_bitboard):
+            play_move = module.Position.play_move
+            with Instrumentation(module) as instrumentation:
+                self.assertIsNot(module.Position.play_move, play_move)
+                with self.assertRaises(RuntimeError):
+                    instrumentation.enable()
+            self.assertIs(module.Position.play_move, play_move)
+
+    def test_counts_phases(self):
+        # White's stones at 0 and 5 are captured by black at 10
+        for module in (go_naive, go_sets):
+            instrumentation = Instrumentation(module)
+            position = module.Position.initial_state(size=5)
+            with instrumentation:
+                for fc, color in zip((1, 0, 2, 12, 6, 5, 10), 'XOXOXOX'):
+                    position = position.play_move(fc, color)
+            # Not counted once disabled
+            position.play_move(20, 'O')
+            report = instrumentation.report()
+            self.assertEqual(report[PLAY_MOVE]['calls'], 7)
+            self.assertEqual(report[PLAY_MOVE]['fraction_of_play_move'], 1)
+            self.assertEqual(report['is_koish']['calls'], 7)
+            self.assertNotIn('update_territory', report)
+            captures = report['maybe_capture_stones' if module is go_naive else 'LibertyTracker._capture_group']
+            self.assertEqual((captures['size'], captures['max_size']), (2, 2))
+            self.assertIn('is_koish', instrumentation.table())
+
+    def test_reset(self):
+        instrumentation = Instrumentation(go_bitboard)
+        with instrumentation:
+            go_bitboard.Position.initial_state().play_move(0, 'X')
+        self.assertEqual(instrumentation.stats[PLAY_MOVE].calls, 1)
+        instrumentation.reset()
+        self.assertEqual(instrumentation.report(), {})
+
+if __name__ == '__main__':
+    unittest.main()
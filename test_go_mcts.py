@@ -0,0 +1,65 @@
+import re
+import unittest
+import go_naive
+import go_mutable
+import go_sets
+import go_bitboard
+from go_mcts import SearchTree, PASS
+
+def load_board(string):
+    return re.sub(r'[^XO\.]+', '', string)
+
+# Black and white groups in atari: black must capture at 5 or save its three
+# stones at 17, which white would otherwise capture
+ATARI_BOARD = load_board('''
+    OOXO.
+    .OXO.
+    XOXO.
+    .X.O.
+    .....
+''')
+
+class TestSearch(unittest.TestCase):
+    def test_finds_capture(self):
+        for module in (go_naive, go_sets, go_bitboard):
+            position = module.Position.initial_state(size=5)
+            for fc, color in enumerate(ATARI_BOARD):
+                if color != '.':
+                    position = position.play_move(fc, color)
+            tree = SearchTree(position, 'X', komi=0)
+            self.assertIn(tree.search(playouts=300), (5, 17), module.__name__)
+
+    def test_in_place_backend(self):
+        position = go_mutable.Position(bytearray(ATARI_BOARD, encoding='ascii'), None)
+        tree = SearchTree(position, 'X', komi=0)
+        self.assertIsNone(tree.positions)
+        self.assertIn(tree.search(playouts=300), (5, 17))
+        self.assertEqual(position.get_board(), ATARI_BOARD)
+
+    def test_superko_root(self):
+        position = go_sets.Position.initial_state(superko=True, size=5)
+        tree = SearchTree(position, 'X')
+        tree.search(playouts=100)
+        self.assertEqual(position.history, {0})
+
+    def test_visit_counts(self):
+        tree = SearchTree(go_naive.Position.initial_state(size=5), 'X')
+        tree.search(playouts=100)
+        self.assertEqual(tree.visits[0], 100)
+        children = tree.root_children()
+        self.assertEqual(len(children), 26)
+        self.assertEqual(children[-1][0], PASS)
+        # The first playout expands the root without visiting a child
+        self.assertEqual(sum(visits for move, visits, value in children), 99)
+        visited = [node for node in range(len(tree)) if tree.positions[node] is not None]
+        self.assertEqual(len(visited), 100)
+
+    def test_time_budget(self):
+        tree = SearchTree(go_naive.Position.initial_state(size=5), 'X')
+        tree.search(seconds=0.05)
+        self.assertGreater(tree.visits[0], 0)
+        with self.assertRaises(ValueError):
+            tree.search()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+import itertools
+import random
+import re
+import unittest
+from go_mutable import Position, GroupTracker, IllegalMove, N, EMPTY_BOARD, zobrist_hash, playout, is_eye
+
+def load_board(string):
+    return bytearray(re.sub(r'[^XO\.]+', '', string), encoding='ascii')
+
+EMPTY_ROW = '.' * 19
+
+class TestUndo(unittest.TestCase):
+    def test_undo_capture(self):
+        board = load_board('''
+        OX.................
+        ''' + EMPTY_ROW * 18)
+        original = board[:]
+        position = Position(board, None)
+
+        captured_position = position.play_move(N, 'X')
+        self.assertEqual(captured_position.board[0], ord('.'))
+
+        restored = captured_position.undo_move()
+        self.assertIs(restored, position)
+        self.assertEqual(restored.board, original)
+        self.assertEqual(restored.zobrist, zobrist_hash(original))
+
+    def test_undo_restores_ko(self):
+        board = load_board('''
+        .XO................
+        XO.................
+        ''' + EMPTY_ROW * 17)
+        position = Position(board, None)
+        ko_position = position.play_move(0, 'O')
+        self.assertEqual(ko_position.ko, 1)
+        with self.assertRaises(IllegalMove):
+            ko_position.play_move(1, 'X')
+
+        self.assertIsNone(ko_position.undo_move().ko)
+
+    def test_undo_game(self):
+        position = Position.initial_state(superko=True)
+        boards = [position.get_board()]
+        moves = [0, 1, N, N+1, 2*N, 2]
+        for move, color in zip(moves, itertools.cycle('XO')):
+            position = position.play_move(move, color)
+            boards.append(position.get_board())
+
+        boards.pop()
+        while position.undo_entry is not None:
+            position = position.undo_move()
+            self.assertEqual(position.get_board(), boards.pop())
+        self.assertEqual(position.board, EMPTY_BOARD)
+        self.assertEqual(position.history, {0})
+
+    def test_suicide_leaves_board_unchanged(self):
+        board = load_board('''
+        .X.................
+        X..................
+        ''' + EMPTY_ROW * 17)
+        original = board[:]
+        with self.assertRaises(IllegalMove):
+            Position(board, None).play_move(0, 'O')
+        self.assertEqual(board, original)
+
+
+class TestLiberties(unittest.TestCase):
+    def test_incremental_liberties(self):
+        board = load_board('''
+        .XO................
+        XOOX...............
+        .XX................
+        ''' + EMPTY_ROW * 16)
+        position = Position(board, None)
+        liberties = position.get_liberties()
+        self.assertEqual(liberties[2], 1)
+        with self.assertRaises(TypeError):
+            liberties[2] = 0
+
+        # capture the white group, which gives the black stones around it liberties back
+        captured_position = position.play_move(3, 'X')
+        fresh_position = Position(captured_position.board[:], None)
+        self.assertEqual(captured_position.get_liberties(), fresh_position.get_liberties())
+        self.assertEqual(captured_position.get_liberties()[1], 3)
+        self.assertEqual(position.get_liberties()[2], 1)
+
+
+class TestGroupTracker(unittest.TestCase):
+    def test_capture_and_undo(self):
+        board = load_board('''
+        .XO................
+        XOOX...............
+        .XX................
+        ''' + EMPTY_ROW * 16)
+        original = board[:]
+        groups = GroupTracker(board)
+        position = Position(board, None, groups=groups)
+        self.assertEqual(groups.find(N+1), groups.find(2))
+        self.assertEqual(position.get_liberties()[2], 1)
+
+        captured_position = position.play_move(3, 'X')
+        self.assertEqual(captured_position.board[:3], bytearray(b'.X.'))
+        self.assertEqual(captured_position.board[N+1], ord('.'))
+        self.assertEqual(groups.get_liberties(board), GroupTracker(board).get_liberties(board))
+
+        captured_position.undo_move()
+        self.assertEqual(board, original)
+        self.assertEqual(groups.get_liberties(board), GroupTracker(board).get_liberties(board))
+
+    def test_suicide(self):
+        board = load_board('''
+        .X.................
+        X..................
+        ''' + EMPTY_ROW * 17)
+        original = board[:]
+        groups = GroupTracker(board)
+        with self.assertRaises(IllegalMove):
+            Position(board, None, groups=groups).play_move(0, 'O')
+        self.assertEqual(board, original)
+        self.assertEqual(groups.pseudo_liberties[groups.find(1)], 3)
+
+    def test_matches_flood_fill(self):
+        position = Position.initial_state()
+        union_find_position = Position.initial_state(union_find=True)
+        rng = random.Random(2)
+        for move_num in range(300):
+            move, color = rng.randrange(N * N), 'XO'[move_num % 2]
+            try:
+                position = position.play_move(move, color)
+            except IllegalMove:
+                with self.assertRaises(IllegalMove):
+                    union_find_position.play_move(move, color)
+                continue
+            union_find_position = union_find_position.play_move(move, color)
+            self.assertEqual(union_find_position.board, position.board)
+            self.assertEqual(union_find_position.get_liberties(), position.get_liberties())
+
+
+class TestPlayout(unittest.TestCase):
+    def test_playout_is_deterministic(self):
+        position = Position.initial_state()
+        score = playout(position, random.Random(1))
+        self.assertEqual(playout(position, random.Random(1)), score)
+        self.assertEqual(position.board, EMPTY_BOARD)
+
+    def test_moves_are_uniform(self):
+        # White can't play in black's eyes, which come first in the list of
+        # empty points, so only the 5 points of the bottom row are legal
+        board = load_board('''
+        .X.X.
+        XXXXX
+        X.X.X
+        XXXXX
+        .....
+        ''')
+        position = Position(board, None)
+        rng = random.Random(0)
+        counts = dict.fromkeys(range(20, 25), 0)
+        for i in range(2000):
+            moves_played = []
+            playout(position, rng, 'O', max_moves=1, moves_played=moves_played)
+            counts[moves_played[0]] += 1
+        for fc, count in counts.items():
+            self.assertTrue(320 < count < 480, (fc, count))
+
+    def test_is_eye(self):
+        board = load_board('''
+        .X.X...............
+        XXXOX..............
+        ...................
+        ''' + EMPTY_ROW * 16)
+        self.assertTrue(is_eye(board, 0, ord('X')))
+        self.assertFalse(is_eye(board, 0, ord('O')))
+        # a false eye on the edge, since the opponent holds a diagonal
+        self.assertFalse(is_eye(board, 2, ord('X')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import itertools
+import unittest
+import go_naive
+import go_mutable
+import go_sets
+import go_bitboard
+import go_serialize
+from go_benchmark import moves
+
+BACKENDS = (go_naive, go_mutable, go_sets, go_bitboard)
+
+class TestSerialize(unittest.TestCase):
+    def test_round_trip(self):
+        for module in BACKENDS:
+            position = module.Position.initial_state()
+            for move, color in zip(moves[:100], itertools.cycle('XO')):
+                position = position.play_move(move, color)
+            data = position.to_bytes('O')
+            self.assertEqual(len(data), go_serialize.record_size(19))
+            self.assertEqual(len(data), 95)
+            for other in BACKENDS:
+                copy, to_play = other.Position.from_bytes(data)
+                self.assertEqual(to_play, 'O')
+                self.assertEqual(copy.get_board(), position.get_board(), (module.__name__, other.__name__))
+                self.assertEqual(copy.zobrist, position.zobrist)
+                self.assertEqual(list(copy.get_liberties()), list(position.get_liberties()))
+                self.assertEqual(copy.to_bytes('O'), data)
+                # Play on from the copy
+                copy.play_move(moves[100], 'X')
+
+    def test_ko_and_sizes(self):
+        board = '.XO..' + 'XO...' + '.' * 15
+        ko_position = go_naive.Position(board, None).play_move(0, 'O')
+        for module in BACKENDS:
+            position, to_play = module.Position.from_bytes(ko_position.to_bytes('X'), superko=True)
+            self.assertEqual((position.ko, to_play, position.geometry.n), (1, 'X', 5))
+            self.assertEqual(position.history, {position.zobrist})
+            with self.assertRaises(module.IllegalMove):
+                position.play_move(1, 'X')
+        tracker = go_sets.Position.from_bytes(ko_position.to_bytes('X'), compact=True)[0].liberty_tracker
+        self.assertIsInstance(tracker, go_sets.CompactLibertyTracker)
+
+    def test_invalid(self):
+        data = go_naive.Position.initial_state(size=9).to_bytes('X')
+        for bad in (data[:-1], data[:4] + b'\xff' + data[5:], bytes([9, 2]) + data[2:]):
+            with self.assertRaises(ValueError):
+                go_naive.Position.from_bytes(bad)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import asyncio
+import itertools
+import unittest
+import go_naive
+import go_mutable
+import go_sets
+import go_bitboard
+import go_server
+from go_benchmark import moves
+from go_game import PASS
+from go_loadtest import load_test_server
+
+BACKENDS = (go_naive, go_mutable, go_sets, go_bitboard)
+
+async def talk(module, commands, size=19):
+    'Send each command to a new server on module, and return the responses'
+    server = await go_server.GameServer(module, size=size).start('127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        responses = []
+        for command in commands:
+            writer.write(command.encode('ascii') + b'\n')
+            responses.append((await reader.readuntil(b'\n\n')).decode('ascii'))
+        writer.close()
+    return responses
+
+class TestServer(unittest.TestCase):
+    def test_vertices(self):
+        self.assertEqual(go_server.parse_vertex('A19', 19), 0)
+        self.assertEqual(go_server.parse_vertex('j1', 19), 19 * 18 + 8)
+        self.assertEqual(go_server.parse_vertex('pass', 19), PASS)
+        for fc in range(81):
+            self.assertEqual(go_server.parse_vertex(go_server.format_vertex(fc, 9), 9), fc)
+        for vertex in ('I5', 'A0', 'A20', 'Z1', 'A'):
+            with self.assertRaises(go_server.GTPError):
+                go_server.parse_vertex(vertex, 19)
+
+    def test_commands(self):
+        for module in BACKENDS:
+            # White's stones at A5 and A4 are captured by black at A3
+            responses = asyncio.run(talk(module, [
+                '1 boardsize 5', 'play b B5', 'play w A5', 'play b C5', 'play w C3', 'play b B4', 'play w A4',
+                'liberties B5', '2 is_legal w A4', 'play b A3', 'play w A3', 'captures b', 'liberties B5',
+                'final_score', 'play x A1', '3 frobnicate', 'play b', 'known_command genmove', 'genmove w',
+                'quit']))
+            self.assertEqual(responses[:2], ['=1 \n\n', '= \n\n'], module.__name__)
+            self.assertEqual(responses[7:10], ['= 3\n\n', '=2 0\n\n', '= \n\n'])
+            self.assertEqual(responses[10], '? illegal move\n\n')
+            self.assertEqual(responses[11:13], ['= 2\n\n', '= 5\n\n'])
+            # Black leads by 5 points on the board, less 7.5 komi
+            self.assertEqual(responses[13], '= W+2.5\n\n')
+            self.assertEqual(responses[14:18], ['? invalid color\n\n', '?3 unknown command\n\n',
+                                                '? syntax error\n\n', '= true\n\n'])
+            self.assertTrue(responses[18].startswith('= '))
+            self.assertEqual(responses[19], '= \n\n')
+
+    def test_session_seeds(self):
+        async def genmoves():
+            game_server = go_server.GameServer(go_naive, size=9)
+            server = await game_server.start('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                connections = [await asyncio.open_connection('127.0.0.1', port) for i in range(3)]
+                # Close the first connection, then open another while the rest stay open
+                connections[0][1].write(b'quit\n')
+                await connections[0][0].read()
+                connections[0] = await asyncio.open_connection('127.0.0.1', port)
+                responses = []
+                for reader, writer in connections:
+                    writer.write(b'genmove b\ngenmove w\ngenmove b\n')
+                    responses.append([(await reader.readuntil(b'\n\n')).decode('ascii') for i in range(3)])
+                    writer.close()
+            return game_server, responses
+        game_server, responses = asyncio.run(genmoves())
+        self.assertEqual(game_server.connections, 4)
+        # No two open sessions play the same moves
+        self.assertEqual(len(set(map(tuple, responses))), 3)
+
+    def test_fill_liberties(self):
+        for module in (go_naive, go_mutable, go_bitboard):
+            positions = []
+            for num_moves in (0, 50, 150):
+                position = module.Position.initial_state()
+                for move, color in zip(moves[:num_moves], itertools.cycle('XO')):
+                    position = position.play_move(move, color)
+                positions.append(position)
+            expected = [list(go_naive.Position(p.get_board(), None).get_liberties()) for p in positions]
+            go_server.fill_liberties(positions)
+            self.assertEqual([list(p.get_liberties()) for p in positions], expected, module.__name__)
+
+    def test_batches_queries(self):
+        async def query(positions):
+            batcher = go_server.QueryBatcher()
+            results = await asyncio.gather(*[batcher.submit(kind, position)
+                                             for position in positions
+                                             for kind in (go_server.SCORE, go_server.LIBERTIES)])
+            return batcher, results
+        for module in BACKENDS:
+            # Two games at the same board, and one at another
+            positions = [module.Position.initial_state().play_move(0, 'X'),
+                         module.Position.initial_state().play_move(0, 'X'),
+                         module.Position.initial_state(size=9).play_move(40, 'O')]
+            batcher, results = asyncio.run(query(positions))
+            self.assertEqual((batcher.flushes, batcher.queries), (1, 6))
+            self.assertEqual(results[0::2], [361, 361, -81], module.__name__)
+            self.assertIs(results[1], results[3])
+            self.assertEqual(results[1][0], 2)
+            self.assertEqual(results[5][40], 4)
+
+    def test_load_test(self):
+        stats, game_server = asyncio.run(load_test_server(go_sets, clients=4, requests=40, size=9))
+        self.assertEqual(stats['requests'], 160)
+        self.assertEqual(game_server.requests, 164)
+        self.assertLessEqual(stats['median'], stats['p99'])
+        self.assertEqual(game_server.sessions, set())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import re
 import unittest
-from go_sets import Position, LibertyTracker, N, NN, WHITE, BLACK, EMPTY
+from go_geometry import get_geometry
+from go_sets import Position, LibertyTracker, PersistentLibertyTracker, CompactLibertyTracker, UndoableLibertyTracker, IllegalMove, N, NN, WHITE, BLACK, EMPTY, zobrist_hash, read_ladder
 
 def load_board(string):
     return re.sub(r'[^XO\.]+', '', string)
@@ -180,6 +181,123 @@ class TestLibertyTracker(unittest.TestCase):
 
         self.assertEqual(captured, set())
 
+    def test_persistent_tracker_shares_untouched_groups(self):
+        board = load_board('''
+        .XX...........O....
+        XOO................
+        .XX................
+        ''' + EMPTY_ROW * 16)
+        libtracker = PersistentLibertyTracker.from_board(board)
+        new_lib_tracker, captured = libtracker.add_stone(BLACK, N+3)
+        self.assertEqual(captured, {N+1, N+2})
+
+        far_group_id = libtracker.group_index[14]
+        self.assertIs(new_lib_tracker.groups[far_group_id], libtracker.groups[far_group_id])
+
+        top_group_id = libtracker.group_index[1]
+        self.assertEqual(libtracker.groups[top_group_id].liberties, {0, 3})
+        self.assertEqual(new_lib_tracker.groups[top_group_id].liberties, {0, 3, N+1, N+2})
+        self.assertEqual(libtracker.get_liberties()[N+1], 1)
+
+
+    def test_compact_tracker(self):
+        board = load_board('''
+        .XX...........O....
+        XOO................
+        .XX................
+        ''' + EMPTY_ROW * 16)
+        libtracker = CompactLibertyTracker.from_board(board)
+        new_lib_tracker, captured = libtracker.add_stone(BLACK, N+3)
+        self.assertEqual(captured, {N+1, N+2})
+        self.assertEqual(new_lib_tracker.group_index[N+1], 0)
+        self.assertEqual(list(new_lib_tracker.get_liberties()[:4]), [0, 4, 4, 0])
+        self.assertEqual(libtracker.get_liberties()[N+1], 1)
+
+        far_group_id = libtracker.group_index[14]
+        self.assertIs(new_lib_tracker.compact_groups[far_group_id], libtracker.compact_groups[far_group_id])
+        top_group = new_lib_tracker.groups[new_lib_tracker.group_index[1]]
+        self.assertEqual(top_group.stones, {1, 2})
+        self.assertEqual(top_group.liberties, {0, 3, N+1, N+2})
+        self.assertEqual(len(new_lib_tracker.groups), len(libtracker.groups))
+
+    def test_compact_tracker_geometry(self):
+        geometry = get_geometry(5)
+        board = load_board('''
+        .X...
+        XO...
+        .X...
+        .....
+        .....
+        ''')
+        libtracker = CompactLibertyTracker.from_board(board, geometry)
+        self.assertIs(libtracker.geometry, geometry)
+        self.assertEqual(list(libtracker.get_liberties()[:7]), [0, 2, 0, 0, 0, 2, 1])
+
+    def test_undoable_tracker(self):
+        board = load_board('''
+        .XX...........O....
+        XOO................
+        .XX................
+        ''' + EMPTY_ROW * 16)
+        libtracker = LibertyTracker.from_board(board)
+        tracker = UndoableLibertyTracker.from_tracker(libtracker)
+        captured = tracker.make_move(BLACK, N+3)
+        self.assertEqual(captured, {N+1, N+2})
+        self.assertEqual(tracker.get_liberties()[1], 4)
+        tracker.make_move(WHITE, N+1)
+        tracker.unmake_move()
+        tracker.unmake_move()
+        self.assertEqual(tracker.group_index, libtracker.group_index)
+        self.assertEqual(tracker.get_liberties(), libtracker.get_liberties())
+        self.assertEqual(tracker.groups, libtracker.groups)
+        self.assertEqual(libtracker.groups[libtracker.group_index[1]].liberties, {0, 3})
+
+    def test_from_board_matches_reference(self):
+        import itertools
+        from go_benchmark import moves, reference_liberty_tracker
+        position = Position.initial_state()
+        boards = [position.board, load_board('XO.' * 120 + 'X')]
+        for move, color in zip(moves, itertools.cycle('XO')):
+            position = position.play_move(move, color)
+            boards.append(position.board)
+        for board, libtracker in zip(boards, LibertyTracker.from_boards(boards)):
+            expected = reference_liberty_tracker(board)
+            self.assertEqual(libtracker.group_index, expected.group_index)
+            self.assertEqual(libtracker.groups, expected.groups)
+            self.assertEqual(libtracker.liberty_cache, expected.liberty_cache)
+            self.assertEqual(libtracker.max_group_id, expected.max_group_id)
+        self.assertIsInstance(PersistentLibertyTracker.from_boards(boards[:1])[0], PersistentLibertyTracker)
+
+class TestLadder(unittest.TestCase):
+    LADDER = load_board('''
+        .........
+        ..OO.....
+        .OX......
+        ..O......
+        .........
+        .........
+        .........
+        .........
+        .........
+    ''')
+
+    def test_ladder(self):
+        libtracker = LibertyTracker.from_board(self.LADDER)
+        self.assertFalse(read_ladder(libtracker, 20))
+        # Reading stops early, counting the group as escaped
+        self.assertTrue(read_ladder(libtracker, 20, max_depth=4))
+
+    def test_ladder_breaker(self):
+        board = self.LADDER[:60] + BLACK + self.LADDER[61:]
+        self.assertTrue(read_ladder(LibertyTracker.from_board(board), 20))
+
+    def test_two_liberties(self):
+        # Without the white stone at 29, white to move ataris there, and the
+        # ladder runs to the edge as before
+        board = self.LADDER[:29] + EMPTY + self.LADDER[30:]
+        libtracker = LibertyTracker.from_board(board)
+        self.assertEqual(libtracker.get_liberties()[20], 2)
+        self.assertFalse(read_ladder(libtracker, 20))
 
 class TestPosition(unittest.TestCase):
     def test_capture_and_play(self):
@@ -202,6 +320,94 @@ class TestPosition(unittest.TestCase):
         ''' + EMPTY_ROW * 17)
         self.assertEqual(filled_in_position.board, filled_in_board)
 
+    def test_zobrist_tracks_captures(self):
+        board = load_board('''
+        OX.................
+        ''' + EMPTY_ROW * 18)
+        position = Position(board, None, LibertyTracker.from_board(board))
+        self.assertEqual(position.zobrist, zobrist_hash(board))
+
+        captured_position = position.play_move(N, BLACK)
+        self.assertEqual(captured_position.zobrist, zobrist_hash(captured_position.board))
+        self.assertEqual(Position.initial_state().zobrist, 0)
+
+    def test_legal_moves(self):
+        board = load_board('''
+        .XO................
+        XO.................
+        OX.................
+        ''' + EMPTY_ROW * 16)
+        position = Position(board, None, LibertyTracker.from_board(board))
+        # white captures at 0, while black would fill its own last liberty
+        self.assertTrue(position.legal_moves(WHITE) & (1 << 0))
+        self.assertFalse(position.legal_moves(BLACK) & (1 << 0))
+        self.assertTrue(position.legal_moves(BLACK) & (1 << 3))
+
+        # after the capture, the legal move masks are updated incrementally
+        # and agree with a fresh computation
+        captured_position = position.play_move(0, WHITE)
+        fresh_position = Position(captured_position.board, captured_position.ko,
+                                  LibertyTracker.from_board(captured_position.board))
+        for color in (BLACK, WHITE):
+            self.assertEqual(captured_position.legal_moves(color), fresh_position.legal_moves(color))
+        self.assertFalse(captured_position.legal_moves(BLACK) & (1 << 1))
+
+    def test_positional_superko(self):
+        board = load_board('''
+        OX.................
+        ''' + EMPTY_ROW * 18)
+        repeated_board = load_board('''
+        .X.................
+        X..................
+        ''' + EMPTY_ROW * 17)
+        history = frozenset([zobrist_hash(board), zobrist_hash(repeated_board)])
+        position = Position(board, None, LibertyTracker.from_board(board), history=history)
+        with self.assertRaises(IllegalMove):
+            position.play_move(N, BLACK)
+
+        new_position = position.play_move(2, BLACK)
+        self.assertEqual(len(new_position.history), 3)
+        self.assertEqual(position.history, history)
+
+    def test_small_board(self):
+        board = load_board('''
+        .O...
+        OX...
+        .O...
+        .....
+        .....
+        ''')
+        position = Position(board, None, LibertyTracker.from_board(board))
+        self.assertEqual(position.geometry.n, 5)
+        captured_position = position.play_move(7, WHITE)
+        self.assertEqual(captured_position.board, load_board('''
+        .O...
+        O.O..
+        .O...
+        .....
+        .....
+        '''))
+        self.assertEqual(captured_position.zobrist, zobrist_hash(captured_position.board))
+        self.assertEqual(captured_position.get_liberties()[7], 4)
+        self.assertEqual(captured_position.score(), -25)
+        self.assertEqual(Position.initial_state(size=9).board, EMPTY * 81)
+
+    def test_incremental_score(self):
+        board = load_board('''
+        .OX..
+        OX...
+        .....
+        .....
+        .....
+        ''')
+        position = Position(board, None, LibertyTracker.from_board(board))
+        self.assertEqual(position.score(), -1)
+        # white captures at 6, then black walls off the right hand column
+        for fc, color in ((7, WHITE), (11, WHITE), (3, BLACK), (8, BLACK), (13, BLACK), (18, BLACK), (23, BLACK)):
+            position = position.play_move(fc, color)
+            fresh_position = Position(position.board, position.ko, LibertyTracker.from_board(position.board))
+            self.assertEqual(position.score(), fresh_position.score())
+        self.assertEqual(position.score(), 5)
 
 
 if __name__ == '__main__':
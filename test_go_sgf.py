@@ -0,0 +1,43 @@
+import io
+import unittest
+from go_sgf import parse_string, tokenize, SGFError, N
+
+SGF = r'''(;GM[1]FF[4]SZ[19]HA[2]RE[W+3.5]C[a comment with \] and (;parens)]
+AB[dd][pp]
+;W[qd]C[hi];B[]
+(;W[dp];B[tt]
+(;W[cc])(;W[ee]))
+(;W[qq]))
+(;FF[3]AddBlack[aa:bb];W[ss])'''
+
+class TestSGF(unittest.TestCase):
+    def test_main_line(self):
+        games = list(parse_string(SGF))
+        self.assertEqual(len(games), 2)
+        setup, moves, result = games[0]
+        self.assertEqual(setup, [(3*N + 3, 'X'), (15*N + 15, 'X')])
+        self.assertEqual(moves, [(3*N + 16, 'O'), (None, 'X'), (15*N + 3, 'O'), (None, 'X'), (2*N + 2, 'O')])
+        self.assertEqual(result, 'W+3.5')
+
+    def test_compressed_setup(self):
+        setup, moves, result = list(parse_string(SGF))[1]
+        self.assertEqual(setup, [(0, 'X'), (1, 'X'), (N, 'X'), (N+1, 'X')])
+        self.assertEqual(moves, [(18*N + 18, 'O')])
+        self.assertIsNone(result)
+
+    def test_chunk_boundaries(self):
+        expected = list(tokenize(io.StringIO(SGF)))
+        for chunk_size in (1, 2, 3, 5, 8):
+            self.assertEqual(list(tokenize(io.StringIO(SGF), chunk_size=chunk_size)), expected)
+
+    def test_skipped_games(self):
+        skipped = []
+        games = list(parse_string('(;SZ[9];B[aa])(;B[zz])(;B[aa])', skipped=skipped))
+        self.assertEqual(games, [([], [(0, 'X')], None)])
+        self.assertEqual(len(skipped), 2)
+        with self.assertRaises(SGFError):
+            list(parse_string('(;SZ[9];B[aa])'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import itertools
+import unittest
+import go_naive
+import go_mutable
+import go_sets
+import go_bitboard
+import go_symmetry
+from go_benchmark import moves
+from go_symmetry import NUM_SYMMETRIES, IDENTITY
+
+BACKENDS = (go_naive, go_mutable, go_sets, go_bitboard)
+
+class TestSymmetry(unittest.TestCase):
+    def test_permutations(self):
+        for n in (5, 19):
+            tables = go_symmetry.get_tables(n)
+            self.assertEqual(len(set(map(tuple, tables.permutations))), NUM_SYMMETRIES)
+            for symmetry in range(NUM_SYMMETRIES):
+                self.assertEqual(sorted(tables.permutations[symmetry]), list(range(n * n)))
+                for fc in range(n * n):
+                    self.assertEqual(go_symmetry.transform_move(
+                        go_symmetry.transform_move(fc, symmetry, n), go_symmetry.inverse(symmetry, n), n), fc)
+        # Rotating 90 degrees takes the top left corner to the top right
+        self.assertEqual(go_symmetry.transform_move(0, 1, 5), 4)
+
+    def test_symmetric_positions(self):
+        for module in BACKENDS:
+            hashes = set()
+            for symmetry in range(NUM_SYMMETRIES):
+                position = module.Position.initial_state(size=5)
+                for fc, color in zip((0, 1, 7, 6, 12), 'XOXOX'):
+                    position = position.play_move(go_symmetry.transform_move(fc, symmetry, 5), color)
+                hashes.add(go_symmetry.canonical_hash(position))
+                self.assertEqual(go_symmetry.symmetry_hashes(position)[IDENTITY], position.zobrist)
+            self.assertEqual(len(hashes), 1, module.__name__)
+
+    def test_incremental(self):
+        for module in BACKENDS:
+            position = module.Position.initial_state()
+            go_symmetry.symmetry_hashes(position)
+            for move, color in zip(moves, itertools.cycle('XO')):
+                position = position.play_move(move, color)
+            position = position.pass_move()
+            self.assertEqual(position.symmetry_cache,
+                             go_symmetry.hashes_from_board(position.get_board(), 19), module.__name__)
+
+    def test_canonical_board(self):
+        position = go_naive.Position.initial_state(size=5).play_move(3, 'X').play_move(20, 'O')
+        board, symmetry = go_symmetry.canonical_board(position)
+        self.assertEqual(go_symmetry.hashes_from_board(board, 5)[IDENTITY], go_symmetry.canonical_hash(position))
+        # Moves map to the canonical board and back
+        self.assertEqual(board[go_symmetry.transform_move(3, symmetry, 5)], 'X')
+        self.assertEqual(go_symmetry.transform_board(board, go_symmetry.inverse(symmetry, 5)), position.board)
+
+    def test_canonical_key(self):
+        board = '.XO' + '.' * 16 + 'XO.' + '.' * 16 + '.' * 19 * 17
+        ko_position = go_naive.Position(board, None).play_move(0, 'O')
+        mirrored = go_naive.Position(go_symmetry.transform_board(board, 4), None).play_move(18, 'O')
+        self.assertEqual((ko_position.ko, mirrored.ko), (1, 17))
+        self.assertEqual(go_symmetry.canonical_key(ko_position, 'X'), go_symmetry.canonical_key(mirrored, 'X'))
+        self.assertNotEqual(go_symmetry.canonical_key(ko_position, 'X'),
+                            go_symmetry.canonical_key(ko_position._replace(ko=None), 'X'))
+        self.assertNotEqual(go_symmetry.canonical_key(ko_position, 'X'), go_symmetry.canonical_key(ko_position, 'O'))
+
+if __name__ == '__main__':
+    unittest.main()
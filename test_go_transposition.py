@@ -0,0 +1,86 @@
+import unittest
+import go_naive
+import go_bitboard
+from go_transposition import TranspositionTable, position_key
+
+class TestTranspositionTable(unittest.TestCase):
+    def test_get_and_put(self):
+        table = TranspositionTable(capacity=100)
+        self.assertEqual(table.capacity(), 128)
+        self.assertIsNone(table.get(12345))
+        table.put(12345, 'a')
+        table.put(0, 'b')
+        self.assertEqual(table.get(12345), 'a')
+        self.assertEqual(table.get(0), 'b')
+        table.put(12345, 'c')
+        self.assertEqual(table.get(12345), 'c')
+        self.assertEqual((len(table), table.hits, table.misses, table.evictions), (2, 3, 1, 0))
+
+    def test_keys_differing_in_low_bit(self):
+        table = TranspositionTable(capacity=16)
+        # 2 is pushed along to slot 3, where 3 starts probing
+        table.put(18, 'a')
+        table.put(2, 'b')
+        self.assertIsNone(table.get(3))
+        table.put(3, 'c')
+        self.assertEqual([table.get(key) for key in (18, 2, 3)], ['a', 'b', 'c'])
+        self.assertEqual(len(table), 3)
+
+    def test_clock_eviction(self):
+        table = TranspositionTable(capacity=16, window=4)
+        # Keys that all start probing at slot 2
+        keys = [2 + 16 * i for i in range(5)]
+        for key in keys[:4]:
+            table.put(key, key)
+        table.get(keys[0])
+        table.get(keys[2])
+        table.put(keys[4], keys[4])
+        self.assertEqual(table.evictions, 1)
+        self.assertEqual(len(table), 4)
+        # The first unreferenced slot was evicted
+        self.assertIsNone(table.get(keys[1]))
+        self.assertEqual([table.get(key) for key in (keys[0], keys[2], keys[3], keys[4])],
+                         [keys[0], keys[2], keys[3], keys[4]])
+
+    def test_clear(self):
+        # A cleared table evicts the same way as a new one
+        evicted = []
+        table = TranspositionTable(capacity=16, window=4)
+        for run in range(2):
+            keys = [2 + 16 * i for i in range(5)]
+            for key in keys:
+                table.put(key, key)
+            evicted.append([key for key in keys if table.get(key) is None])
+            table.put(3, 3)
+            table.clear()
+            self.assertEqual((len(table), table.hand, table.hits, table.misses, table.evictions), (0, 0, 0, 0, 0))
+        self.assertEqual(evicted[0], evicted[1])
+
+    def test_position_key(self):
+        for module in (go_naive, go_bitboard):
+            position = module.Position.initial_state()
+            one_way = position.play_move(0, 'X').play_move(60, 'O').play_move(2, 'X')
+            other_way = position.play_move(2, 'X').play_move(60, 'O').play_move(0, 'X')
+            self.assertEqual(position_key(one_way, 'O'), position_key(other_way, 'O'))
+            self.assertNotEqual(position_key(one_way, 'O'), position_key(one_way, 'X'))
+            self.assertNotEqual(position_key(position, 'X'), position_key(position, 'O'))
+
+    def test_position_key_ko(self):
+        board = '.XO' + '.' * 16 + 'XO.' + '.' * 16 + '.' * 19 * 17
+        ko_position = go_naive.Position(board, None).play_move(0, 'O')
+        self.assertEqual(ko_position.ko, 1)
+        self.assertNotEqual(position_key(ko_position, 'X'), position_key(ko_position._replace(ko=None), 'X'))
+
+    def test_lookup(self):
+        table = TranspositionTable()
+        calls = []
+        def compute(position, color):
+            calls.append(position)
+            return position.score()
+        position = go_naive.Position.initial_state().play_move(0, 'X')
+        self.assertEqual(table.lookup(position, 'O', compute), 361)
+        self.assertEqual(table.lookup(position, 'O', compute), 361)
+        self.assertEqual(len(calls), 1)
+
+if __name__ == '__main__':
+    unittest.main()